@@ -1,16 +1,43 @@
 """
 Analytics Helper Module
 Provides data aggregation functions for analytics dashboards
+
+Filtering and aggregation run in the database (see
+database_migration_workflow_analytics.sql); only totals are fetched.
+If those queries fail, raw rows are aggregated locally with ExecutionFrame.
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
 import db
+from execution_frame import ExecutionFrame
 
 logger = logging.getLogger(__name__)
 
 
+def _utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC (started_at is stored as timestamptz)"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _date_range(days: int) -> Tuple[datetime, datetime]:
+    end_date = datetime.now(timezone.utc)
+    return end_date - timedelta(days=days), end_date
+
+
+def _success_rate(successful: int, total: int) -> float:
+    return round(successful / total * 100, 1) if total > 0 else 0
+
+
+def _load_frame(start_date: datetime, end_date: datetime, company_id: Optional[str] = None,
+                user_id: Optional[str] = None, workflow_id: Optional[str] = None) -> ExecutionFrame:
+    """Raw executions for a scope as columns (fallback when the SQL aggregates are unavailable)"""
+    rows = db.get_all_workflow_executions(workflow_id=workflow_id, limit=10000, start=start_date,
+                                          end=end_date, company_id=company_id, user_id=user_id)
+    return ExecutionFrame.from_rows(rows).filter(start_date, end_date)
+
+
 def get_execution_stats(company_id: Optional[str] = None, user_id: Optional[str] = None, days: int = 30) -> Dict:
     """
     Get execution statistics for a given scope
@@ -24,57 +51,21 @@ def get_execution_stats(company_id: Optional[str] = None, user_id: Optional[str]
         Dict with execution statistics
     """
     try:
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get all workflow executions in date range
-        executions = db.get_all_workflow_executions(limit=10000)  # Large limit to get all
-        
-        # Filter by date range
-        executions = [
-            e for e in executions
-            if e.get('started_at') and 
-            start_date <= datetime.fromisoformat(e['started_at'].replace('Z', '+00:00')) <= end_date
-        ]
-        
-        # Filter by company_id if provided
-        if company_id:
-            # Get workflow activations for this company
-            company_activations = db.get_company_activations(company_id)
-            activation_ids = {a['id'] for a in company_activations}
-            executions = [
-                e for e in executions
-                if e.get('workflow_activation_id') in activation_ids
-            ]
+        start_date, end_date = _date_range(days)
         
-        # Filter by user_id if provided
-        elif user_id:
-            # Get user's workflow activations
-            user_activations = db.get_user_workflow_activations(user_id)
-            activation_ids = {a['id'] for a in user_activations}
-            executions = [
-                e for e in executions
-                if e.get('workflow_activation_id') in activation_ids
-            ]
+        stats = db.get_workflow_execution_stats(start_date, end_date, company_id=company_id, user_id=user_id)
+        if stats is None:
+            stats = _load_frame(start_date, end_date, company_id, user_id).stats()
         
-        # Calculate statistics
-        total_executions = len(executions)
-        successful = len([e for e in executions if e.get('status') == 'success'])
-        failed = len([e for e in executions if e.get('status') == 'failed'])
-        
-        success_rate = (successful / total_executions * 100) if total_executions > 0 else 0
-        
-        # Calculate average duration
-        durations = [e.get('duration_ms', 0) for e in executions if e.get('duration_ms')]
-        avg_duration = sum(durations) / len(durations) if durations else 0
+        total_executions = stats['total_executions'] or 0
+        successful = stats['successful'] or 0
         
         return {
             'total_executions': total_executions,
             'successful': successful,
-            'failed': failed,
-            'success_rate': round(success_rate, 1),
-            'avg_duration_ms': round(avg_duration, 0),
+            'failed': stats['failed'] or 0,
+            'success_rate': _success_rate(successful, total_executions),
+            'avg_duration_ms': round(float(stats['avg_duration_ms'] or 0), 0),
             'date_range': {
                 'start': start_date.isoformat(),
                 'end': end_date.isoformat(),
@@ -111,33 +102,14 @@ def get_workflow_performance(workflow_id: str, company_id: Optional[str] = None,
         if not workflow:
             return {'error': 'Workflow not found'}
         
-        # Get executions for this workflow
-        executions = db.get_all_workflow_executions(workflow_id=workflow_id, limit=1000)
-        
-        # Filter by date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        executions = [
-            e for e in executions
-            if e.get('started_at') and
-            start_date <= datetime.fromisoformat(e['started_at'].replace('Z', '+00:00')) <= end_date
-        ]
-        
-        # Calculate metrics
-        total_runs = len(executions)
-        successful_runs = len([e for e in executions if e.get('status') == 'success'])
-        failed_runs = len([e for e in executions if e.get('status') == 'failed'])
-        
-        success_rate = (successful_runs / total_runs * 100) if total_runs > 0 else 0
-        
-        # Duration statistics
-        durations = [e.get('duration_ms', 0) for e in executions if e.get('duration_ms')]
-        avg_duration = sum(durations) / len(durations) if durations else 0
-        min_duration = min(durations) if durations else 0
-        max_duration = max(durations) if durations else 0
+        start_date, end_date = _date_range(days)
+        stats = db.get_workflow_execution_stats(start_date, end_date, company_id=company_id,
+                                                workflow_id=workflow_id)
+        if stats is None:
+            stats = _load_frame(start_date, end_date, company_id, workflow_id=workflow_id).stats()
         
-        # Get most recent execution
-        most_recent = executions[0] if executions else None
+        total_runs = stats['total_executions'] or 0
+        successful_runs = stats['successful'] or 0
         
         return {
             'workflow': {
@@ -147,14 +119,14 @@ def get_workflow_performance(workflow_id: str, company_id: Optional[str] = None,
             },
             'total_runs': total_runs,
             'successful_runs': successful_runs,
-            'failed_runs': failed_runs,
-            'success_rate': round(success_rate, 1),
+            'failed_runs': stats['failed'] or 0,
+            'success_rate': _success_rate(successful_runs, total_runs),
             'duration': {
-                'avg_ms': round(avg_duration, 0),
-                'min_ms': min_duration,
-                'max_ms': max_duration
+                'avg_ms': round(float(stats['avg_duration_ms'] or 0), 0),
+                'min_ms': stats['min_duration_ms'] or 0,
+                'max_ms': stats['max_duration_ms'] or 0
             },
-            'most_recent_execution': most_recent.get('started_at') if most_recent else None,
+            'most_recent_execution': stats['last_started_at'],
             'date_range': {
                 'start': start_date.isoformat(),
                 'end': end_date.isoformat(),
@@ -180,59 +152,27 @@ def get_timeline_data(start_date: datetime, end_date: datetime, company_id: Opti
         List of daily execution counts
     """
     try:
-        # Get all executions
-        executions = db.get_all_workflow_executions(limit=10000)
+        start_date, end_date = _utc(start_date), _utc(end_date)
         
-        # Filter by date range
-        executions = [
-            e for e in executions
-            if e.get('started_at') and
-            start_date <= datetime.fromisoformat(e['started_at'].replace('Z', '+00:00')) <= end_date
-        ]
+        rows = db.get_workflow_execution_timeline(start_date, end_date, company_id=company_id, user_id=user_id)
+        if rows is None:
+            return _load_frame(start_date, end_date, company_id, user_id).timeline(start_date, end_date)
+        by_day = {str(row['day']): row for row in rows}
         
-        # Filter by scope
-        if company_id:
-            company_activations = db.get_company_activations(company_id)
-            activation_ids = {a['id'] for a in company_activations}
-            executions = [e for e in executions if e.get('workflow_activation_id') in activation_ids]
-        elif user_id:
-            user_activations = db.get_user_workflow_activations(user_id)
-            activation_ids = {a['id'] for a in user_activations}
-            executions = [e for e in executions if e.get('workflow_activation_id') in activation_ids]
-        
-        # Group by date
-        daily_counts = {}
+        # One entry per day, including days without executions
+        timeline = []
         current_date = start_date.date()
         end = end_date.date()
-        
         while current_date <= end:
-            daily_counts[current_date.isoformat()] = {'success': 0, 'failed': 0, 'total': 0}
+            row = by_day.get(current_date.isoformat(), {})
+            timeline.append({
+                'date': current_date.isoformat(),
+                'success': row.get('success', 0),
+                'failed': row.get('failed', 0),
+                'total': row.get('total', 0)
+            })
             current_date += timedelta(days=1)
         
-        # Count executions per day
-        for execution in executions:
-            if execution.get('started_at'):
-                exec_date = datetime.fromisoformat(execution['started_at'].replace('Z', '+00:00')).date()
-                date_str = exec_date.isoformat()
-                
-                if date_str in daily_counts:
-                    daily_counts[date_str]['total'] += 1
-                    if execution.get('status') == 'success':
-                        daily_counts[date_str]['success'] += 1
-                    elif execution.get('status') == 'failed':
-                        daily_counts[date_str]['failed'] += 1
-        
-        # Convert to list format
-        timeline = [
-            {
-                'date': date,
-                'success': counts['success'],
-                'failed': counts['failed'],
-                'total': counts['total']
-            }
-            for date, counts in sorted(daily_counts.items())
-        ]
-        
         return timeline
     except Exception as e:
         logger.error(f"Error getting timeline data: {e}")
@@ -253,63 +193,33 @@ def get_top_workflows(company_id: Optional[str] = None, user_id: Optional[str] =
         List of workflows with execution counts
     """
     try:
-        # Get executions
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        executions = db.get_all_workflow_executions(limit=10000)
-        executions = [
-            e for e in executions
-            if e.get('started_at') and
-            start_date <= datetime.fromisoformat(e['started_at'].replace('Z', '+00:00')) <= end_date
-        ]
+        start_date, end_date = _date_range(days)
         
-        # Filter by scope
-        if company_id:
-            company_activations = db.get_company_activations(company_id)
-            activation_ids = {a['id'] for a in company_activations}
-            executions = [e for e in executions if e.get('workflow_activation_id') in activation_ids]
-        elif user_id:
-            user_activations = db.get_user_workflow_activations(user_id)
-            activation_ids = {a['id'] for a in user_activations}
-            executions = [e for e in executions if e.get('workflow_activation_id') in activation_ids]
+        # Counted, sorted and limited in the database
+        counts = db.get_top_workflow_counts(start_date, end_date, company_id=company_id,
+                                            user_id=user_id, limit=limit)
+        if counts is None:
+            counts = _load_frame(start_date, end_date, company_id, user_id).top_workflows(limit)
         
-        # Count by workflow
-        workflow_counts = {}
-        for execution in executions:
-            workflow_id = execution.get('workflow_id')
-            if workflow_id:
-                if workflow_id not in workflow_counts:
-                    workflow_counts[workflow_id] = {
-                        'total': 0,
-                        'success': 0,
-                        'failed': 0
-                    }
-                workflow_counts[workflow_id]['total'] += 1
-                if execution.get('status') == 'success':
-                    workflow_counts[workflow_id]['success'] += 1
-                elif execution.get('status') == 'failed':
-                    workflow_counts[workflow_id]['failed'] += 1
+        # One lookup for all ids (cached), so the widget costs two queries regardless of limit
+        workflows = db.get_workflows_by_ids([row['workflow_id'] for row in counts])
         
-        # Get workflow details and sort
         top_workflows = []
-        for workflow_id, counts in workflow_counts.items():
-            workflow = db.get_workflow_by_id(workflow_id)
+        for row in counts:
+            workflow = workflows.get(str(row['workflow_id']))
             if workflow:
                 top_workflows.append({
                     'workflow': {
                         'id': workflow['id'],
                         'name': workflow['name']
                     },
-                    'executions': counts['total'],
-                    'success': counts['success'],
-                    'failed': counts['failed'],
-                    'success_rate': round((counts['success'] / counts['total'] * 100), 1) if counts['total'] > 0 else 0
+                    'executions': row['total'],
+                    'success': row['success'],
+                    'failed': row['failed'],
+                    'success_rate': _success_rate(row['success'], row['total'])
                 })
         
-        # Sort by execution count and return top N
-        top_workflows.sort(key=lambda x: x['executions'], reverse=True)
-        return top_workflows[:limit]
+        return top_workflows
         
     except Exception as e:
         logger.error(f"Error getting top workflows: {e}")
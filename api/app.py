@@ -3,15 +3,22 @@ from datetime import timedelta, datetime, timezone
 from collections import Counter, defaultdict
 from typing import Optional, Tuple
 import analytics_helper
+import hashlib
 import json
 import os
 import statistics
 import smtplib
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort, send_file, Response
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort, send_file, Response, stream_with_context
 from dotenv import load_dotenv
 from dateutil import parser as date_parser
 import auth
 import db
+import tenant_cache
+import llm_client
+import background
+import chat_analytics
+import execution_ingest
+import widget_build
 from flask_cors import CORS
 from appointment_service import AppointmentService
 
@@ -45,7 +52,6 @@ _secret_key = os.getenv('FLASK_SECRET_KEY')
 if not _secret_key:
     # Use a stable default key based on a hash (not random) to prevent session invalidation
     # This ensures sessions persist across Vercel cold starts
-    import hashlib
     _secret_key = hashlib.sha256(b'SyntraDefaultSecretKey2024').hexdigest()
 app.secret_key = _secret_key
 
@@ -101,6 +107,15 @@ app.permanent_session_lifetime = timedelta(days=365)  # 365 days to keep users l
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+
+@app.after_request
+def flush_background_on_close(response):
+    # Serverless instances freeze when the invocation ends - drain queued
+    # tasks (analytics) once the response body is done, not on the request path
+    if background.BACKGROUND_FLUSH_ON_CLOSE:
+        response.call_on_close(background.flush_after_response)
+    return response
+
 # ============================================================================
 # OBSERVABILITY & DEBUGGING
 # ============================================================================
@@ -709,6 +724,18 @@ def api_admin_system():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/runtime-stats')
+@auth.admin_required
+def api_admin_runtime_stats():
+    """In-process cache counters for this instance (hits = saved DB round trips)"""
+    return jsonify({
+        'caches': tenant_cache.all_stats(),
+        'llm_client': llm_client.stats(),
+        'bot_pool': get_bot_pool().stats(),
+        'background_queue': background.get_queue().stats(),
+        'chat_stats_buffer': chat_analytics.get_buffer().stats()
+    }), 200
+
 @app.route('/api/admin/integrations/status')
 @auth.admin_required
 def api_admin_integrations_status():
@@ -803,6 +830,9 @@ def api_save_widget_settings(company_id):
         if not update_result.data:
             return jsonify({'error': 'Failed to update settings'}), 500
         
+        # Drop cached widget/bot config so the next chat turn sees the new settings
+        tenant_cache.invalidate_company(company_id)
+        
         return jsonify({'success': True, 'message': 'Settings saved successfully'})
     except Exception as e:
         print(f"Save widget settings error: {str(e)}")
@@ -1680,6 +1710,32 @@ def api_admin_get_company_executions(company_id):
         print(f"Error getting company executions: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/executions/bulk', methods=['POST'])
+@auth.login_required
+def api_executions_bulk():
+    """
+    Bulk-ingest workflow executions from the automation runner.
+    Body: NDJSON, optionally gzip (Content-Encoding: gzip). Authenticate with an
+    API key (Authorization: Bearer sk_live_...). Resending a batch is safe:
+    rows are keyed by execution id. Returns per-line status (207 if any line failed).
+    """
+    user = auth.current_user()
+    allowed_activation_ids = None
+    if not auth.is_admin(user):
+        allowed_activation_ids = {a['id'] for a in db.get_user_workflow_activations(user['id'])}
+    
+    try:
+        body = execution_ingest.open_body(request.stream, request.headers.get('Content-Encoding'))
+        report = execution_ingest.ingest(body, allowed_activation_ids)
+    except execution_ingest.BatchTooLarge as e:
+        # Chunks before the limit may already be stored; resending smaller batches is idempotent
+        return jsonify({'error': str(e)}), 413
+    except (OSError, EOFError) as e:
+        return jsonify({'error': f'Unreadable request body: {e}'}), 400
+    
+    status = 200 if report['accepted'] == report['received'] else 207
+    return jsonify(report), status
+
 # ============================================================================
 # CEO API ROUTES
 # ============================================================================
@@ -2044,8 +2100,114 @@ def api_invite_member():
 # ============================================================================
 
 from chat_service import get_chat_service
+from bot.pool import get_pool as get_bot_pool
 import uuid as uuid_lib
 
+# Open provider connections while the instance boots so the first turn skips the handshake
+if os.getenv('OPENAI_API_KEY') and os.getenv('LLM_PREWARM', 'true').lower() != 'false':
+    llm_client.prewarm()
+
+# RESTRICT TOOLS TO WTM CONSULTING ONLY
+# This prevents other companies from triggering WTM-branded booking flows
+WTM_COMPANY_ID = '5f929157-5f9e-48e3-b7f7-a6dcd0e24142'
+
+
+def _start_chat_turn(data):
+    """
+    Resolve tenant + session for an incoming widget message, persist the user
+    message and load the conversation. Shared by the blocking and streaming endpoints.
+    Returns (turn, error_response) - exactly one of them is None.
+    """
+    # Response time (chat_statistics latency histogram) is measured from here
+    started_at = time.perf_counter()
+    if not data:
+        return None, (jsonify({'error': 'No data provided'}), 400)
+    
+    message = data.get('message', '').strip()
+    session_key = data.get('session_id') or data.get('session_key')
+    widget_id = data.get('widget_id', 'default')
+    company_id = data.get('company_id')  # Multi-tenant company identifier
+    user_context = data.get('context', {})
+    
+    if not message:
+        return None, (jsonify({'error': 'Message is required'}), 400)
+    
+    # Idempotency key from the widget: a re-sent message is stored only once
+    client_message_id = None
+    if data.get('client_message_id'):
+        try:
+            client_message_id = str(uuid_lib.UUID(str(data['client_message_id'])))
+        except ValueError:
+            pass
+    
+    # Infer company_id from widget_id if missing (e.g. script passes widget_id=COMPANY_ID)
+    if not company_id and widget_id and widget_id != 'default':
+         # Simple heuristic: if widget_id is UUID-like, try to use it as company_id
+         if len(widget_id) == 36: # Request ID length
+              # Verify it exists
+              try:
+                   comp = db.get_company_cached(widget_id)
+                   if comp:
+                        company_id = widget_id
+              except Exception:
+                   pass
+    
+    # Generate session key if not provided
+    if not session_key:
+        session_key = f"widget_{uuid_lib.uuid4().hex[:16]}"
+    
+    chat_service = get_chat_service()
+    
+    # Get company context for multi-tenant routing
+    company_context = None
+    if company_id:
+        company_context = chat_service.get_company_context(db, company_id)
+    
+    # Get or create session with company_id
+    session, is_new = chat_service.get_or_create_session(
+        db,
+        session_key=session_key,
+        widget_id=widget_id,
+        company_id=company_id,
+        context=user_context
+    )
+    
+    if not session:
+        return None, (jsonify({'error': 'Failed to create session'}), 500)
+    
+    # Use internal ID if available, otherwise session_key
+    session_id = session.get('id') or session.get('session_key')
+    
+    # Save user message
+    chat_service.save_message(
+        db, 
+        session_id, 
+        'user', 
+        message,
+        metadata={'widget_id': widget_id, 'company_id': company_id},
+        company_id=company_id,
+        client_id=client_message_id
+    )
+    
+    # 1. Check for system prompt override in widget config
+    widget_config = chat_service.get_widget_config(db, widget_id, company_id)
+    system_prompt = widget_config.get('system_prompt') if widget_config else None
+    
+    # 2. Get history
+    history = chat_service.get_conversation_history(db, session_id)
+    
+    return {
+        'session_key': session_key,
+        'session_id': session_id,
+        'widget_id': widget_id,
+        'company_id': company_id,
+        'system_prompt': system_prompt,
+        'history': history,
+        'enable_tools': company_id == WTM_COMPANY_ID,
+        'started_at': started_at
+    }, None
+
+
 @app.route('/api/chat/message', methods=['POST', 'OPTIONS'])
 def chat_message():
     """Handle incoming chat messages from the widget"""
@@ -2054,88 +2216,22 @@ def chat_message():
         return Response(status=200)
     
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        message = data.get('message', '').strip()
-        session_key = data.get('session_id') or data.get('session_key')
-        widget_id = data.get('widget_id', 'default')
-        company_id = data.get('company_id')  # Multi-tenant company identifier
-        user_context = data.get('context', {})
-        
-        if not message:
-            return jsonify({'error': 'Message is required'}), 400
-        
-        # Infer company_id from widget_id if missing (e.g. script passes widget_id=COMPANY_ID)
-        if not company_id and widget_id and widget_id != 'default':
-             # Simple heuristic: if widget_id is UUID-like, try to use it as company_id
-             if len(widget_id) == 36: # Request ID length
-                  # Verify it exists
-                  try:
-                       comp = db.get_company_by_id(widget_id)
-                       if comp:
-                            company_id = widget_id
-                  except Exception:
-                       pass
-        
-        # Generate session key if not provided
-        if not session_key:
-            session_key = f"widget_{uuid_lib.uuid4().hex[:16]}"
+        turn, error_response = _start_chat_turn(request.get_json())
+        if error_response:
+            return error_response
         
         chat_service = get_chat_service()
-        
-        # Get company context for multi-tenant routing
-        company_context = None
-        if company_id:
-            company_context = chat_service.get_company_context(db, company_id)
-        
-        # Get or create session with company_id
-        session, is_new = chat_service.get_or_create_session(
-            db,
-            session_key=session_key,
-            widget_id=widget_id,
-            company_id=company_id,
-            context=user_context
-        )
-        
-        if not session:
-            return jsonify({'error': 'Failed to create session'}), 500
-        
-        # Use internal ID if available, otherwise session_key
-        session_id = session.get('id') or session.get('session_key')
-        
-        # Save user message
-        chat_service.save_message(
-            db, 
-            session_id, 
-            'user', 
-            message,
-            metadata={'widget_id': widget_id, 'company_id': company_id},
-            company_id=company_id
-        )
-        
-        # Generate response
-        # 1. Check for system prompt override in widget config
-        widget_config = chat_service.get_widget_config(db, widget_id, company_id)
-        system_prompt = widget_config.get('system_prompt') if widget_config else None
-        
-        # 2. Get history
-        history = chat_service.get_conversation_history(db, session_id)
+        company_id = turn['company_id']
+        session_id = turn['session_id']
         
         # 3. Generate
-        # RESTRICT TOOLS TO WTM CONSULTING ONLY
-        # This prevents other companies from triggering WTM-branded booking flows
-        wtm_id = '5f929157-5f9e-48e3-b7f7-a6dcd0e24142'
-        should_enable_tools = (company_id == wtm_id)
-        
         response_text, metadata = chat_service.generate_response(
-            history, 
-            system_prompt=system_prompt,
+            turn['history'], 
+            system_prompt=turn['system_prompt'],
             db_module=db,
             company_id=company_id, # Use new engine if company_id present
             session_id=session_id,
-            enable_tools=should_enable_tools
+            enable_tools=turn['enable_tools']
         )
         
         if not response_text and metadata and metadata.get('error'):
@@ -2144,30 +2240,34 @@ def chat_message():
         if not response_text:
             response_text = "I'm sorry, I couldn't generate a response."
             
-        # Save assistant response
-        tokens = metadata.get('tokens_total', 0) if metadata else 0
+        # Save assistant response (legacy path reports tokens_total, CompanyBot reports tokens)
+        tokens = (metadata.get('tokens_total') or metadata.get('tokens') or 0) if metadata else 0
         
         # Prepare metadata for saving
         msg_metadata = {'model': metadata.get('model')} if metadata else {}
         if metadata and metadata.get('action'):
             msg_metadata['action'] = metadata.get('action')
+        if metadata and metadata.get('context'):
+            msg_metadata['context'] = metadata.get('context')
             
-        chat_service.save_message(
-            db, 
-            session_id, 
-            'assistant', 
-            response_text, 
+        # Saved before replying so its seq precedes the visitor's next message
+        # (only the analytics go to the background queue)
+        _persist_assistant_message(
+            session_id,
+            response_text,
             tokens_used=tokens,
             model=metadata.get('model') if metadata else None,
             metadata=msg_metadata,
-            company_id=company_id
+            company_id=company_id,
+            response_time_ms=_turn_elapsed_ms(turn)
         )
         
         response = jsonify({
             'status': 'success', 
             'response': response_text,
-            'session_id': session_key, # Return key for client continuity
-            'action': metadata.get('action') if metadata else None
+            'session_id': turn['session_key'], # Return key for client continuity
+            'action': metadata.get('action') if metadata else None,
+            'context': metadata.get('context') if metadata else None
         })
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
@@ -2183,42 +2283,233 @@ def chat_message():
         return response, 500
 
 
+# Extra attempts when saving the assistant reply fails (same idempotency key each time)
+CHAT_PERSIST_RETRIES = int(os.getenv('CHAT_PERSIST_RETRIES', '2'))
+
+
+def _turn_elapsed_ms(turn):
+    """Milliseconds since the turn started (message received -> reply complete)"""
+    return int((time.perf_counter() - turn['started_at']) * 1000)
+
+
+def _persist_assistant_message(session_id, content, tokens_used=None, model=None,
+                               metadata=None, company_id=None, response_time_ms=None):
+    """
+    Save the assistant reply inside the request. Every attempt carries the
+    same client_id, so an append that committed but failed on the way back
+    is not stored twice.
+    """
+    chat_service = get_chat_service()
+    client_id = str(uuid_lib.uuid4())
+    for attempt in range(CHAT_PERSIST_RETRIES + 1):
+        saved = chat_service.save_message(
+            db,
+            session_id,
+            'assistant',
+            content,
+            tokens_used=tokens_used,
+            model=model,
+            metadata=metadata,
+            company_id=company_id,
+            client_id=client_id,
+            response_time_ms=response_time_ms
+        )
+        if saved:
+            return saved
+        if attempt < CHAT_PERSIST_RETRIES:
+            time.sleep(0.2 * (2 ** attempt))
+    print(f"Assistant message for session {session_id} was not saved")
+    return None
+
+
+def _persist_stream_reply(turn, done):
+    """Save a completed streamed reply (before the final 'done' event is sent)"""
+    if not done.get('content'):
+        return
+    metadata = done.get('metadata') or {}
+    msg_metadata = {'model': metadata.get('model')}
+    if done.get('action'):
+        msg_metadata['action'] = done['action']
+    if metadata.get('context'):
+        msg_metadata['context'] = metadata['context']
+    _persist_assistant_message(
+        turn['session_id'],
+        done['content'],
+        tokens_used=metadata.get('tokens') or 0,
+        model=metadata.get('model'),
+        metadata=msg_metadata,
+        company_id=turn['company_id'],
+        response_time_ms=_turn_elapsed_ms(turn)
+    )
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent-Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST', 'OPTIONS'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat/message (Server-Sent Events).
+    Tokens are forwarded as they arrive and a 'bubble' event is sent whenever
+    a ||| delimiter closes a bubble. The assistant message is saved before
+    the final 'done' event.
+    """
+    if request.method == 'OPTIONS':
+        response = Response(status=200)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        return response
+    
+    try:
+        turn, error_response = _start_chat_turn(request.get_json())
+        if error_response:
+            return error_response
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        response = jsonify({'error': f"Server Error: {str(e)}", 'status': 'error'})
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response, 500
+
+    chat_service = get_chat_service()
+
+    def generate():
+        yield _sse_event('session', {'session_id': turn['session_key']})
+        
+        done = None
+        try:
+            for event in chat_service.stream_response(
+                turn['history'],
+                system_prompt=turn['system_prompt'],
+                db_module=db,
+                company_id=turn['company_id'],
+                session_id=turn['session_id'],
+                enable_tools=turn['enable_tools']
+            ):
+                event_type = event.pop('type')
+                if event_type == 'done':
+                    done = event
+                    _persist_stream_reply(turn, done)
+                    yield _sse_event('done', {
+                        'action': event.get('action'),
+                        'context': (event.get('metadata') or {}).get('context')
+                    })
+                else:
+                    yield _sse_event(event_type, event)
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield _sse_event('error', {'error': str(e)})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
 @app.route('/api/chat/config', methods=['GET'])
 def api_chat_config():
-    """Get chat widget configuration"""
+    """Get chat widget configuration (public fields only, ETag / 304)"""
     widget_id = request.args.get('widget_id', 'default')
-    company_id = request.args.get('company_id')
+    company_id = _resolve_widget_company(widget_id, request.args.get('company_id'))
+    return _chat_config_response(widget_id, company_id)
+
+
+def _resolve_widget_company(widget_id: str, company_id: Optional[str]) -> Optional[str]:
+    """Company for a widget request; embeds may pass the company id as widget_id"""
+    if not company_id and widget_id and widget_id != 'default' and len(widget_id) == 36:
+        try:
+            if db.get_company_cached(widget_id):
+                return widget_id
+        except Exception:
+            pass
+    return company_id
+
+
+def _safe_widget_config(widget_id: str, company_id: Optional[str]) -> dict:
+    """Widget config without server-side fields (system prompt etc.)"""
+    chat_service = get_chat_service()
+    config = chat_service.get_widget_config(db, widget_id, company_id=company_id)
+    if not config:
+        config = chat_service.get_default_widget_config()
     
-    # Infer company_id from widget_id if missing
-    if not company_id and widget_id and widget_id != 'default':
-         if len(widget_id) == 36:
-             try:
-                # We can't import db inside here if not available, but 'db' is global in app.py
-                comp = db.get_company_by_id(widget_id)
-                if comp:
-                    company_id = widget_id
-             except Exception:
-                pass
+    return {
+        'widget_id': config.get('widget_id'),
+        'name': config.get('name'),
+        'theme': config.get('theme'),
+        'position': config.get('position'),
+        'welcome_message': config.get('welcome_message'),
+        'placeholder_text': config.get('placeholder_text'),
+        'primary_color': config.get('primary_color'),
+        'settings': config.get('settings', {})
+    }
+
+
+# Shared caches may serve the public widget config this long, then stale while revalidating
+WIDGET_CONFIG_MAX_AGE = int(os.getenv('WIDGET_CONFIG_MAX_AGE', '60'))
+WIDGET_CONFIG_STALE = int(os.getenv('WIDGET_CONFIG_STALE', '86400'))
+
+
+def _widget_config_entry(widget_id: str, company_id: Optional[str]) -> dict:
+    """{'config': safe config, 'version': content hash}, cached per tenant until its settings change"""
+    def load():
+        config = _safe_widget_config(widget_id, company_id)
+        payload = json.dumps(config, sort_keys=True, separators=(',', ':'), default=str)
+        return {'config': config, 'version': hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}
     
+    # Keyed like the other tenant entries so invalidate_company() drops it
+    return tenant_cache.tenant_cache.get_or_load(
+        ('widget_config_public', str(company_id or ''), widget_id), load
+    )
+
+
+def _chat_config_response(widget_id: str, company_id: Optional[str]):
+    """Public widget config with its version as ETag; If-None-Match -> 304"""
     try:
-        service = get_chat_service()
-        config = service.get_widget_config(db, widget_id, company_id)
-        if not config:
-            # Return default if not found
-            config = service.get_default_widget_config()
-            
-        return jsonify(config)
+        entry = _widget_config_entry(widget_id, company_id)
+        response = jsonify({**entry['config'], 'version': entry['version']})
+        response.set_etag(entry['version'])
+        response.headers['Cache-Control'] = (
+            f'public, max-age={WIDGET_CONFIG_MAX_AGE}, stale-while-revalidate={WIDGET_CONFIG_STALE}'
+        )
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response.make_conditional(request)
+        
     except Exception as e:
         print(f"Chat config error: {e}")
-        return jsonify({'error': str(e)}), 500
+        response = jsonify({'error': 'Internal server error'})
+        response.status_code = 500
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
 
+def _client_message(msg: dict) -> dict:
+    """chat_messages row as the widget expects it"""
+    return {
+        'id': msg.get('id'),
+        'seq': msg.get('seq'),
+        'sender': msg.get('role'), # 'user' or 'assistant'
+        'text': msg.get('content'),
+        'timestamp': msg.get('timestamp')
+    }
 
 
+CHAT_HISTORY_MAX_LIMIT = 200
 
 
 @app.route('/api/chat/history/<session_key>', methods=['GET', 'OPTIONS'])
 def chat_history(session_key):
-    """Get conversation history for a session"""
+    """
+    Get conversation history for a session, paginated by message seq:
+        (no cursor)   the latest `limit` messages
+        ?before=<seq> the `limit` messages before seq (older pages)
+        ?after=<seq>  the first `limit` messages after seq
+        ?since=<seq>  like after, but 304 Not Modified when there is nothing new
+    Messages are always oldest first; has_more says whether another page
+    exists in the direction of the query.
+    """
     if request.method == 'OPTIONS':
         response = jsonify({'status': 'ok'})
         response.headers['Access-Control-Allow-Origin'] = '*'
@@ -2228,29 +2519,41 @@ def chat_history(session_key):
     
     try:
         chat_service = get_chat_service()
+        limit = max(1, min(request.args.get('limit', 50, type=int), CHAT_HISTORY_MAX_LIMIT))
+        before = request.args.get('before', type=int)
+        since = request.args.get('since', type=int)
+        after = since if since is not None else request.args.get('after', type=int)
         
-        # Get session
-        session, _ = chat_service.get_or_create_session(db, session_key)
-        if not session:
-            response = jsonify({'messages': [], 'session_id': session_key})
+        # Read-only: sessions are created by the first message, not by viewing history.
+        # A failed lookup must not read as "no session" / "nothing new" (304).
+        try:
+            session = chat_service.get_session(db, session_key, raise_errors=True)
+            history = []
+            if session:
+                history = chat_service.get_conversation_history(
+                    db, session['id'], limit=limit, before_seq=before, after_seq=after,
+                    raise_errors=True
+                )
+        except Exception:
+            response = jsonify({'error': 'History temporarily unavailable'})
+            response.status_code = 503
             response.headers['Access-Control-Allow-Origin'] = '*'
+            response.headers['Retry-After'] = '5'
             return response
         
-        # Get messages
-        limit = request.args.get('limit', 50, type=int)
-        history = chat_service.get_conversation_history(db, session['id'], limit=limit)
-        
-        # Transform for client
-        # JSONB messages: {role, content, timestamp ...}
-        client_history = []
-        for msg in history:
-            client_history.append({
-                'sender': msg.get('role'), # 'user' or 'assistant'
-                'text': msg.get('content'),
-                'timestamp': msg.get('timestamp')
-            })
-            
-        response = jsonify({'history': client_history, 'session_id': session_key})
+        if since is not None and not history:
+            response = Response(status=304)
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            return response
+        
+        seqs = [msg.get('seq') for msg in history if msg.get('seq') is not None]
+        response = jsonify({
+            'history': [_client_message(msg) for msg in history],
+            'session_id': session_key,
+            'has_more': len(history) == limit,
+            'oldest_seq': min(seqs) if seqs else None,
+            'latest_seq': max(seqs) if seqs else None
+        })
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
         
@@ -2339,68 +2642,134 @@ def chat_config():
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
         return response
     
+    widget_id = request.args.get('widget_id', 'default')
+    company_id = _resolve_widget_company(widget_id, request.args.get('company_id'))
+    return _chat_config_response(widget_id, company_id)
+
+
+# Messages returned by /api/chat/bootstrap unless ?limit= says otherwise
+CHAT_BOOTSTRAP_MESSAGES = int(os.getenv('CHAT_BOOTSTRAP_MESSAGES', '20'))
+CHAT_BOOTSTRAP_MAX_MESSAGES = 100
+
+
+@app.route('/api/chat/bootstrap', methods=['GET', 'OPTIONS'])
+def chat_bootstrap():
+    """
+    Everything the widget needs on load in one round trip: safe config
+    (null when ?config_version= is current), session key and the most
+    recent messages. Read-only - the session row is
+    only created with the first message. Supports If-None-Match (304).
+    """
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'ok'})
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        return response
+    
     try:
         widget_id = request.args.get('widget_id', 'default')
-        company_id = request.args.get('company_id')
-        chat_service = get_chat_service()
+        company_id = _resolve_widget_company(widget_id, request.args.get('company_id'))
+        session_key = (request.args.get('session_id') or '').strip()[:100]
+        limit = request.args.get('limit', CHAT_BOOTSTRAP_MESSAGES, type=int)
+        limit = max(0, min(limit, CHAT_BOOTSTRAP_MAX_MESSAGES))
         
-        config = chat_service.get_widget_config(db, widget_id, company_id=company_id)
-        if not config:
-            config = chat_service.get_default_widget_config()
+        chat_service = get_chat_service()
+        history = []
+        session_exists = False
+        if session_key:
+            session = chat_service.get_session(db, session_key)
+            if session:
+                session_exists = True
+                if limit:
+                    history = chat_service.get_conversation_history(db, session['id'], limit=limit)
+        else:
+            session_key = f"widget_{uuid_lib.uuid4().hex[:16]}"
         
-        # Remove sensitive fields
-        safe_config = {
-            'widget_id': config.get('widget_id'),
-            'name': config.get('name'),
-            'theme': config.get('theme'),
-            'position': config.get('position'),
-            'welcome_message': config.get('welcome_message'),
-            'placeholder_text': config.get('placeholder_text'),
-            'primary_color': config.get('primary_color'),
-            'settings': config.get('settings', {})
-        }
+        # The widget sends the config version it has cached; skip the config if unchanged
+        config_entry = _widget_config_entry(widget_id, company_id)
+        config_current = request.args.get('config_version') == config_entry['version']
         
-        response = jsonify(safe_config)
+        response = jsonify({
+            'config': None if config_current else config_entry['config'],
+            'config_version': config_entry['version'],
+            'session_id': session_key,
+            'session_exists': session_exists,
+            'history': [_client_message(msg) for msg in history],
+            'has_more': limit > 0 and len(history) == limit
+        })
+        # Per-visitor data: browsers may keep it but must revalidate (cheap 304)
+        response.headers['Cache-Control'] = 'private, no-cache'
         response.headers['Access-Control-Allow-Origin'] = '*'
-        return response
+        response.add_etag()
+        return response.make_conditional(request)
         
     except Exception as e:
-        print(f"Chat config error: {e}")
-        response = jsonify({'error': str(e)})
+        print(f"Chat bootstrap error: {e}")
+        response = jsonify({'error': 'Internal server error'})
         response.status_code = 500
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
 
-@app.route('/widget/embed.js', methods=['GET'])
-def widget_embed_script():
-    """Serve the embeddable widget JavaScript (Inline Version)"""
+def _widget_asset_response(asset, cache_control: str):
+    """Serve a built widget asset: content negotiation, ETag / 304, cache headers"""
+    encoding, body = asset.select(request.headers.get('Accept-Encoding'))
+    etag = asset.etag(encoding)
+    if any(request.if_none_match.contains_weak(tag) for tag in asset.etags):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=asset.content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+def _widget_asset(key: str):
     try:
-        from widget_source import WIDGET_JS
-        response = Response(WIDGET_JS, mimetype='application/javascript')
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        return response
+        return widget_build.get_assets()[key]
     except Exception as e:
-        print(f"Widget embed error: {e}")
-        return jsonify({'error': f"Failed to load widget script: {str(e)}"}), 500
+        print(f"Widget build error: {e}")
+        return None
+
+
+@app.route('/widget/embed.js', methods=['GET'])
+def widget_embed_script():
+    """Serve the widget loader stub; it pulls in the current fingerprinted bundle on demand"""
+    asset = _widget_asset('loader')
+    if not asset:
+        return jsonify({'error': 'Failed to load widget script'}), 500
+    return _widget_asset_response(asset, widget_build.LOADER_CACHE_CONTROL)
+
+
+@app.route('/widget/embed.<version>.js', methods=['GET'])
+def widget_bundle_script(version):
+    """Serve the full widget bundle (immutable when the version matches)"""
+    asset = _widget_asset('bundle')
+    if not asset:
+        return jsonify({'error': 'Failed to load widget script'}), 500
+    # An old loader cached elsewhere may still ask for a previous version - serve
+    # the current bundle but don't let it be cached under the old URL
+    cache_control = widget_build.IMMUTABLE_CACHE_CONTROL if version == asset.hash else 'no-cache'
+    return _widget_asset_response(asset, cache_control)
 
 
 @app.route('/widget/styles.css', methods=['GET'])
-def widget_styles():
+@app.route('/widget/styles.<version>.css', methods=['GET'])
+def widget_styles(version=None):
     """Serve the widget CSS"""
-    try:
-        widget_css_path = os.path.join(app.static_folder, 'css', 'chat-widget.css')
-        if os.path.exists(widget_css_path):
-            response = send_file(widget_css_path, mimetype='text/css')
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Cache-Control'] = 'public, max-age=3600'
-            return response
-        else:
-            return "/* Widget styles not found */", 404
-    except Exception as e:
-        print(f"Widget styles error: {e}")
-        return f"/* Error: {str(e)} */", 500
+    asset = _widget_asset('styles')
+    if not asset:
+        return "/* Widget styles not found */", 404
+    if version is None:
+        cache_control = widget_build.LOADER_CACHE_CONTROL
+    else:
+        cache_control = widget_build.IMMUTABLE_CACHE_CONTROL if version == asset.hash else 'no-cache'
+    return _widget_asset_response(asset, cache_control)
 
 
 @app.route('/widget-demo')
@@ -2408,6 +2777,14 @@ def widget_demo():
     """Demo page showcasing the chat widget with different themes"""
     return render_template('widget-demo.html')
 
+@app.route('/widget-demo/perf')
+def widget_perf():
+    """Frame-time test page: the widget bundle with a generated conversation (?count=1000&virtualize=0)"""
+    count = max(10, min(request.args.get('count', 1000, type=int), 10000))
+    virtualize = request.args.get('virtualize', '1') != '0'
+    bundle_url = f"/widget/{widget_build.get_assets()['bundle'].filename}"
+    return render_template('widget-perf.html', count=count, virtualize=virtualize, bundle_url=bundle_url)
+
 @app.route('/admin/widgets/<company_id>/test')
 # # @auth.admin_required
 def admin_widget_test(company_id):
@@ -0,0 +1,219 @@
+"""
+Background Work Queue - runs post-response writes off the request path
+
+Used for work the user does not wait for (analytics). Chat messages are
+saved inside the request so their seq order matches the conversation.
+Tasks go into a bounded queue drained by a small thread pool. Failed tasks
+are retried with exponential backoff. The queue is flushed at interpreter
+shutdown.
+
+On serverless hosts the instance can be frozen (or recycled) once the
+invocation ends, so queued tasks might never run. There the app drains the
+queue when the response is closed (flush_after_response), i.e. after the
+body was produced but before the invocation returns, bounded by
+BACKGROUND_CLOSE_FLUSH_TIMEOUT so it stays within maxDuration.
+BACKGROUND_FLUSH_ON_CLOSE defaults to true on Vercel; BACKGROUND_SYNC=true
+runs every task inline instead.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+BACKGROUND_QUEUE_SIZE = int(os.getenv('BACKGROUND_QUEUE_SIZE', '1000'))
+BACKGROUND_MAX_RETRIES = int(os.getenv('BACKGROUND_MAX_RETRIES', '3'))
+BACKGROUND_RETRY_BACKOFF = float(os.getenv('BACKGROUND_RETRY_BACKOFF', '0.5'))
+BACKGROUND_FLUSH_TIMEOUT = float(os.getenv('BACKGROUND_FLUSH_TIMEOUT', '10'))
+BACKGROUND_SYNC = os.getenv('BACKGROUND_SYNC', 'false').lower() == 'true'
+BACKGROUND_FLUSH_ON_CLOSE = os.getenv(
+    'BACKGROUND_FLUSH_ON_CLOSE', 'true' if os.getenv('VERCEL') else 'false'
+).lower() == 'true'
+# Seconds a closing response may wait for queued tasks (keep well below maxDuration)
+BACKGROUND_CLOSE_FLUSH_TIMEOUT = float(os.getenv('BACKGROUND_CLOSE_FLUSH_TIMEOUT', '3'))
+
+
+class BackgroundQueue:
+    """Bounded task queue with worker threads, retries and lag tracking"""
+
+    def __init__(self, name: str = 'background',
+                 workers: int = BACKGROUND_WORKERS,
+                 max_size: int = BACKGROUND_QUEUE_SIZE,
+                 max_retries: int = BACKGROUND_MAX_RETRIES,
+                 retry_backoff: float = BACKGROUND_RETRY_BACKOFF,
+                 sync: bool = BACKGROUND_SYNC):
+        self.name = name
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.sync = sync
+        self._queue: 'queue.Queue[Dict]' = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+        # Tasks submitted but not yet finished (queued, running or waiting to retry)
+        self._pending = 0
+        self._idle = threading.Condition()
+
+        self.counters = {
+            'submitted': 0, 'completed': 0, 'failed': 0,
+            'retried': 0, 'inline': 0
+        }
+        self.lag_ms_last = 0.0
+        self.lag_ms_max = 0.0
+
+    # ------------------------------------------------------------------
+
+    def submit(self, fn: Callable, *args, label: str = None, **kwargs) -> None:
+        """
+        Queue fn(*args, **kwargs). A task fails when it raises; it is retried up
+        to max_retries times. When the queue is full the task runs inline
+        (backpressure instead of dropping writes).
+        """
+        task = {
+            'fn': fn, 'args': args, 'kwargs': kwargs,
+            'label': label or getattr(fn, '__name__', 'task'),
+            'attempt': 0, 'enqueued_at': time.monotonic()
+        }
+        self.counters['submitted'] += 1
+
+        if self.sync:
+            self.counters['inline'] += 1
+            self._run_inline(task)
+            return
+
+        self._ensure_workers()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self.counters['inline'] += 1
+            self._run_inline(task)
+            self._finish()
+
+    def flush(self, timeout: float = BACKGROUND_FLUSH_TIMEOUT) -> bool:
+        """Block until every submitted task finished (or timeout). Returns True if drained."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': self._queue.qsize(),
+            'pending': self._pending,
+            'max_size': self._queue.maxsize,
+            'workers': len(self._threads),
+            'lag_ms_last': round(self.lag_ms_last, 1),
+            'lag_ms_max': round(self.lag_ms_max, 1),
+            **self.counters
+        }
+
+    # ------------------------------------------------------------------
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            task = self._queue.get()
+            lag = (time.monotonic() - task['enqueued_at']) * 1000
+            self.lag_ms_last = lag
+            self.lag_ms_max = max(self.lag_ms_max, lag)
+            try:
+                self._execute(task)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, task: Dict) -> None:
+        try:
+            task['fn'](*task['args'], **task['kwargs'])
+            self.counters['completed'] += 1
+            self._finish()
+        except Exception as e:
+            if task['attempt'] < self.max_retries:
+                task['attempt'] += 1
+                self.counters['retried'] += 1
+                delay = self.retry_backoff * (2 ** (task['attempt'] - 1))
+                print(f"Background task {task['label']} failed ({e}), retry {task['attempt']} in {delay:.1f}s")
+                timer = threading.Timer(delay, self._requeue, args=(task,))
+                timer.daemon = True
+                timer.start()
+            else:
+                self.counters['failed'] += 1
+                print(f"Background task {task['label']} failed permanently: {e}")
+                self._finish()
+
+    def _requeue(self, task: Dict) -> None:
+        task['enqueued_at'] = time.monotonic()
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self._execute(task)
+
+    def _run_inline(self, task: Dict) -> None:
+        """Run with the same retry budget, sleeping between attempts"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                task['fn'](*task['args'], **task['kwargs'])
+                self.counters['completed'] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.counters['failed'] += 1
+                    print(f"Background task {task['label']} failed permanently: {e}")
+                    return
+                self.counters['retried'] += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+    def _finish(self) -> None:
+        with self._idle:
+            self._pending -= 1
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+
+_queue: Optional[BackgroundQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> BackgroundQueue:
+    """Get the process-wide background queue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = BackgroundQueue()
+    return _queue
+
+
+def submit(fn: Callable, *args, label: str = None, **kwargs) -> None:
+    get_queue().submit(fn, *args, label=label, **kwargs)
+
+
+def flush_after_response() -> None:
+    """Response close hook: finish queued tasks before a serverless instance is frozen"""
+    if _queue is not None and not _queue.flush(timeout=BACKGROUND_CLOSE_FLUSH_TIMEOUT):
+        print(f"Background queue still has {_queue.stats()['pending']} tasks after the response")
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _queue is not None and not _queue.flush():
+        print(f"Background queue exited with {_queue.stats()['pending']} unfinished tasks")
@@ -0,0 +1,173 @@
+"""Context Packer - fits system prompt, knowledge and history into a token budget"""
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Practical per-model prompt budgets (input tokens). These cap latency and
+# cost per turn; they are far below the models' context windows on purpose.
+MODEL_TOKEN_BUDGETS = {
+    'gpt-4o': 8000,
+    'gpt-4o-mini': 8000,
+    'gpt-4-turbo': 8000,
+    'gpt-4': 6000,
+    'gpt-3.5-turbo': 3500,
+}
+DEFAULT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+
+# At most this share of the budget left after instructions goes to retrieved knowledge
+KNOWLEDGE_SHARE = float(os.getenv('CONTEXT_KNOWLEDGE_SHARE', '0.5'))
+
+# Chat formats add a few tokens per message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+KNOWLEDGE_HEADER = "\n\n### INTERNAL KNOWLEDGE BASE (most relevant passages) ###\n"
+
+_WORD_RE = re.compile(r'\w+|[^\w\s]', re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Heuristic BPE token count (no tokenizer dependency).
+    English averages ~4 chars/token; German compounds split into more pieces,
+    so the word-based estimate wins for them.
+    """
+    if not text:
+        return 0
+    by_chars = math.ceil(len(text) / 4)
+    by_words = math.ceil(len(_WORD_RE.findall(text)) * 1.3)
+    return max(by_chars, by_words)
+
+
+def budget_for_model(model: Optional[str]) -> int:
+    """Token budget for a model; CONTEXT_TOKEN_BUDGET_<MODEL> overrides (e.g. CONTEXT_TOKEN_BUDGET_GPT_4O)"""
+    model = (model or '').lower()
+    env_key = 'CONTEXT_TOKEN_BUDGET_' + re.sub(r'[^A-Z0-9]', '_', model.upper())
+    if os.getenv(env_key):
+        return int(os.getenv(env_key))
+    # Longest matching prefix so 'gpt-4o-mini-2024-07-18' maps to gpt-4o-mini
+    for name in sorted(MODEL_TOKEN_BUDGETS, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_TOKEN_BUDGETS[name]
+    return DEFAULT_TOKEN_BUDGET
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens (used only when a single block cannot fit)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = max(0, max_tokens * 4 - 20)
+    while cut > 0 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + "...(truncated)"
+
+
+def _format_passage(passage: Dict) -> str:
+    return f"---\nTitle: {passage.get('title')}\nContent:\n{passage.get('text')}\n"
+
+
+class ContextPacker:
+    """
+    Packs prompt blocks by priority:
+        1. instructions (system prompt, always kept - truncated only if alone over budget)
+        2. the latest user message
+        3. retrieved knowledge, best relevance per token first (capped by KNOWLEDGE_SHARE)
+        4. seminar context
+        5. older history turns, newest first
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+
+    @classmethod
+    def for_model(cls, model: Optional[str]) -> 'ContextPacker':
+        return cls(budget_for_model(model))
+
+    def pack(self, instructions: str,
+             history: List[Dict],
+             knowledge: List[Tuple[float, Dict]] = None,
+             seminar_context: str = None,
+             seminar_suffix: str = '') -> Dict:
+        """
+        Returns {'system_prompt', 'messages', 'stats'}.
+        history is oldest-first [{'role', 'content'}]; knowledge is [(score, passage)].
+        """
+        remaining = self.budget
+
+        # 1. Instructions
+        instructions = _truncate(instructions or '', max(remaining - MESSAGE_OVERHEAD, 0))
+        instruction_tokens = estimate_tokens(instructions) + MESSAGE_OVERHEAD
+        remaining -= instruction_tokens
+
+        # 2. Latest user message - the turn must always be answered
+        turns = [{'role': m['role'], 'content': m.get('content') or ''} for m in history or []]
+        latest = turns[-1:] if turns else []
+        older = turns[:-1]
+        latest_tokens = sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in latest)
+        remaining -= latest_tokens
+
+        # 3. Knowledge by relevance per token
+        knowledge_text = ''
+        knowledge_tokens = 0
+        packed_passages = 0
+        if knowledge and remaining > 0:
+            cap = int(remaining * KNOWLEDGE_SHARE)
+            header_tokens = estimate_tokens(KNOWLEDGE_HEADER)
+            blocks = []
+            for score, passage in knowledge:
+                text = _format_passage(passage)
+                cost = estimate_tokens(text)
+                blocks.append((score / max(cost, 1), score, cost, text))
+            used = header_tokens
+            chosen = []
+            for _, score, cost, text in sorted(blocks, key=lambda b: b[0], reverse=True):
+                if used + cost > cap:
+                    continue
+                chosen.append((score, text))
+                used += cost
+            if chosen:
+                # Present the selected passages in relevance order
+                chosen.sort(key=lambda c: c[0], reverse=True)
+                knowledge_text = KNOWLEDGE_HEADER + ''.join(text for _, text in chosen)
+                knowledge_tokens = used
+                packed_passages = len(chosen)
+                remaining -= used
+
+        # 4. Seminar context
+        seminar_text = ''
+        seminar_tokens = 0
+        if seminar_context and remaining > 0:
+            seminar_text = f"\n\n{seminar_context}{seminar_suffix}"
+            seminar_text = _truncate(seminar_text, remaining)
+            seminar_tokens = estimate_tokens(seminar_text)
+            remaining -= seminar_tokens
+
+        # 5. Older history, newest first, stop at the first turn that does not fit
+        kept = []
+        history_tokens = latest_tokens
+        for message in reversed(older):
+            cost = estimate_tokens(message['content']) + MESSAGE_OVERHEAD
+            if cost > remaining:
+                break
+            kept.append(message)
+            remaining -= cost
+            history_tokens += cost
+        kept.reverse()
+
+        system_prompt = instructions + knowledge_text + seminar_text
+        return {
+            'system_prompt': system_prompt,
+            'messages': kept + latest,
+            'stats': {
+                'budget': self.budget,
+                'total': self.budget - remaining,
+                'instructions': instruction_tokens,
+                'knowledge': knowledge_tokens,
+                'knowledge_passages': packed_passages,
+                'knowledge_candidates': len(knowledge or []),
+                'seminar': seminar_tokens,
+                'history': history_tokens,
+                'history_turns': len(kept) + len(latest),
+                'dropped_turns': len(older) - len(kept)
+            }
+        }
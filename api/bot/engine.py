@@ -2,9 +2,16 @@ import os
 import json
 import logging
 import requests
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator, Tuple
 from datetime import datetime
 from appointment_service import AppointmentService
+import llm_client
+from tenant_cache import tenant_cache
+from bot.context_packer import ContextPacker
+
+# Knowledge passages retrieved per turn before token packing
+KNOWLEDGE_CANDIDATES = int(os.getenv('KNOWLEDGE_CANDIDATES', '10'))
+
 
 class CompanyBot:
     def __init__(self, company_id: str, db_module, config: Dict = None):
@@ -20,10 +27,25 @@ class CompanyBot:
         self.openai_api_key = os.getenv('OPENAI_API_KEY', '')
         self.openai_model = os.getenv('OPENAI_MODEL', 'gpt-4o')
         
+        # Precompiled per instance - pooled bots reuse these across turns (see bot/pool.py)
+        self.tools = [self.get_appointment_tool_def(), self.get_date_picker_tool_def()]
+        self.prompt_prefix = self.config.get('system_prompt', '')
+        
+    def approx_size(self) -> int:
+        """Rough memory footprint in bytes, used by the bot pool's memory budget"""
+        return (len(json.dumps(self.config, default=str)) + len(json.dumps(self.tools))
+                + len(self.prompt_prefix) + 2048)
+
     def _load_config(self) -> Dict:
-        """Load company-specific bot settings"""
+        """Load company-specific bot settings (cached per tenant)"""
+        if not self.company_id:
+            return self._resolve_config()
+        return tenant_cache.get_or_load(('bot_config', str(self.company_id)), self._resolve_config) or {}
+
+    def _resolve_config(self) -> Dict:
+        """Map the company's widget settings to the bot config"""
         try:
-            company = self.db.get_company_by_id(self.company_id)
+            company = self.db.get_company_cached(self.company_id)
             if not company:
                 return {}
             
@@ -110,62 +132,141 @@ class CompanyBot:
             }
         }
 
-    def generate_response(self, messages: List[Dict], 
-                        user_context: Dict = None, 
-                        system_prompt: str = None, 
-                        enable_tools: bool = False,
-                        session_id: str = None) -> Dict:
+    def _retrieval_query(self, messages: List[Dict]) -> str:
+        """Knowledge query for this turn: the last user message plus the one before for follow-ups"""
+        user_messages = [m.get('content') or '' for m in messages if m.get('role') == 'user']
+        return ' '.join(user_messages[-2:])
+
+    def _build_request(self, messages: List[Dict], system_prompt: str = None,
+                       enable_tools: bool = False) -> Tuple[List[Dict], Dict, Dict]:
         """
-        Generate a response with optional tool support
+        Assemble the system prompt, conversation and payload for a completion call.
+        Blocks are packed into the model's token budget (see bot/context_packer.py);
+        the returned stats are reported in the response metadata.
         """
-        if not self.openai_api_key:
-            return {'error': 'OpenAI API not configured'}
-
         # Priority: Passed system_prompt > Config system_prompt
-        final_system_prompt = system_prompt or self.config.get('system_prompt', '')
-        
-        # Inject Company Knowledge Base
-        try:
-            knowledge = self.db.get_company_knowledge(self.company_id)
-            if knowledge:
-                 final_system_prompt += f"\n\n### INTERNAL KNOWLEDGE BASE ###\n{knowledge}\n"
-        except Exception as e:
-            logging.error(f"Failed to inject knowledge base: {e}")
+        final_system_prompt = system_prompt or self.prompt_prefix
 
         # Add basic context if not already included in system_prompt
         if "IMPORTANT:" not in final_system_prompt:
              final_system_prompt += f"\n\nIMPORTANT: Current Time: {datetime.utcnow().isoformat()}"
 
-        # Context Injection (RAG lite) - if enabled in future
-        # For now, we rely on what passed in via system_prompt or base knowledge
-        
-        api_messages = [{'role': 'system', 'content': final_system_prompt}]
-        for m in messages:
-            api_messages.append({'role': m['role'], 'content': m['content']})
+        # Company Knowledge Base - candidate passages relevant to the current question,
+        # the packer keeps the ones with the best relevance per token
+        passages = []
+        try:
+            passages = self.db.get_company_knowledge_passages(
+                self.company_id,
+                self._retrieval_query(messages),
+                top_k=KNOWLEDGE_CANDIDATES
+            )
+        except Exception as e:
+            logging.error(f"Failed to retrieve knowledge base: {e}")
+
+        model = self.config.get('model', self.openai_model)
+        packed = ContextPacker.for_model(model).pack(
+            instructions=final_system_prompt,
+            history=messages,
+            knowledge=passages
+        )
+
+        api_messages = [{'role': 'system', 'content': packed['system_prompt']}]
+        api_messages.extend(packed['messages'])
 
         payload = {
-            'model': self.config.get('model', self.openai_model),
+            'model': model,
             'messages': api_messages,
             'temperature': self.config.get('temperature', 0.7)
         }
 
         if enable_tools:
-            payload['tools'] = [self.get_appointment_tool_def(), self.get_date_picker_tool_def()]
+            payload['tools'] = self.tools
             payload['tool_choice'] = "auto"
 
+        return api_messages, payload, packed['stats']
+
+    def _post_completion(self, payload: Dict, deadline: llm_client.Deadline,
+                         stream: bool = False) -> requests.Response:
+        """
+        Send a chat completion request to the provider (pooled keep-alive connection).
+        All calls of a turn share its deadline, so retries stop once it cannot be met.
+        """
+        return llm_client.post('/chat/completions', payload, self.openai_api_key,
+                               stream=stream, deadline=deadline)
+
+    def _execute_tool_calls(self, tool_calls: List[Dict], api_messages: List[Dict],
+                            session_id: str = None) -> Optional[str]:
+        """
+        Run the requested tools and append their outputs to api_messages.
+        Returns the widget action triggered by the tools (if any).
+        """
+        triggered_action = None
+        for tool_call in tool_calls:
+            function_name = tool_call['function']['name']
+            arguments_str = tool_call['function']['arguments']
+            print(f"Tool: {function_name}, Args: {arguments_str}")
+            
+            try:
+                arguments = json.loads(arguments_str)
+            except Exception as json_e:
+                print(f"JSON Parse Error: {json_e}")
+                arguments = {}
+
+            output_content = json.dumps({"status": "error", "message": f"Unknown tool: {function_name}"})
+
+            if function_name == 'ask_for_time':
+                print("Triggering Date Picker Tool...")
+                triggered_action = 'request_date'
+                output_content = json.dumps({"status": "success", "message": "Date picker displayed."})
+
+            elif function_name == 'book_appointment':
+                # Execute tool
+                try:
+                    print(f"Executing AppointmentService...")
+                    result = AppointmentService.create_appointment(
+                        self.db,
+                        self.company_id,
+                        session_id,
+                        arguments.get('name'),
+                        arguments.get('email'),
+                        arguments.get('date_time'),
+                        arguments.get('purpose', 'General Consultation'),
+                        company_name=arguments.get('company_name'),
+                        topic_type=arguments.get('topic_type')
+                    )
+                    print(f"Appointment Result: {result}")
+                    
+                    output_content = json.dumps({"status": "success", "details": str(result)}) if result else json.dumps({"status": "error", "message": "Failed to book appointment"})
+                except Exception as e:
+                    print(f"Tool Execution Error: {str(e)}")
+                    output_content = json.dumps({"status": "error", "message": str(e)})
+
+            api_messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call['id'],
+                "name": function_name,
+                "content": output_content
+            })
+        return triggered_action
+
+    def generate_response(self, messages: List[Dict], 
+                        user_context: Dict = None, 
+                        system_prompt: str = None, 
+                        enable_tools: bool = False,
+                        session_id: str = None) -> Dict:
+        """
+        Generate a response with optional tool support
+        """
+        if not self.openai_api_key:
+            return {'error': 'OpenAI API not configured'}
+
+        api_messages, payload, context_stats = self._build_request(messages, system_prompt, enable_tools)
         triggered_action = None
+        deadline = llm_client.Deadline()
 
         try:
             logging.info(f"Sending request to OpenAI using model: {payload['model']}")
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.openai_api_key}',
-                    'Content-Type': 'application/json'
-                },
-                json=payload,
-                timeout=30
-            )
+            response = self._post_completion(payload, deadline)
 
             if response.status_code != 200:
                 error_msg = f"Provider Error: {response.status_code} - {response.text}"
@@ -180,67 +281,14 @@ class CompanyBot:
             # Handle Tool Calls
             if message.get('tool_calls'):
                 print("--- Tool Call Detected ---")
-                tool_calls = message['tool_calls']
                 api_messages.append(message) # Append assistant's tool call message
-                
-                for tool_call in tool_calls:
-                    function_name = tool_call['function']['name']
-                    arguments_str = tool_call['function']['arguments']
-                    print(f"Tool: {function_name}, Args: {arguments_str}")
-                    
-                    try:
-                        arguments = json.loads(arguments_str)
-                    except Exception as json_e:
-                        print(f"JSON Parse Error: {json_e}")
-                        arguments = {}
-
-                    if function_name == 'ask_for_time':
-                        print("Triggering Date Picker Tool...")
-                        triggered_action = 'request_date'
-                        output_content = json.dumps({"status": "success", "message": "Date picker displayed."})
-
-                    elif function_name == 'book_appointment':
-                        # Execute tool
-                        try:
-                            print(f"Executing AppointmentService...")
-                            result = AppointmentService.create_appointment(
-                                self.db,
-                                self.company_id,
-                                session_id,
-                                arguments.get('name'),
-                                arguments.get('email'),
-                                arguments.get('date_time'),
-                                arguments.get('purpose', 'General Consultation'),
-                                company_name=arguments.get('company_name'),
-                                topic_type=arguments.get('topic_type')
-                            )
-                            print(f"Appointment Result: {result}")
-                            
-                            output_content = json.dumps({"status": "success", "details": str(result)}) if result else json.dumps({"status": "error", "message": "Failed to book appointment"})
-                        except Exception as e:
-                            print(f"Tool Execution Error: {str(e)}")
-                            output_content = json.dumps({"status": "error", "message": str(e)})
-
-                    api_messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call['id'],
-                        "name": function_name,
-                        "content": output_content
-                    })
+                triggered_action = self._execute_tool_calls(message['tool_calls'], api_messages, session_id)
 
                 # Follow-up request to get final answer
                 payload['messages'] = api_messages
                 
                 print("Sending Follow-up to OpenAI...")
-                response = requests.post(
-                    'https://api.openai.com/v1/chat/completions',
-                    headers={
-                        'Authorization': f'Bearer {self.openai_api_key}',
-                        'Content-Type': 'application/json'
-                    },
-                    json=payload,
-                    timeout=30
-                )
+                response = self._post_completion(payload, deadline)
                 
                 if response.status_code != 200:
                     error_msg = f"Provider Error (Follow-up): {response.status_code} - {response.text}"
@@ -259,7 +307,8 @@ class CompanyBot:
                 'action': triggered_action,
                 'metadata': {
                     'model': data['model'],
-                    'tokens': data['usage']['total_tokens']
+                    'tokens': data['usage']['total_tokens'],
+                    'context': context_stats
                 }
             }
 
@@ -269,3 +318,199 @@ class CompanyBot:
             traceback.print_exc() # Print full stack trace to stdout
             print(f"CRITICAL BOT ERROR: {str(e)}")
             return {'error': str(e)}
+
+    def _stream_completion(self, payload: Dict, deadline: llm_client.Deadline) -> Iterator[Dict]:
+        """
+        Open a streaming completion and yield parsed chunks.
+        Yields {'delta': str}, then a final {'tool_calls': [...], 'model': str, 'usage': dict}.
+        Raises llm_client.DeadlineExceeded when the turn budget runs out mid-stream.
+        """
+        stream_payload = dict(payload)
+        stream_payload['stream'] = True
+        stream_payload['stream_options'] = {'include_usage': True}
+
+        response = self._post_completion(stream_payload, deadline, stream=True)
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f"Provider Error: {response.status_code} - {response.text}")
+
+            tool_calls: Dict[int, Dict] = {}
+            model = payload.get('model')
+            usage = {}
+
+            for line in response.iter_lines(decode_unicode=True):
+                deadline.check()
+                if not line or not line.startswith('data:'):
+                    continue
+                data_str = line[len('data:'):].strip()
+                if data_str == '[DONE]':
+                    break
+
+                chunk = json.loads(data_str)
+                model = chunk.get('model') or model
+                if chunk.get('usage'):
+                    usage = chunk['usage']
+                if not chunk.get('choices'):
+                    continue
+
+                delta = chunk['choices'][0].get('delta') or {}
+                if delta.get('content'):
+                    yield {'delta': delta['content']}
+
+                # Tool call arguments arrive in fragments keyed by index
+                for tc in delta.get('tool_calls') or []:
+                    slot = tool_calls.setdefault(tc.get('index', 0), {
+                        'id': None,
+                        'type': 'function',
+                        'function': {'name': '', 'arguments': ''}
+                    })
+                    if tc.get('id'):
+                        slot['id'] = tc['id']
+                    fn = tc.get('function') or {}
+                    if fn.get('name'):
+                        slot['function']['name'] += fn['name']
+                    if fn.get('arguments'):
+                        slot['function']['arguments'] += fn['arguments']
+
+            yield {
+                'tool_calls': [tool_calls[i] for i in sorted(tool_calls)],
+                'model': model,
+                'usage': usage
+            }
+        finally:
+            response.close()
+
+    def stream_response(self, messages: List[Dict],
+                        system_prompt: str = None,
+                        enable_tools: bool = False,
+                        session_id: str = None) -> Iterator[Dict]:
+        """
+        Stream a response as events for the widget.
+
+        Events:
+            {'type': 'token', 'bubble': i, 'text': str}   - partial text of bubble i
+            {'type': 'bubble', 'bubble': i, 'text': str}  - bubble i is complete
+            {'type': 'done', 'content': str, 'action': str, 'metadata': dict}
+            {'type': 'error', 'error': str}
+        """
+        if not self.openai_api_key:
+            yield {'type': 'error', 'error': 'OpenAI API not configured'}
+            return
+
+        api_messages, payload, context_stats = self._build_request(messages, system_prompt, enable_tools)
+        splitter = BubbleSplitter()
+        triggered_action = None
+        content = ''
+        final = {}
+        deadline = llm_client.Deadline()
+
+        try:
+            logging.info(f"Streaming request to OpenAI using model: {payload['model']}")
+            for chunk in self._stream_completion(payload, deadline):
+                if 'delta' in chunk:
+                    content += chunk['delta']
+                    yield from splitter.feed(chunk['delta'])
+                else:
+                    final = chunk
+
+            if final.get('tool_calls'):
+                print("--- Tool Call Detected (stream) ---")
+                api_messages.append({
+                    'role': 'assistant',
+                    'content': content or None,
+                    'tool_calls': final['tool_calls']
+                })
+                triggered_action = self._execute_tool_calls(final['tool_calls'], api_messages, session_id)
+                if triggered_action:
+                    yield {'type': 'action', 'action': triggered_action}
+
+                # Follow-up request streams the final answer
+                payload['messages'] = api_messages
+                print("Streaming Follow-up from OpenAI...")
+                for chunk in self._stream_completion(payload, deadline):
+                    if 'delta' in chunk:
+                        content += chunk['delta']
+                        yield from splitter.feed(chunk['delta'])
+                    else:
+                        final = chunk
+
+            yield from splitter.flush()
+
+            yield {
+                'type': 'done',
+                'content': content,
+                'action': triggered_action,
+                'metadata': {
+                    'model': final.get('model'),
+                    'tokens': (final.get('usage') or {}).get('total_tokens'),
+                    'context': context_stats
+                }
+            }
+
+        except Exception as e:
+            logging.error(f"Streaming error: {e}")
+            import traceback
+            traceback.print_exc()
+            print(f"CRITICAL BOT STREAM ERROR: {str(e)}")
+            yield {'type': 'error', 'error': str(e)}
+
+
+BUBBLE_DELIMITER = '|||'
+
+
+def split_bubbles(text: str) -> List[str]:
+    """Split a complete reply into chat bubbles on the ||| delimiter"""
+    return [p.strip() for p in (text or '').split(BUBBLE_DELIMITER) if p.strip()]
+
+
+class BubbleSplitter:
+    """
+    Incrementally splits streamed text into bubbles.
+    Holds back a trailing partial delimiter so '||' + '|' across chunks is detected.
+    """
+
+    def __init__(self):
+        self.index = 0
+        self.current = ''
+        self._pending = ''
+
+    def feed(self, delta: str) -> Iterator[Dict]:
+        text = self._pending + delta
+        self._pending = ''
+
+        while BUBBLE_DELIMITER in text:
+            head, text = text.split(BUBBLE_DELIMITER, 1)
+            yield from self._emit(head)
+            yield from self._close()
+
+        # Keep back any suffix that could be the start of a delimiter
+        for size in range(len(BUBBLE_DELIMITER) - 1, 0, -1):
+            if text.endswith(BUBBLE_DELIMITER[:size]):
+                self._pending = text[-size:]
+                text = text[:-size]
+                break
+        yield from self._emit(text)
+
+    def flush(self) -> Iterator[Dict]:
+        if self._pending:
+            yield from self._emit(self._pending)
+            self._pending = ''
+        yield from self._close()
+
+    def _emit(self, text: str) -> Iterator[Dict]:
+        if not text:
+            return
+        # Skip leading whitespace of a fresh bubble
+        if not self.current:
+            text = text.lstrip()
+            if not text:
+                return
+        self.current += text
+        yield {'type': 'token', 'bubble': self.index, 'text': text}
+
+    def _close(self) -> Iterator[Dict]:
+        bubble = self.current.strip()
+        if bubble:
+            yield {'type': 'bubble', 'bubble': self.index, 'text': bubble}
+            self.index += 1
+        self.current = ''
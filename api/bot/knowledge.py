@@ -2,6 +2,7 @@
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional
+from bot import retrieval
 
 class KnowledgeBase:
     """
@@ -51,6 +52,7 @@ class KnowledgeBase:
                 result = self.db.table('company_knowledge_base').insert(entry_data).execute()
                 
             if result.data:
+                retrieval.upsert_entry(result.data[0])
                 return result.data[0]
             return None
             
@@ -104,7 +106,10 @@ class KnowledgeBase:
         try:
             updates['updated_at'] = datetime.utcnow().isoformat()
             result = self.db.table('company_knowledge_base').update(updates).eq('id', entry_id).execute()
-            return result.data[0] if result.data else None
+            if not result.data:
+                return None
+            retrieval.upsert_entry(result.data[0])
+            return result.data[0]
         except Exception as e:
             print(f"Error updating knowledge: {e}")
             return None
@@ -118,12 +123,16 @@ class KnowledgeBase:
             
         try:
             if soft_delete:
-                self.db.table('company_knowledge_base').update({
+                result = self.db.table('company_knowledge_base').update({
                     'is_active': False,
                     'updated_at': datetime.utcnow().isoformat()
                 }).eq('id', entry_id).execute()
             else:
-                self.db.table('company_knowledge_base').delete().eq('id', entry_id).execute()
+                result = self.db.table('company_knowledge_base').delete().eq('id', entry_id).execute()
+            
+            # Both return the affected row, which tells us whose index to update
+            for row in result.data or []:
+                retrieval.remove_entry(row.get('company_id'), entry_id)
             return True
         except Exception as e:
             print(f"Error deleting knowledge: {e}")
@@ -138,6 +147,7 @@ class KnowledgeBase:
             
         try:
             self.db.table('company_knowledge_base').delete().eq('company_id', company_id).execute()
+            retrieval.drop_index(company_id)
             return True
         except Exception as e:
             print(f"Error clearing knowledge: {e}")
@@ -0,0 +1,130 @@
+"""Bot Pool - warm CompanyBot instances reused across requests"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import tenant_cache
+from bot.engine import CompanyBot
+
+# Upper bound on pooled bots per process
+POOL_MAX_SIZE = int(os.getenv('BOT_POOL_MAX_SIZE', '64'))
+
+# Bots unused for this many seconds are dropped
+POOL_IDLE_TTL = float(os.getenv('BOT_POOL_IDLE_TTL', '900'))
+
+# Bots are rebuilt after this many seconds even when busy, so settings written
+# on another instance are picked up (same staleness bound as the tenant cache)
+POOL_MAX_AGE = float(os.getenv('BOT_POOL_MAX_AGE', str(tenant_cache.tenant_cache.ttl_seconds)))
+
+# Approximate memory the pool may hold (see CompanyBot.approx_size)
+POOL_MEMORY_BUDGET = int(os.getenv('BOT_POOL_MEMORY_MB', '32')) * 1024 * 1024
+
+
+class BotPool:
+    """
+    LRU pool of ready CompanyBot instances keyed by company.
+    A bot carries its resolved config, tool schemas and prompt prefix, so a
+    warm turn skips config loading entirely. CompanyBot keeps no per-request
+    state, so one instance can serve concurrent turns.
+    """
+
+    def __init__(self, max_size: int = POOL_MAX_SIZE, idle_ttl: float = POOL_IDLE_TTL,
+                 memory_budget: int = POOL_MEMORY_BUDGET):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self._bots: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, company_id: str, db_module) -> CompanyBot:
+        key = str(company_id)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            slot = self._bots.get(key)
+            if slot and now - slot['created'] < POOL_MAX_AGE:
+                slot['last_used'] = now
+                self._bots.move_to_end(key)
+                self.hits += 1
+                return slot['bot']
+            self.misses += 1
+
+        # Build outside the lock - config loading may hit the database
+        bot = CompanyBot(company_id, db_module)
+        if not bot.config:
+            # Config could not be loaded (unknown company / DB down) - do not pin it
+            return bot
+
+        size = bot.approx_size()
+        with self._lock:
+            previous = self._bots.pop(key, None)
+            if previous:
+                self._bytes -= previous['size']
+            self._bots[key] = {'bot': bot, 'size': size, 'created': now, 'last_used': now}
+            self._bytes += size
+            while self._bots and (len(self._bots) > self.max_size or self._bytes > self.memory_budget):
+                self._pop_oldest()
+        return bot
+
+    def invalidate(self, company_id: str) -> None:
+        with self._lock:
+            slot = self._bots.pop(str(company_id), None)
+            if slot:
+                self._bytes -= slot['size']
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bots.clear()
+            self._bytes = 0
+
+    def _evict_idle(self, now: float) -> None:
+        # Oldest-used first, so stop at the first bot that is still fresh
+        while self._bots:
+            slot = next(iter(self._bots.values()))
+            if now - slot['last_used'] < self.idle_ttl:
+                break
+            self._pop_oldest()
+
+    def _pop_oldest(self) -> None:
+        _, slot = self._bots.popitem(last=False)
+        self._bytes -= slot['size']
+        self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': len(self._bots),
+                'max_size': self.max_size,
+                'bytes': self._bytes,
+                'memory_budget': self.memory_budget,
+                'idle_ttl_seconds': self.idle_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+_pool: Optional[BotPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BotPool:
+    """Get the process-wide bot pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BotPool()
+                # Widget/company settings changed -> rebuild that tenant's bot
+                tenant_cache.on_invalidate(_pool.invalidate)
+    return _pool
+
+
+def get_bot(company_id: str, db_module) -> CompanyBot:
+    return get_pool().get(company_id, db_module)
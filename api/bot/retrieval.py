@@ -0,0 +1,295 @@
+"""Knowledge Retrieval - per-company BM25 index over company_knowledge_base"""
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Passages are built from whole paragraphs up to this many characters
+PASSAGE_MAX_CHARS = int(os.getenv('KNOWLEDGE_PASSAGE_CHARS', '800'))
+
+# Rebuild a company's index from the database after this many seconds, so
+# writes made by other instances are picked up eventually
+INDEX_TTL_SECONDS = float(os.getenv('KNOWLEDGE_INDEX_TTL', '300'))
+
+# Title terms count this many times per passage
+TITLE_WEIGHT = 2
+
+# bm25 (lexical), dense (bot/vectors.py) or hybrid (reciprocal rank fusion of both)
+RETRIEVER_MODE = os.getenv('KNOWLEDGE_RETRIEVER', 'bm25').lower()
+RRF_K = 60
+
+
+# =========================================================================
+# Analyzer (German / English)
+# =========================================================================
+
+_FOLD_MAP = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it
+its me my no not of on or our so that the their them there these they this to
+was we were what when where which who why will with you your
+aber als am an auch auf aus bei bin bis bist da damit dann das dass dein deine
+dem den der des dich die dies diese dieser dir doch du durch ein eine einem
+einen einer eines er es euch euer fuer gibt hab habe haben hat hatte ich ihr
+ihre im in ist ja jede jeder kann kannst koennen mein meine mich mir mit muss
+nach nicht noch nur ob oder ohne sein sich sie sind so ueber um und uns unser
+unter vom von vor war waren warum was weil welche welcher wenn wer wie wir
+wird wo zu zum zur
+""".split())
+
+# Longest suffix first; only one suffix is stripped per token
+_SUFFIXES = (
+    'ungen', 'heiten', 'keiten',
+    'ung', 'heit', 'keit', 'lich', 'isch', 'ing', 'ern',
+    'en', 'er', 'es', 'em', 'ed', 'ly',
+    'e', 'n', 's',
+)
+_MIN_STEM = 3
+
+
+def fold(text: str) -> str:
+    """Lowercase, fold German umlauts/sharp s and strip remaining accents"""
+    text = (text or '').lower().translate(_FOLD_MAP)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping - groups 'führung'/'führen', 'seminars'/'seminar'"""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Turn text into index terms: fold, tokenize, drop stopwords, stem"""
+    return [stem(tok) for tok in _TOKEN_RE.findall(fold(text))
+            if tok not in STOPWORDS and len(tok) > 1]
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_MAX_CHARS) -> List[str]:
+    """Split an entry into passages made of whole paragraphs (long paragraphs are cut on sentences)"""
+    passages = []
+    current = ''
+    for para in re.split(r'\n\s*\n', text or ''):
+        para = para.strip()
+        if not para:
+            continue
+        pieces = [para]
+        if len(para) > max_chars:
+            pieces = re.split(r'(?<=[.!?])\s+', para)
+        for piece in pieces:
+            while len(piece) > max_chars:
+                # No sentence boundary to use - hard cut
+                if current:
+                    passages.append(current)
+                    current = ''
+                passages.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            if current and len(current) + len(piece) + 2 > max_chars:
+                passages.append(current)
+                current = ''
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+# =========================================================================
+# BM25 index
+# =========================================================================
+
+class BM25Index:
+    """
+    Inverted index over knowledge passages.
+    Document frequencies and average length are computed at query time, so
+    adding or removing an entry keeps scores exact without a full rebuild.
+    """
+
+    def __init__(self):
+        self.passages: Dict[Tuple[str, int], Dict] = {}
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = defaultdict(dict)
+        self.entry_passages: Dict[str, List[Tuple[str, int]]] = {}
+        self.passage_terms: Dict[Tuple[str, int], List[str]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add_entry(self, entry: Dict) -> None:
+        """Index an active knowledge entry (replaces any previous version)"""
+        with self._lock:
+            self._add_entry(entry)
+
+    def _add_entry(self, entry: Dict) -> None:
+        entry_id = str(entry.get('id'))
+        self.remove_entry(entry_id)
+        if entry.get('is_active') is False:
+            return
+
+        title = entry.get('title') or ''
+        title_terms = analyze(title) * TITLE_WEIGHT
+        keys = []
+        for no, text in enumerate(split_passages(entry.get('content') or '') or [title]):
+            terms = analyze(text) + title_terms
+            if not terms:
+                continue
+            key = (entry_id, no)
+            self.passages[key] = {
+                'entry_id': entry_id,
+                'passage': no,
+                'title': title,
+                'text': text,
+                'category': entry.get('category'),
+                'length': len(terms)
+            }
+            counts = Counter(terms)
+            for term, tf in counts.items():
+                self.postings[term][key] = tf
+            self.passage_terms[key] = list(counts)
+            self.total_length += len(terms)
+            keys.append(key)
+        self.entry_passages[entry_id] = keys
+
+    def remove_entry(self, entry_id: str) -> None:
+        with self._lock:
+            for key in self.entry_passages.pop(str(entry_id), []):
+                passage = self.passages.pop(key)
+                self.total_length -= passage['length']
+                for term in self.passage_terms.pop(key):
+                    docs = self.postings[term]
+                    docs.pop(key, None)
+                    if not docs:
+                        del self.postings[term]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        """Return the top-k (score, passage) pairs for a query"""
+        with self._lock:
+            return self._search(query, k)
+
+    def _search(self, query: str, k: int) -> List[Tuple[float, Dict]]:
+        n = len(self.passages)
+        if not n:
+            return []
+        avgdl = self.total_length / n
+        scores: Dict[Tuple[str, int], float] = defaultdict(float)
+
+        for term in set(analyze(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for key, tf in docs.items():
+                length = self.passages[key]['length']
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+                scores[key] += idf * tf * (BM25_K1 + 1) / norm
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.passages[key]) for key, score in top]
+
+
+# =========================================================================
+# Per-company registry
+# =========================================================================
+
+_indexes: Dict[str, Tuple[float, BM25Index]] = {}
+_lock = threading.Lock()
+
+
+def get_index(company_id: str, loader: Callable[[str], List[Dict]]) -> BM25Index:
+    """Get (building if needed) the index for a company; loader returns its active entries"""
+    company_id = str(company_id)
+    with _lock:
+        cached = _indexes.get(company_id)
+    if cached and time.monotonic() - cached[0] < INDEX_TTL_SECONDS:
+        return cached[1]
+
+    entries = loader(company_id)
+    index = BM25Index()
+    for entry in entries or []:
+        index.add_entry(entry)
+    # None means the load failed - serve the empty index but retry next call
+    if entries is not None:
+        with _lock:
+            _indexes[company_id] = (time.monotonic(), index)
+    return index
+
+
+def search(company_id: str, query: str, loader: Callable[[str], List[Dict]],
+           k: int = 5, mode: str = None) -> List[Tuple[float, Dict]]:
+    """Top-k passages for a query using the configured retriever"""
+    mode = mode or RETRIEVER_MODE
+    if mode not in ('dense', 'hybrid'):
+        return get_index(company_id, loader).search(query, k)
+
+    # NumPy is only needed for the dense retrievers
+    from bot import vectors
+    if mode == 'dense':
+        return vectors.search(company_id, query, loader, k)
+    return fuse_rrf([
+        get_index(company_id, loader).search(query, k * 3),
+        vectors.search(company_id, query, loader, k * 3)
+    ], k)
+
+
+def fuse_rrf(result_lists: List[List[Tuple[float, Dict]]], k: int = 5) -> List[Tuple[float, Dict]]:
+    """Reciprocal rank fusion - combines rankings without comparing raw scores"""
+    scores: Dict[Tuple[str, int], float] = defaultdict(float)
+    passages: Dict[Tuple[str, int], Dict] = {}
+    for results in result_lists:
+        for rank, (_, passage) in enumerate(results):
+            key = (passage['entry_id'], passage['passage'])
+            scores[key] += 1.0 / (RRF_K + rank + 1)
+            passages[key] = passage
+    top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(score, passages[key]) for key, score in top]
+
+
+# Callbacks run with the company id whenever its knowledge changes (e.g. dense index)
+_change_listeners: List[Callable[[str], None]] = []
+
+
+def on_change(listener: Callable[[str], None]) -> None:
+    _change_listeners.append(listener)
+
+
+def _notify(company_id: str) -> None:
+    for listener in list(_change_listeners):
+        listener(str(company_id))
+
+
+def upsert_entry(entry: Optional[Dict]) -> None:
+    """Apply an added/updated entry to its company's index if that index is loaded"""
+    if not entry or not entry.get('company_id'):
+        return
+    with _lock:
+        cached = _indexes.get(str(entry['company_id']))
+        if cached:
+            cached[1].add_entry(entry)
+    _notify(entry['company_id'])
+
+
+def remove_entry(company_id: str, entry_id: str) -> None:
+    with _lock:
+        cached = _indexes.get(str(company_id))
+        if cached:
+            cached[1].remove_entry(entry_id)
+    _notify(company_id)
+
+
+def drop_index(company_id: str) -> None:
+    with _lock:
+        _indexes.pop(str(company_id), None)
+    _notify(company_id)
@@ -0,0 +1,250 @@
+"""Seminar Matcher - compiled keyword scoring for the legacy seminar context
+
+db.get_seminar_context used to fetch every seminar_qa row per message and
+run nested substring loops (category keywords, seminar names, name parts,
+row keywords). The catalog is now compiled once into an Aho-Corasick
+automaton whose patterns carry precomputed score weights, so scoring a
+message is a single pass over the query regardless of catalog size.
+
+Misspelled words ("Laterals Führen", "Konflikmanagment") are corrected against
+the catalog's seminar names and keywords (bot/spelling.py) and the corrected
+query is matched as well. Category keywords are not correction targets and
+the category intent only comes from words the user actually typed, so
+"Wie geht es weiter?" never turns into a Führung question.
+
+Scoring:
+    +20  item category contains the detected category intent
+    +50  full seminar name appears in the query
+    +10  per name part (> 3 chars) appearing in the query
+    +5   per row keyword appearing in the query
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import tenant_cache
+from bot.spelling import SpellingIndex, words
+
+# Rebuild the catalog from the database after this many seconds
+CATALOG_TTL_SECONDS = float(os.getenv('SEMINAR_CATALOG_TTL', '300'))
+
+# Correct misspelled seminar names / keywords before matching
+FUZZY_MATCH = os.getenv('SEMINAR_FUZZY_MATCH', 'true').lower() == 'true'
+
+# First category whose keywords appear in the query is the intent (order matters)
+CATEGORY_MAP = {
+    "führung": ["führung", "führen", "leiter", "chef", "leadership"],
+    "kommunikation": ["kommunikation", "kommunizieren", "reden", "gespräch", "konflikt", "verhandlung"],
+    "gesundheit": ["gesundheit", "resilienz", "stress", "ausgleich", "mental"],
+    "management": ["management", "organisation", "zeit", "projekt", "planung"],
+    "change": ["change", "wandel", "veränderung", "transformation"]
+}
+
+CATEGORY_WEIGHT = 20
+NAME_WEIGHT = 50
+NAME_PART_WEIGHT = 10
+KEYWORD_WEIGHT = 5
+NAME_PART_MIN_LEN = 4
+
+# Without a category intent only the best matches are listed
+DEFAULT_LIMIT = 8
+
+
+class AhoCorasick:
+    """Multi-pattern substring automaton; find() reports every pattern id contained in a text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[int, ...]] = [()]
+        own: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    own.append([])
+                node = nxt
+            own[node].append(pattern_id)
+
+        # Breadth-first: a node's outputs are its own plus those of its fail node
+        self.out = [()] * len(self.goto)
+        queue = deque()
+        for child in self.goto[0].values():
+            self.out[child] = tuple(own[child])
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = tuple(own[child]) + self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, text: str) -> Set[int]:
+        goto, fail, out = self.goto, self.fail, self.out
+        found: Set[int] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class SeminarCatalog:
+    """seminar_qa rows compiled into one automaton with per-pattern score weights"""
+
+    def __init__(self, items: List[Dict], category_map: Dict[str, List[str]] = CATEGORY_MAP,
+                 fuzzy: bool = FUZZY_MATCH):
+        self.items = list(items)
+        self.categories = list(category_map)
+
+        patterns: Dict[str, int] = {}
+        # pattern id -> {item index: weight}, pattern id -> category indexes it signals
+        self.weights: List[Dict[int, int]] = []
+        self.signals: List[Set[int]] = []
+
+        def pattern_id(text: str) -> int:
+            if text not in patterns:
+                patterns[text] = len(patterns)
+                self.weights.append(defaultdict(int))
+                self.signals.append(set())
+            return patterns[text]
+
+        for cat_index, keywords in enumerate(category_map.values()):
+            for keyword in keywords:
+                self.signals[pattern_id(keyword.lower())].add(cat_index)
+
+        # Items whose category contains each intent get the category boost
+        self.members: List[List[int]] = [[] for _ in self.categories]
+        for index, item in enumerate(self.items):
+            item_cat = (item.get('category') or '').lower()
+            for cat_index, cat in enumerate(self.categories):
+                if cat in item_cat:
+                    self.members[cat_index].append(index)
+
+            sem_name = (item.get('seminar_name') or '').lower()
+            if sem_name:
+                self.weights[pattern_id(sem_name)][index] += NAME_WEIGHT
+            for part in sem_name.split():
+                if len(part) >= NAME_PART_MIN_LEN:
+                    self.weights[pattern_id(part)][index] += NAME_PART_WEIGHT
+            for keyword in item.get('keywords') or []:
+                if keyword:
+                    self.weights[pattern_id(keyword.lower())][index] += KEYWORD_WEIGHT
+
+        self.patterns = list(patterns)
+        self.automaton = AhoCorasick(self.patterns)
+        self.spelling = SpellingIndex(self._spelling_terms(category_map)) if fuzzy else None
+
+    def _spelling_terms(self, category_map: Dict[str, List[str]]) -> List[str]:
+        """Words of the name/keyword patterns, minus category keywords and short name parts"""
+        category_words = {w for keywords in category_map.values() for k in keywords for _, _, w in words(k)}
+        return [w for pid, p in enumerate(self.patterns) if self.weights[pid]
+                for _, _, w in words(p)
+                if len(w) >= NAME_PART_MIN_LEN and w not in category_words]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def score(self, query_text: str) -> Tuple[Optional[str], List[Tuple[int, Dict]]]:
+        """(category intent, [(score, item), ...] best first) for a query"""
+        clean_query = query_text.lower()
+        exact = self.automaton.find(clean_query)
+        matched = set(exact)
+        if self.spelling is not None:
+            corrected = self.spelling.correct(clean_query)
+            if corrected != clean_query:
+                matched |= self.automaton.find(corrected)
+        return self.score_matches(matched, exact)
+
+    def score_matches(self, matched: Iterable[int],
+                      exact: Optional[Set[int]] = None) -> Tuple[Optional[str], List[Tuple[int, Dict]]]:
+        """Score a set of matched pattern ids; only ids in exact (default: all) signal an intent"""
+        scores: Dict[int, int] = defaultdict(int)
+        intent = None
+        for pid in matched:
+            if self.signals[pid] and (exact is None or pid in exact):
+                first = min(self.signals[pid])
+                intent = first if intent is None else min(intent, first)
+            for index, weight in self.weights[pid].items():
+                scores[index] += weight
+        if intent is not None:
+            for index in self.members[intent]:
+                scores[index] += CATEGORY_WEIGHT
+
+        # Best score first, catalog order on ties (same as the stable sort before)
+        ranked = sorted((i for i, s in scores.items() if s > 0), key=lambda i: (-scores[i], i))
+        return (self.categories[intent] if intent is not None else None,
+                [(scores[i], self.items[i]) for i in ranked])
+
+    def context(self, query_text: str) -> str:
+        """Formatted STRICT SEMINAR SOURCE block for the prompt ('' when nothing matches)"""
+        intent, matched_items = self.score(query_text)
+        if not matched_items:
+            return ""
+
+        # With a category intent list the whole category, otherwise only the best matches
+        top_matches = matched_items if intent else matched_items[:DEFAULT_LIMIT]
+
+        context_str = "### STRICT SEMINAR SOURCE (ONLY use these entries, DO NOT invent others):\n\n"
+        for _, item in top_matches:
+            context_str += f"Title: {item.get('seminar_name')}\n"
+            context_str += f"Category: {item.get('category')}\n"
+            # Simplify info to save tokens if listing many
+            context_str += f"Info: {(item.get('answer') or '')[:300]}...\n"
+            context_str += "---\n"
+        return context_str
+
+
+# =========================================================================
+# Process-wide catalog
+# =========================================================================
+
+_catalog: Optional[Tuple[float, SeminarCatalog]] = None
+_lock = threading.Lock()
+
+
+def get_catalog(loader: Callable[[], Optional[List[Dict]]]) -> SeminarCatalog:
+    """Get (compiling if needed) the seminar catalog; loader returns all seminar_qa rows"""
+    global _catalog
+    with _lock:
+        cached = _catalog
+    if cached and time.monotonic() - cached[0] < CATALOG_TTL_SECONDS:
+        return cached[1]
+
+    rows = loader()
+    catalog = SeminarCatalog(rows or [])
+    # None means the load failed - serve what we have (or an empty catalog) and retry next call
+    if rows is not None:
+        with _lock:
+            _catalog = (time.monotonic(), catalog)
+    elif cached:
+        return cached[1]
+    return catalog
+
+
+def invalidate(company_id: Optional[str] = None) -> None:
+    """Drop the compiled catalog so the next message reloads seminar_qa"""
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+# The catalog is shared by all tenants; any tenant refresh (settings saved,
+# company updated) also picks up seminar edits without waiting for the TTL
+tenant_cache.on_invalidate(invalidate)
@@ -0,0 +1,163 @@
+"""Spelling - typo-tolerant term lookup (SymSpell-style symmetric delete index)
+
+Every catalog term is indexed under all strings reachable by deleting up
+to max_edits characters from its prefix. A misspelled word generates its
+own deletes; any shared key yields a candidate, which is then verified with
+a bounded Damerau-Levenshtein distance. Lookup cost depends on the word
+length and max_edits, not on how many terms are indexed.
+
+Terms and queries are normalized with normalize_string, the same folding
+scripts/sanitize_db.py uses to match seminar titles.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Largest edit distance accepted for long words; shorter words get less (see max_edits_for)
+MAX_EDITS = int(os.getenv('SEMINAR_FUZZY_MAX_EDITS', '2'))
+
+# Only this many leading characters are indexed (SymSpell prefix length)
+PREFIX_LENGTH = 7
+
+# Words shorter than this are never corrected - too many false friends
+MIN_WORD_LENGTH = 5
+
+# Everyday words one or two edits away from catalog terms ("weiter" -> "leiter",
+# "frage" -> "fragen"); they are never corrected. Normalized spelling.
+STOPWORDS = frozenset({
+    'weiter', 'weitere', 'weiteren', 'weiterhin', 'frage', 'fragen', 'leiten',
+    'leider', 'bitte', 'danke', 'gerne', 'heute', 'morgen', 'wieder', 'immer',
+    'schon', 'haben', 'hallo', 'vielen', 'welche', 'welcher', 'welches',
+    'koennen', 'koennte', 'moechte', 'wuerde', 'meine', 'meinen', 'seite',
+    'zeigen', 'lernen', 'reden', 'sagen', 'sehen', 'gehen', 'geben',
+})
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize_string(s: str) -> str:
+    return s.lower().strip().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss").replace("-", " ")
+
+
+def words(text: str) -> List[Tuple[int, int, str]]:
+    """(start, end, word) spans of the lowercased text"""
+    return [(m.start(), m.end(), m.group()) for m in _WORD_RE.finditer(text.lower())]
+
+
+def max_edits_for(word: str, limit: int = MAX_EDITS) -> int:
+    if len(word) < MIN_WORD_LENGTH:
+        return 0
+    return min(limit, 1 if len(word) < 8 else 2)
+
+
+def _deletes(word: str, max_edits: int) -> Set[str]:
+    """word plus every string reachable by deleting up to max_edits characters"""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_edits):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= found
+        found |= nxt
+        frontier = nxt
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it is certainly larger"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: Optional[List[int]] = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, prev2[j - 2] + 1)
+            cur[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class SpellingIndex:
+    """Normalized terms -> surface form, with symmetric-delete candidate lookup"""
+
+    def __init__(self, terms: Iterable[str], max_edits: int = MAX_EDITS):
+        self.max_edits = max_edits
+        # normalized term -> (surface form as written in the catalog, occurrences)
+        self.terms: Dict[str, Tuple[str, int]] = {}
+        self.deletes: Dict[str, List[str]] = {}
+
+        for surface in terms:
+            surface = surface.lower()
+            term = normalize_string(surface)
+            if not term or ' ' in term:
+                continue
+            known = self.terms.get(term)
+            self.terms[term] = (known[0], known[1] + 1) if known else (surface, 1)
+
+        for term in self.terms:
+            edits = max_edits_for(term, max_edits)
+            if not edits:
+                continue
+            for key in _deletes(term[:PREFIX_LENGTH], edits):
+                self.deletes.setdefault(key, []).append(term)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, word: str) -> Optional[Tuple[str, int]]:
+        """(surface form, distance) of the closest indexed term, or None"""
+        word = normalize_string(word)
+        if word in self.terms:
+            return self.terms[word][0], 0
+        if word in STOPWORDS:
+            return None
+        edits = max_edits_for(word, self.max_edits)
+        if not edits:
+            return None
+
+        best: Optional[Tuple[int, int, str]] = None
+        seen: Set[str] = set()
+        for key in _deletes(word[:PREFIX_LENGTH], edits):
+            for term in self.deletes.get(key, ()):
+                if term in seen:
+                    continue
+                seen.add(term)
+                distance = edit_distance(word, term, edits)
+                if distance > edits:
+                    continue
+                # Closest first, then the term the catalog uses most often
+                rank = (distance, -self.terms[term][1], term)
+                if best is None or rank < best:
+                    best = rank
+        if best is None:
+            return None
+        return self.terms[best[2]][0], best[0]
+
+    def correct(self, text: str) -> str:
+        """Lowercased text with misspelled words replaced by their catalog spelling"""
+        text = text.lower()
+        parts: List[str] = []
+        last = 0
+        for start, end, word in words(text):
+            hit = self.lookup(word)
+            # Also rewrites folded spellings ("fuehren" -> "führen") so exact patterns match
+            if hit and hit[0] != word:
+                parts.append(text[last:start])
+                parts.append(hit[0])
+                last = end
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return ''.join(parts)
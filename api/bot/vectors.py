@@ -0,0 +1,216 @@
+"""Dense Knowledge Retrieval - offline hashed vectors with a NumPy cosine index"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bot import retrieval
+from bot.retrieval import analyze, split_passages, INDEX_TTL_SECONDS
+
+# Dimension of the hashed feature space
+VECTOR_DIM = int(os.getenv('KNOWLEDGE_VECTOR_DIM', '1024'))
+
+# Per-company <company_id>.npy + <company_id>.json live here (/tmp is the only
+# writable path on Vercel; warm instances reuse the files)
+VECTOR_DIR = os.getenv('KNOWLEDGE_VECTOR_DIR') or os.path.join(tempfile.gettempdir(), 'syntra_vectors')
+
+# Bump when the featurization changes so stale files are re-embedded
+VECTORIZER_VERSION = 1
+
+# Character n-gram size for sub-word features (compounds like "Führungskräfte")
+CHAR_NGRAM = 4
+
+
+class HashingVectorizer:
+    """
+    Stateless text -> vector mapping using the hashing trick.
+    Features are the analyzed terms plus character n-grams of each term, so
+    German compounds and inflections still overlap. Vectors are L2-normalized,
+    which makes a dot product the cosine similarity.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for term in analyze(text):
+            features.append(term)
+            padded = f"<{term}>"
+            if len(padded) > CHAR_NGRAM:
+                features.extend(padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1))
+        return features
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                # Low bits pick the column, one high bit the sign (reduces collision bias)
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        # Sublinear term frequency, then unit length
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """Normalized passage vectors (rows) plus the passage metadata"""
+
+    def __init__(self, matrix: np.ndarray, passages: List[Dict], vectorizer: HashingVectorizer):
+        self.matrix = matrix
+        self.passages = passages
+        self.vectorizer = vectorizer
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Tuple[float, Dict]]]:
+        """Cosine top-k for many queries with one matrix product"""
+        if not len(self.passages) or not queries:
+            return [[] for _ in queries]
+        scores = self.vectorizer.transform(queries) @ self.matrix.T
+        k = min(k, scores.shape[1])
+        # argpartition finds the k best in O(n); only those get sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(float(scores[row, i]), self.passages[i])
+                            for i in ordered if scores[row, i] > 0])
+        return results
+
+
+def build_passages(entries: List[Dict]) -> List[Dict]:
+    """Same passage split as the BM25 index; the title is embedded with each passage"""
+    passages = []
+    for entry in entries:
+        if entry.get('is_active') is False:
+            continue
+        title = entry.get('title') or ''
+        for no, text in enumerate(split_passages(entry.get('content') or '') or [title]):
+            passages.append({
+                'entry_id': str(entry.get('id')),
+                'passage': no,
+                'title': title,
+                'text': text,
+                'category': entry.get('category')
+            })
+    return passages
+
+
+def fingerprint(entries: List[Dict], dim: int = VECTOR_DIM) -> str:
+    """Content hash of a company's entries - decides whether the persisted vectors are reusable"""
+    digest = hashlib.sha256(f"v{VECTORIZER_VERSION}:{dim}".encode())
+    for entry in sorted(entries, key=lambda e: str(e.get('id'))):
+        digest.update(json.dumps(
+            [str(entry.get('id')), entry.get('title'), entry.get('content'), entry.get('is_active')],
+            ensure_ascii=False
+        ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_index(entries: List[Dict], vectorizer: HashingVectorizer = None) -> VectorIndex:
+    vectorizer = vectorizer or HashingVectorizer()
+    passages = build_passages(entries)
+    texts = [f"{p['title']}\n{p['text']}" for p in passages]
+    matrix = vectorizer.transform(texts) if texts else np.zeros((0, vectorizer.dim), dtype=np.float32)
+    return VectorIndex(matrix, passages, vectorizer)
+
+
+# =========================================================================
+# Persistence (memory-mapped per company)
+# =========================================================================
+
+def _paths(company_id: str) -> Tuple[str, str]:
+    safe = ''.join(ch for ch in str(company_id) if ch.isalnum() or ch in '-_')
+    return os.path.join(VECTOR_DIR, f"{safe}.npy"), os.path.join(VECTOR_DIR, f"{safe}.json")
+
+
+def save_index(company_id: str, index: VectorIndex, fp: str) -> None:
+    """Write matrix + sidecar atomically (rename) so readers never see half a file"""
+    try:
+        os.makedirs(VECTOR_DIR, exist_ok=True)
+        npy_path, meta_path = _paths(company_id)
+        tmp_npy = f"{npy_path}.{os.getpid()}.tmp"
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_npy, 'wb') as f:
+            np.save(f, np.ascontiguousarray(index.matrix, dtype=np.float32))
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fp, 'dim': index.vectorizer.dim, 'passages': index.passages}, f, ensure_ascii=False)
+        os.replace(tmp_npy, npy_path)
+        os.replace(tmp_meta, meta_path)
+    except Exception as e:
+        print(f"Error persisting vectors for {company_id}: {e}")
+
+
+def load_index(company_id: str, fp: str) -> Optional[VectorIndex]:
+    """Memory-map persisted vectors if they match the fingerprint"""
+    npy_path, meta_path = _paths(company_id)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') != fp:
+            return None
+        matrix = np.load(npy_path, mmap_mode='r')
+        if matrix.shape != (len(meta['passages']), meta['dim']):
+            return None
+        return VectorIndex(matrix, meta['passages'], HashingVectorizer(meta['dim']))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# =========================================================================
+# Per-company registry
+# =========================================================================
+
+_indexes: Dict[str, Tuple[float, VectorIndex]] = {}
+_lock = threading.Lock()
+
+
+def get_index(company_id: str, loader: Callable[[str], List[Dict]]) -> VectorIndex:
+    """In-memory index -> persisted file (same fingerprint) -> re-embed, in that order"""
+    company_id = str(company_id)
+    with _lock:
+        cached = _indexes.get(company_id)
+    if cached and time.monotonic() - cached[0] < INDEX_TTL_SECONDS:
+        return cached[1]
+
+    entries = loader(company_id)
+    if entries is None:
+        return build_index([])
+
+    fp = fingerprint(entries)
+    index = load_index(company_id, fp)
+    if index is None:
+        index = build_index(entries)
+        save_index(company_id, index, fp)
+
+    with _lock:
+        _indexes[company_id] = (time.monotonic(), index)
+    return index
+
+
+def search(company_id: str, query: str, loader: Callable[[str], List[Dict]],
+           k: int = 5) -> List[Tuple[float, Dict]]:
+    return get_index(company_id, loader).search(query, k)
+
+
+def invalidate(company_id: str) -> None:
+    """Forget the in-memory index; the next search re-checks the fingerprint"""
+    with _lock:
+        _indexes.pop(str(company_id), None)
+
+
+# Knowledge writes go through bot/retrieval.py; re-check the fingerprint after them
+retrieval.on_change(invalidate)
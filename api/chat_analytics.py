@@ -5,18 +5,184 @@ This service tracks:
 - Messages sent per company
 - Sessions created per company
 - Tokens consumed per company
-- Average response times
+- Average response times (sum/count plus a latency histogram)
 
 Statistics are aggregated daily for efficient querying.
+
+Events are buffered in memory per (company, day) and flushed as one batched
+upsert every CHAT_STATS_FLUSH_INTERVAL seconds or CHAT_STATS_FLUSH_EVENTS
+events, and at shutdown. Deltas merge additively in the database, so any
+number of workers can flush independently. Each batch carries an id the
+database records, so a batch that failed (or timed out after committing) is
+resent unchanged and applied at most once.
+
+Serverless instances are frozen after the response and may never flush, so
+buffering is off by default on Vercel; CHAT_STATS_BUFFERED overrides it.
 """
 
-from datetime import datetime, date, timedelta, timezone
-from typing import Optional, Dict, List, Any
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional, Dict, List, Any, Tuple
 import db
+import background
+import chat_stats_store
+from tenant_cache import TTLCache
+
+CHAT_STATS_BUFFERED = os.getenv('CHAT_STATS_BUFFERED', 'false' if os.getenv('VERCEL') else 'true').lower() == 'true'
+CHAT_STATS_FLUSH_INTERVAL = float(os.getenv('CHAT_STATS_FLUSH_INTERVAL', '10'))
+CHAT_STATS_FLUSH_EVENTS = int(os.getenv('CHAT_STATS_FLUSH_EVENTS', '200'))
+
+# Admin cross-company summary (seconds)
+CHAT_SUMMARY_CACHE_TTL = float(os.getenv('CHAT_SUMMARY_CACHE_TTL', '60'))
+_summary_cache = TTLCache('chat_summary', ttl_seconds=CHAT_SUMMARY_CACHE_TTL, max_size=16)
+
+
+class StatsBuffer:
+    """Write-behind counters per (company_id, day), flushed as batched deltas"""
+
+    def __init__(self, flush_interval: float = CHAT_STATS_FLUSH_INTERVAL,
+                 flush_events: int = CHAT_STATS_FLUSH_EVENTS):
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self._deltas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        # Serializes flushes; batches that failed are resent first, unchanged (same id)
+        self._flush_lock = threading.Lock()
+        self._failed: List[Tuple[str, List[Dict[str, Any]]]] = []
+        self._wake = threading.Event()
+        self._thread = None
+        self.counters = {'events': 0, 'flushes': 0, 'rows_flushed': 0, 'flush_errors': 0}
+        self.last_flush_ms = 0.0
+
+    def add(self, company_id: str, messages: int = 0, sessions: int = 0, tokens: int = 0,
+            response_time_ms: Optional[float] = None, day: date = None) -> None:
+        key = (str(company_id), str(day or date.today()))
+        with self._lock:
+            delta = self._deltas.get(key)
+            if delta is None:
+                delta = self._deltas[key] = self._empty()
+            delta['messages'] += messages
+            delta['sessions'] += sessions
+            delta['tokens'] += tokens
+            if response_time_ms:
+                delta['response_time_sum_ms'] += int(response_time_ms)
+                delta['response_time_count'] += 1
+                bucket = chat_stats_store.latency_bucket(response_time_ms)
+                delta['response_time_histogram'][bucket] = delta['response_time_histogram'].get(bucket, 0) + 1
+            self._events += 1
+            self.counters['events'] += 1
+            full = self._events >= self.flush_events
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write all buffered deltas in one batch. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._deltas = self._deltas, {}
+                self._events = 0
+            batches, self._failed = self._failed, []
+            if pending:
+                batches.append((str(uuid.uuid4()), [{'company_id': company_id, 'date': day, **delta}
+                                                     for (company_id, day), delta in pending.items()]))
+
+            written = 0
+            for position, (batch_id, rows) in enumerate(batches):
+                started = time.perf_counter()
+                try:
+                    chat_stats_store.get_store().increment_many(rows, batch_id=batch_id)
+                except Exception as e:
+                    # The batch may have been applied before the error; resending
+                    # it with the same id on the next flush cannot double count
+                    self.counters['flush_errors'] += 1
+                    print(f"Error flushing chat statistics ({len(rows)} rows): {e}")
+                    self._failed = batches[position:]
+                    break
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                self.counters['flushes'] += 1
+                self.counters['rows_flushed'] += len(rows)
+                written += len(rows)
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered_rows, buffered_events = len(self._deltas), self._events
+        return {
+            'buffered_rows': buffered_rows,
+            'buffered_events': buffered_events,
+            'failed_batches': len(self._failed),
+            'flush_interval_seconds': self.flush_interval,
+            'flush_events': self.flush_events,
+            'last_flush_ms': round(self.last_flush_ms, 1),
+            **self.counters
+        }
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {
+            'messages': 0, 'sessions': 0, 'tokens': 0,
+            'response_time_sum_ms': 0, 'response_time_count': 0,
+            'response_time_histogram': {}
+        }
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='chat-stats-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Woken early when the event threshold is reached
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_buffer = StatsBuffer()
+
+
+def get_buffer() -> StatsBuffer:
+    return _buffer
+
+
+def flush() -> int:
+    """Flush buffered statistics now (e.g. before reading them back)"""
+    return _buffer.flush()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    # Queued analytics tasks may still add events - drain them first
+    background.get_queue().flush()
+    _buffer.flush()
+
+
+def _increment(company_id: str, event_id: Optional[str], **deltas) -> None:
+    """Single atomic upsert-increment; with an event id it is applied at most once"""
+    store = chat_stats_store.get_store()
+    if event_id:
+        # Same idempotency record as buffered batches (chat_statistics_batches)
+        store.increment_many([{'company_id': company_id, 'date': date.today(), **deltas}],
+                             batch_id=event_id)
+    else:
+        store.increment(company_id, date.today(), **deltas)
 
 
 def track_message(company_id: Optional[str], tokens_used: Optional[int] = 0, 
-                 response_time_ms: Optional[int] = None) -> None:
+                 response_time_ms: Optional[int] = None,
+                 event_id: Optional[str] = None,
+                 raise_errors: bool = False) -> None:
     """
     Track a chat message and update daily statistics.
     
@@ -24,100 +190,57 @@ def track_message(company_id: Optional[str], tokens_used: Optional[int] = 0,
         company_id: Company UUID (None for non-company sessions)
         tokens_used: Number of AI tokens consumed
         response_time_ms: Response time in milliseconds
+        event_id: UUID of the event; a retried event is counted once (unbuffered writes)
+        raise_errors: Re-raise store errors, so the background queue retries the event
     """
     if not company_id:
         return  # Skip tracking if no company
     
     try:
-        db_client = db.get_db()
-        if not db_client:
-            print("Database not available for chat analytics")
+        if CHAT_STATS_BUFFERED:
+            _buffer.add(company_id, messages=1, tokens=tokens_used or 0,
+                        response_time_ms=response_time_ms)
             return
-        
-        today = date.today()
-        
-        # Upsert daily statistics
-        # PostgreSQL doesn't have native UPSERT in basic queries, use ON CONFLICT
-        result = db_client.table('chat_statistics').select('*').eq(
-            'company_id', company_id
-        ).eq('date', str(today)).execute()
-        
-        if result.data and len(result.data) > 0:
-            # Update existing record
-            stats = result.data[0]
-            new_total_messages = stats['total_messages'] + 1
-            new_total_tokens = stats['total_tokens'] + (tokens_used or 0)
-            
-            # Calculate running average response time
-            if response_time_ms and stats['avg_response_time_ms']:
-                old_avg = stats['avg_response_time_ms']
-                old_count = stats['total_messages']
-                new_avg = ((old_avg * old_count) + response_time_ms) / new_total_messages
-            elif response_time_ms:
-                new_avg = response_time_ms
-            else:
-                new_avg = stats['avg_response_time_ms']
-            
-            db_client.table('chat_statistics').update({
-                'total_messages': new_total_messages,
-                'total_tokens': new_total_tokens,
-                'avg_response_time_ms': int(new_avg) if new_avg else None,
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('id', stats['id']).execute()
-        else:
-            # Insert new record
-            db_client.table('chat_statistics').insert({
-                'company_id': company_id,
-                'date': str(today),
-                'total_messages': 1,
-                'total_sessions': 0,  # Updated separately
-                'total_tokens': tokens_used or 0,
-                'avg_response_time_ms': response_time_ms
-            }).execute()
-            
+
+        _increment(
+            company_id,
+            event_id,
+            messages=1,
+            tokens=tokens_used or 0,
+            response_time_sum_ms=int(response_time_ms) if response_time_ms else 0,
+            response_time_count=1 if response_time_ms else 0,
+            response_time_histogram=(
+                {chat_stats_store.latency_bucket(response_time_ms): 1} if response_time_ms else {}
+            )
+        )
     except Exception as e:
         print(f"Error tracking message stats: {e}")
+        if raise_errors:
+            raise
 
 
-def track_session(company_id: Optional[str]) -> None:
+def track_session(company_id: Optional[str], event_id: Optional[str] = None,
+                  raise_errors: bool = False) -> None:
     """
     Increment session count for a company.
     
     Args:
         company_id: Company UUID
+        event_id: UUID of the event; a retried event is counted once (unbuffered writes)
+        raise_errors: Re-raise store errors, so the background queue retries the event
     """
     if not company_id:
         return
     
     try:
-        db_client = db.get_db()
-        if not db_client:
+        if CHAT_STATS_BUFFERED:
+            _buffer.add(company_id, sessions=1)
             return
-        
-        today = date.today()
-        
-        result = db_client.table('chat_statistics').select('*').eq(
-            'company_id', company_id
-        ).eq('date', str(today)).execute()
-        
-        if result.data and len(result.data) > 0:
-            stats = result.data[0]
-            db_client.table('chat_statistics').update({
-                'total_sessions': stats['total_sessions'] + 1,
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('id', stats['id']).execute()
-        else:
-            # Create initial record
-            db_client.table('chat_statistics').insert({
-                'company_id': company_id,
-                'date': str(today),
-                'total_messages': 0,
-                'total_sessions': 1,
-                'total_tokens': 0
-            }).execute()
-            
+        _increment(company_id, event_id, sessions=1)
     except Exception as e:
         print(f"Error tracking session: {e}")
+        if raise_errors:
+            raise
 
 
 def get_company_stats(company_id: str, days: int = 30) -> Dict[str, Any]:
@@ -149,12 +272,20 @@ def get_company_stats(company_id: str, days: int = 30) -> Dict[str, Any]:
         total_sessions = sum(s['total_sessions'] for s in daily_stats)
         total_tokens = sum(s['total_tokens'] for s in daily_stats)
         
-        # Average response time (weighted by message count)
+        # Average response time (weighted by timed responses; older rows only have the average)
         total_time = sum(
-            s['total_messages'] * (s['avg_response_time_ms'] or 0) 
+            s.get('response_time_sum_ms') or s['total_messages'] * (s['avg_response_time_ms'] or 0)
+            for s in daily_stats
+        )
+        timed = sum(
+            s.get('response_time_count') or (s['total_messages'] if s['avg_response_time_ms'] else 0)
             for s in daily_stats
         )
-        avg_response_time = total_time / total_messages if total_messages > 0 else None
+        avg_response_time = total_time / timed if timed > 0 else None
+        
+        histogram = {}
+        for s in daily_stats:
+            histogram = chat_stats_store.merge_histograms(histogram, s.get('response_time_histogram'))
         
         return {
             'period_days': days,
@@ -162,6 +293,7 @@ def get_company_stats(company_id: str, days: int = 30) -> Dict[str, Any]:
             'total_sessions': total_sessions,
             'total_tokens': total_tokens,
             'avg_response_time_ms': int(avg_response_time) if avg_response_time else None,
+            'response_time_histogram': histogram,
             'daily_breakdown': daily_stats
         }
         
@@ -170,50 +302,46 @@ def get_company_stats(company_id: str, days: int = 30) -> Dict[str, Any]:
         return {'error': str(e)}
 
 
-def get_all_companies_summary() -> List[Dict[str, Any]]:
+def get_all_companies_summary(days: int = 30) -> List[Dict[str, Any]]:
     """
     Get summary statistics for all companies (last 30 days).
     
+    One grouped query (get_chat_statistics_summary RPC) regardless of the
+    number of companies, cached for CHAT_SUMMARY_CACHE_TTL seconds.
+    
     Returns:
         List of company summaries with key metrics
     """
+    return _summary_cache.get_or_load(('summary', days), lambda: _load_companies_summary(days)) or []
+
+
+def _load_companies_summary(days: int) -> Optional[List[Dict[str, Any]]]:
+    """Uncached summary; None on error so failures are not cached"""
     try:
         db_client = db.get_db()
         if not db_client:
-            return []
-        
-        # Get all companies
-        companies_result = db_client.table('companies').select('id,name').execute()
-        if not companies_result.data:
-            return []
+            return None
         
-        companies = companies_result.data
-        summaries = []
+        start_date = date.today() - timedelta(days=days)
         
-        start_date = date.today() - timedelta(days=30)
+        try:
+            result = db_client.rpc('get_chat_statistics_summary', {
+                'p_start_date': str(start_date)
+            }).execute()
+            rows = result.data or []
+        except Exception as e:
+            # RPC not migrated yet - fall back to two bulk queries
+            print(f"get_chat_statistics_summary unavailable ({e}), using bulk fetch")
+            rows = _bulk_companies_summary(db_client, start_date)
         
-        for company in companies:
-            company_id = company['id']
-            
-            # Get stats for this company
-            stats_result = db_client.table('chat_statistics').select('*').eq(
-                'company_id', company_id
-            ).gte('date', str(start_date)).execute()
-            
-            stats = stats_result.data if stats_result.data else []
-            
-            total_messages = sum(s['total_messages'] for s in stats)
-            total_sessions = sum(s['total_sessions'] for s in stats)
-            total_tokens = sum(s['total_tokens'] for s in stats)
-            
-            summaries.append({
-                'company_id': company_id,
-                'company_name': company['name'],
-                'total_messages': total_messages,
-                'total_sessions': total_sessions,
-                'total_tokens': total_tokens,
-                'has_activity': total_messages > 0
-            })
+        summaries = [{
+            'company_id': row['company_id'],
+            'company_name': row['company_name'],
+            'total_messages': int(row['total_messages'] or 0),
+            'total_sessions': int(row['total_sessions'] or 0),
+            'total_tokens': int(row['total_tokens'] or 0),
+            'has_activity': (row['total_messages'] or 0) > 0
+        } for row in rows]
         
         # Sort by activity (most active first)
         summaries.sort(key=lambda x: x['total_messages'], reverse=True)
@@ -222,7 +350,40 @@ def get_all_companies_summary() -> List[Dict[str, Any]]:
         
     except Exception as e:
         print(f"Error getting companies summary: {e}")
-        return []
+        return None
+
+
+def _bulk_companies_summary(db_client, start_date: date) -> List[Dict[str, Any]]:
+    """Same rows as the RPC: all companies plus one paged fetch of their stats, grouped here"""
+    companies = db_client.table('companies').select('id,name').execute().data or []
+    
+    totals = defaultdict(lambda: [0, 0, 0])
+    page_size = 1000
+    offset = 0
+    while True:
+        page = db_client.table('chat_statistics').select(
+            'company_id,total_messages,total_sessions,total_tokens'
+        ).gte('date', str(start_date)).range(offset, offset + page_size - 1).execute().data or []
+        for s in page:
+            t = totals[s['company_id']]
+            t[0] += s['total_messages'] or 0
+            t[1] += s['total_sessions'] or 0
+            t[2] += s['total_tokens'] or 0
+        if len(page) < page_size:
+            break
+        offset += page_size
+    
+    summary = []
+    for c in companies:
+        messages, sessions, tokens = totals.get(c['id'], (0, 0, 0))
+        summary.append({
+            'company_id': c['id'],
+            'company_name': c['name'],
+            'total_messages': messages,
+            'total_sessions': sessions,
+            'total_tokens': tokens
+        })
+    return summary
 
 
 def get_today_stats(company_id: str) -> Dict[str, Any]:
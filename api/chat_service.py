@@ -2,11 +2,14 @@
 import os
 import json
 import uuid
-import requests
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Iterator
 from dotenv import load_dotenv
 import chat_analytics
+import llm_client
+import background
+from tenant_cache import tenant_cache
+from bot.context_packer import ContextPacker
 
 load_dotenv()
 
@@ -73,11 +76,7 @@ WHATSAPP STYLE MESSAGING:
         try:
             # Simple lightweight call to verify connectivity and auth
             # Listing models is a fast way to check validity without generating tokens
-            requests.get(
-                'https://api.openai.com/v1/models',
-                headers={'Authorization': f'Bearer {self.openai_api_key}'},
-                timeout=5
-            )
+            llm_client.get('/models', self.openai_api_key, timeout=5)
             return {'status': 'ok', 'message': 'Connected to OpenAI'}
         except Exception as e:
             return {'status': 'error', 'message': f'OpenAI connection failed: {str(e)}'}
@@ -113,7 +112,7 @@ WHATSAPP STYLE MESSAGING:
                 'widget_id': widget_id,
                 'user_id': user_id, # Must be UUID or None
                 'company_id': company_id,
-                'metadata': metadata or {'messages': [], 'anon_id': anon_id}, # Init messages in metadata
+                'metadata': metadata or {'anon_id': anon_id}, # Messages live in chat_messages
                 'is_active': True,
                 'created_at': datetime.utcnow().isoformat(),
                 'updated_at': datetime.utcnow().isoformat()
@@ -128,7 +127,10 @@ WHATSAPP STYLE MESSAGING:
             if result.data and len(result.data) > 0:
                 # Track new session creation in analytics
                 if company_id:
-                    chat_analytics.track_session(company_id)
+                    # raise_errors lets the queue retry; the session id dedupes retries
+                    background.submit(chat_analytics.track_session, company_id,
+                                      event_id=result.data[0].get('id'), raise_errors=True,
+                                      label='track_session')
                 return result.data[0], True
             
             return None, False
@@ -137,6 +139,27 @@ WHATSAPP STYLE MESSAGING:
             print(f"Error in get_or_create_session: {e}")
             return None, False
     
+    def get_session(self, db_module, session_key: str, raise_errors: bool = False) -> Optional[Dict]:
+        """
+        Existing session for a client session key (never creates one).
+        With raise_errors, a failed lookup raises instead of looking like a missing session.
+        """
+        try:
+            db_client = db_module.get_db()
+            if db_client is None:
+                raise RuntimeError("Database not available")
+            
+            result = db_client.table('chat_sessions').select('*').eq(
+                'session_key', session_key
+            ).limit(1).execute()
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            print(f"Error getting session: {e}")
+            if raise_errors:
+                raise
+            return None
+    
     def update_session_context(self, db_module, session_id_rec: str, context: Dict) -> bool:
         """Update session context data (metadata)"""
         try:
@@ -183,68 +206,85 @@ WHATSAPP STYLE MESSAGING:
     # Message Management
     # =========================================================================
     
+    def _resolve_session_uuid(self, db_client, session_id_rec: str) -> Optional[str]:
+        """Map a session reference (internal UUID or client session_key) to chat_sessions.id"""
+        try:
+            uuid.UUID(str(session_id_rec))
+            return str(session_id_rec)
+        except ValueError:
+            pass
+        
+        result = db_client.table('chat_sessions').select('id').eq('session_key', session_id_rec).execute()
+        if result.data:
+            return result.data[0]['id']
+        return None
+    
+    def _format_message(self, row: Dict) -> Dict:
+        """Shape a chat_messages row like the legacy JSONB message objects"""
+        return {
+            'id': row.get('id'),
+            'seq': row.get('seq'),
+            'role': row.get('role'),
+            'content': row.get('content'),
+            'timestamp': row.get('created_at'),
+            'created_at': row.get('created_at'),
+            'tokens_used': row.get('tokens_used'),
+            'model': row.get('model'),
+            'metadata': row.get('metadata') or {}
+        }
+    
     def save_message(self, db_module, session_id_rec: str, role: str, content: str,
                      tokens_used: int = None, model: str = None,
                      metadata: Dict = None,
-                     company_id: str = None) -> Optional[Dict]:
-        """Save a message to the database (append to JSONB) and track analytics"""
+                     company_id: str = None,
+                     client_id: str = None,
+                     response_time_ms: int = None) -> Optional[Dict]:
+        """
+        Append a message to chat_messages and queue its analytics.
+        client_id (UUID) makes the append idempotent: retrying with the same
+        id returns the row the first attempt stored instead of a duplicate.
+        response_time_ms (assistant replies) feeds the latency statistics.
+        """
         try:
             db_client = db_module.get_db()
             if db_client is None:
                 return None
             
-            msg_id = str(uuid.uuid4())
-            message = {
-                'id': msg_id,
-                'role': role,
-                'content': content,
-                'timestamp': datetime.utcnow().isoformat(),
-                'tokens_used': tokens_used,
-                'model': model,
-                'metadata': metadata or {}
-            }
-            
-            # 1. Fetch current messages
-            # Note: We use the internal UUID (id) for updates if possible, or session_id key
-            # The session object passed usually has 'id' (UUID) if fetched from table
-            
-            # Check if session_id_rec is UUID or key. Assuming UUID from previous fetch.
-            # But let's be safe. If it looks like UUID use id, else session_id.
-            
-            # Fetch current metadata
-            key_col = 'id' # Default to PK lookup
-            result = db_client.table('chat_sessions').select('metadata').eq(key_col, session_id_rec).execute()
-            
-            if not result.data:
-                # Try lookup by session_key (string key)
-                key_col = 'session_key'
-                result = db_client.table('chat_sessions').select('metadata').eq(key_col, session_id_rec).execute()
-                if not result.data:
-                    return None
-            
-            current_meta = result.data[0].get('metadata', {}) or {}
-            current_messages = current_meta.get('messages', [])
-            
-            if not isinstance(current_messages, list):
-                current_messages = []
-                
-            current_messages.append(message)
-            current_meta['messages'] = current_messages
+            session_uuid = self._resolve_session_uuid(db_client, session_id_rec)
+            if not session_uuid:
+                return None
             
-            # 2. Update array in metadata
-            db_client.table('chat_sessions').update({
-                'metadata': current_meta,
-                'updated_at': datetime.utcnow().isoformat()
-            }).eq(key_col, session_id_rec).execute()
+            # append_chat_message reserves the next seq under the session row lock
+            # and inserts in one round trip (see database_migration_chat_messages_seq.sql)
+            result = db_client.rpc('append_chat_message', {
+                'p_session_id': session_uuid,
+                'p_role': role,
+                'p_content': content,
+                'p_tokens_used': tokens_used,
+                'p_model': model,
+                'p_metadata': metadata or {},
+                'p_client_id': client_id
+            }).execute()
+            
+            row = result.data[0] if isinstance(result.data, list) else result.data
+            if not row:
+                return None
             
-            # Track analytics for assistant responses
+            # Track analytics for assistant responses (off the request path).
+            # raise_errors lets the queue retry; client_id dedupes retries
+            # (and a save retried with the same client_id).
             if role == 'assistant' and company_id and tokens_used:
-                chat_analytics.track_message(
-                    company_id, 
-                    tokens_used=tokens_used
+                background.submit(
+                    chat_analytics.track_message,
+                    company_id,
+                    tokens_used=tokens_used,
+                    response_time_ms=response_time_ms,
+                    event_id=client_id,
+                    raise_errors=True,
+                    label='track_message'
                 )
             
-            return message
+            return self._format_message(row)
             
         except Exception as e:
             print(f"Error saving message: {e}")
@@ -253,32 +293,43 @@ WHATSAPP STYLE MESSAGING:
             return None
     
     def get_conversation_history(self, db_module, session_id_rec: str, 
-                                  limit: int = 50) -> List[Dict]:
-        """Get conversation history for a session from JSONB"""
+                                  limit: int = 50,
+                                  before_seq: int = None,
+                                  after_seq: int = None,
+                                  raise_errors: bool = False) -> List[Dict]:
+        """
+        Messages of a session, oldest first: the last `limit` (before `before_seq`
+        if given), or the first `limit` after `after_seq` (cursor / delta sync).
+        With raise_errors, a failed query raises instead of returning [].
+        """
         try:
             db_client = db_module.get_db()
             if db_client is None:
+                raise RuntimeError("Database not available")
+            
+            session_uuid = self._resolve_session_uuid(db_client, session_id_rec)
+            if not session_uuid:
                 return []
             
-            # Try UUID first
-            result = db_client.table('chat_sessions').select('metadata').eq('id', session_id_rec).execute()
+            # Served by idx_chat_messages_session_seq
+            query = db_client.table('chat_messages')\
+                .select('id, seq, role, content, tokens_used, model, metadata, created_at')\
+                .eq('session_id', session_uuid)
             
-            if not result.data:
-                # Try session_key
-                result = db_client.table('chat_sessions').select('metadata').eq('session_key', session_id_rec).execute()
+            if after_seq is not None:
+                result = query.gt('seq', after_seq).order('seq').limit(limit or 50).execute()
+                return [self._format_message(row) for row in result.data or []]
             
-            if result.data and result.data[0]:
-                meta = result.data[0].get('metadata', {})
-                msgs = meta.get('messages', [])
-                # Return last N messages. JSONB array is ordered by insertion.
-                if limit and len(msgs) > limit:
-                    return msgs[-limit:]
-                return msgs
+            if before_seq is not None:
+                query = query.lt('seq', before_seq)
+            result = query.order('seq', desc=True).limit(limit or 50).execute()
             
-            return []
+            return [self._format_message(row) for row in reversed(result.data or [])]
             
         except Exception as e:
             print(f"Error getting conversation history: {e}")
+            if raise_errors:
+                raise
             return []
     
     def format_messages_for_openai(self, messages: List[Dict], 
@@ -355,8 +406,8 @@ WHATSAPP STYLE MESSAGING:
         # Use new isolated engine if company_id is present
         if company_id and db_module:
             try:
-                from bot.engine import CompanyBot
-                bot = CompanyBot(company_id, db_module)
+                from bot.pool import get_bot
+                bot = get_bot(company_id, db_module)
                 
                 # Transform messages for engine (it expects dicts)
                 # Engine handles system prompt and context internally
@@ -403,14 +454,17 @@ WHATSAPP STYLE MESSAGING:
                 except Exception as e:
                     print(f"Failed to get seminar context: {e}")
 
-            # Append context to system prompt
-            final_system_prompt = system_prompt or self.default_system_prompt
-            if seminar_context:
-                final_system_prompt += f"\n\n{seminar_context}\n\nIMPORTANT: Use the above Q&A information to answer strictly and accurately. Split your answer into short bubbles using '|||'."
+            # Pack system prompt, seminar context and history into the model's token budget
+            packed = ContextPacker.for_model(self.openai_model).pack(
+                instructions=system_prompt or self.default_system_prompt,
+                history=messages,
+                seminar_context=seminar_context,
+                seminar_suffix="\n\nIMPORTANT: Use the above Q&A information to answer strictly and accurately. Split your answer into short bubbles using '|||'."
+            )
 
             formatted_messages = self.format_messages_for_openai(
-                messages, 
-                final_system_prompt
+                packed['messages'], 
+                packed['system_prompt']
             )
             
             payload = {
@@ -430,15 +484,7 @@ WHATSAPP STYLE MESSAGING:
             # However, simpler to just rely on the new engine for companies. 
             # I will just implement the standard call here for non-company cases.
             
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.openai_api_key}',
-                    'Content-Type': 'application/json'
-                },
-                json=payload,
-                timeout=60
-            )
+            response = llm_client.post('/chat/completions', payload, self.openai_api_key)
             
             if response.status_code != 200:
                 return None, {'error': f'API error: {response.status_code} - {response.text}'}
@@ -449,14 +495,59 @@ WHATSAPP STYLE MESSAGING:
             usage = data.get('usage', {})
             metadata = {
                 'model': data.get('model'),
-                'tokens_total': usage.get('total_tokens')
+                'tokens_total': usage.get('total_tokens'),
+                'context': packed['stats']
             }
             return content, metadata
             
         except Exception as e:
             print(f"Error generation response (Legacy): {e}")
             return None, {'error': str(e)}
-    
+
+    def stream_response(self, messages: List[Dict],
+                        system_prompt: str = None,
+                        db_module = None,
+                        company_id: str = None,
+                        session_id: str = None,
+                        enable_tools: bool = False) -> Iterator[Dict]:
+        """Stream AI response events (see CompanyBot.stream_response for the event shapes)"""
+        from bot.engine import split_bubbles
+        from bot.pool import get_bot
+
+        if company_id and db_module:
+            bot = get_bot(company_id, db_module)
+            yield from bot.stream_response(
+                messages,
+                system_prompt=system_prompt,
+                enable_tools=enable_tools,
+                session_id=session_id
+            )
+            return
+
+        # Legacy path has no streaming support - emit the complete reply as bubbles
+        content, meta = self.generate_response(
+            messages,
+            system_prompt=system_prompt,
+            db_module=db_module,
+            session_id=session_id,
+            enable_tools=enable_tools
+        )
+        if not content:
+            yield {'type': 'error', 'error': (meta or {}).get('error', 'No response generated')}
+            return
+
+        for index, bubble in enumerate(split_bubbles(content)):
+            yield {'type': 'token', 'bubble': index, 'text': bubble}
+            yield {'type': 'bubble', 'bubble': index, 'text': bubble}
+
+        meta = meta or {}
+        yield {
+            'type': 'done',
+            'content': content,
+            'action': meta.get('action'),
+            'metadata': {'model': meta.get('model'), 'tokens': meta.get('tokens_total'), 'context': meta.get('context')}
+        }
+
 
     
     # =========================================================================
@@ -477,16 +568,13 @@ WHATSAPP STYLE MESSAGING:
             return None
             
         try:
-            db_client = db_module.get_db()
-            if db_client is None:
+            if db_module.get_db() is None:
                 return None
             
-            result = db_client.table('companies').select('*').eq(
-                'id', company_id
-            ).execute()
+            # Served from the tenant cache - the same row backs widget and bot config
+            company = db_module.get_company_cached(company_id)
             
-            if result.data and len(result.data) > 0:
-                company = result.data[0]
+            if company:
                 return {
                     'id': company.get('id'),
                     'name': company.get('name'),
@@ -531,7 +619,18 @@ WHATSAPP STYLE MESSAGING:
 
     def get_widget_config(self, db_module, widget_id: str, 
                           company_id: str = None) -> Optional[Dict]:
-        """Get widget configuration, prioritizing new widget_settings table"""
+        """Get widget configuration, cached per tenant (see tenant_cache)"""
+        if not company_id:
+            return self._load_widget_config(db_module, widget_id, company_id)
+        
+        return tenant_cache.get_or_load(
+            ('widget_config', str(company_id), widget_id),
+            lambda: self._load_widget_config(db_module, widget_id, company_id)
+        )
+    
+    def _load_widget_config(self, db_module, widget_id: str, 
+                            company_id: str = None) -> Optional[Dict]:
+        """Resolve widget configuration, prioritizing new widget_settings table"""
         try:
             db_client = db_module.get_db()
             if db_client is None:
@@ -544,9 +643,8 @@ WHATSAPP STYLE MESSAGING:
             
             if company_id:
                 # Read from companies table (where Admin UI saves it)
-                settings_result = db_client.table('companies').select('name, widget_settings').eq('id', company_id).execute()
-                if settings_result.data:
-                    company_data = settings_result.data[0]
+                company_data = db_module.get_company_cached(company_id)
+                if company_data:
                     company_name = company_data.get('name', 'this company')
                     settings = company_data.get('widget_settings', {})
                     
@@ -0,0 +1,236 @@
+"""
+Chat Statistics Store - atomic increments of daily per-company counters
+
+Two backends share one contract:
+- SupabaseStatsStore: calls increment_chat_statistics (database_migration_chat_statistics.sql)
+- SQLiteStatsStore: same upsert-increment in a local file, for offline load tests
+
+increment() adds deltas to the (company_id, date) row in one statement and
+returns the updated row, so concurrent writers never lose updates.
+increment_many() applies a batch of such deltas in one round trip
+(database_migration_chat_statistics_batch.sql). Given a batch_id it is
+idempotent: a batch id that was already applied is skipped.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+import db
+
+DateLike = Union[date, str, None]
+
+# Upper bounds (ms) of the response time histogram buckets; slower responses go to 'inf'
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _day(day: DateLike) -> str:
+    return str(day or date.today())
+
+
+def latency_bucket(response_time_ms: float) -> str:
+    """Histogram key for a response time"""
+    for bound in LATENCY_BUCKETS_MS:
+        if response_time_ms <= bound:
+            return str(bound)
+    return 'inf'
+
+
+def merge_histograms(a: Optional[Dict[str, int]], b: Optional[Dict[str, int]]) -> Dict[str, int]:
+    """Key-wise sum (same as the merge_histograms SQL function)"""
+    merged = dict(a or {})
+    for key, count in (b or {}).items():
+        merged[key] = merged.get(key, 0) + int(count)
+    return merged
+
+
+class SupabaseStatsStore:
+    """chat_statistics in Postgres via the increment_chat_statistics RPCs"""
+
+    def increment(self, company_id: str, day: DateLike = None,
+                  messages: int = 0, sessions: int = 0, tokens: int = 0,
+                  response_time_sum_ms: int = 0, response_time_count: int = 0,
+                  response_time_histogram: Dict[str, int] = None) -> Optional[Dict[str, Any]]:
+        db_client = db.get_db()
+        if not db_client:
+            print("Database not available for chat analytics")
+            return None
+        result = db_client.rpc('increment_chat_statistics', {
+            'p_company_id': company_id,
+            'p_date': _day(day),
+            'p_messages': messages,
+            'p_sessions': sessions,
+            'p_tokens': tokens,
+            'p_response_time_sum_ms': response_time_sum_ms,
+            'p_response_time_count': response_time_count,
+            'p_response_time_histogram': response_time_histogram or {}
+        }).execute()
+        return result.data[0] if isinstance(result.data, list) else result.data
+
+    def increment_many(self, rows: List[Dict[str, Any]], batch_id: str = None) -> int:
+        """Apply a list of increment() keyword dicts (each with company_id, date) in one call"""
+        if not rows:
+            return 0
+        db_client = db.get_db()
+        if not db_client:
+            raise RuntimeError("Database not available for chat analytics")
+        payload = [{**row, 'date': _day(row.get('date'))} for row in rows]
+        result = db_client.rpc('increment_chat_statistics_batch', {
+            'p_rows': payload,
+            'p_batch_id': batch_id
+        }).execute()
+        return result.data if isinstance(result.data, int) else len(rows)
+
+    def get(self, company_id: str, day: DateLike = None) -> Optional[Dict[str, Any]]:
+        db_client = db.get_db()
+        if not db_client:
+            return None
+        result = db_client.table('chat_statistics').select('*').eq(
+            'company_id', company_id
+        ).eq('date', _day(day)).execute()
+        return result.data[0] if result.data else None
+
+
+class SQLiteStatsStore:
+    """Local stand-in with the same upsert-increment semantics (SQLite >= 3.24)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chat_statistics (
+            company_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            total_messages INTEGER NOT NULL DEFAULT 0,
+            total_sessions INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            response_time_sum_ms INTEGER NOT NULL DEFAULT 0,
+            response_time_count INTEGER NOT NULL DEFAULT 0,
+            avg_response_time_ms INTEGER,
+            response_time_histogram TEXT NOT NULL DEFAULT '{}',
+            updated_at TEXT,
+            PRIMARY KEY (company_id, date)
+        );
+        CREATE TABLE IF NOT EXISTS chat_statistics_batches (
+            batch_id TEXT PRIMARY KEY,
+            applied_at TEXT NOT NULL
+        );
+    """
+
+    UPSERT = """
+        INSERT INTO chat_statistics AS s (
+            company_id, date, total_messages, total_sessions, total_tokens,
+            response_time_sum_ms, response_time_count, avg_response_time_ms, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?,
+                CASE WHEN ? > 0 THEN ? / ? END, ?)
+        ON CONFLICT (company_id, date) DO UPDATE SET
+            total_messages = s.total_messages + excluded.total_messages,
+            total_sessions = s.total_sessions + excluded.total_sessions,
+            total_tokens = s.total_tokens + excluded.total_tokens,
+            response_time_sum_ms = s.response_time_sum_ms + excluded.response_time_sum_ms,
+            response_time_count = s.response_time_count + excluded.response_time_count,
+            avg_response_time_ms = CASE
+                WHEN s.response_time_count + excluded.response_time_count > 0
+                THEN (s.response_time_sum_ms + excluded.response_time_sum_ms)
+                     / (s.response_time_count + excluded.response_time_count)
+                ELSE s.avg_response_time_ms END,
+            updated_at = excluded.updated_at
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('CHAT_STATS_SQLITE_PATH', 'chat_statistics.sqlite3')
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite serializes writers itself
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def increment(self, company_id: str, day: DateLike = None,
+                  messages: int = 0, sessions: int = 0, tokens: int = 0,
+                  response_time_sum_ms: int = 0, response_time_count: int = 0,
+                  response_time_histogram: Dict[str, int] = None) -> Optional[Dict[str, Any]]:
+        self.increment_many([{
+            'company_id': company_id, 'date': day,
+            'messages': messages, 'sessions': sessions, 'tokens': tokens,
+            'response_time_sum_ms': response_time_sum_ms,
+            'response_time_count': response_time_count,
+            'response_time_histogram': response_time_histogram
+        }])
+        return self.get(company_id, day)
+
+    def increment_many(self, rows: List[Dict[str, Any]], batch_id: str = None) -> int:
+        conn = self._connect()
+        now = datetime.now(timezone.utc).isoformat()
+        # BEGIN IMMEDIATE takes the write lock up front, so the histogram
+        # read-merge-write below cannot interleave with another writer
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if batch_id is not None:
+                applied = conn.execute(
+                    'INSERT OR IGNORE INTO chat_statistics_batches (batch_id, applied_at) VALUES (?, ?)',
+                    (batch_id, now)
+                ).rowcount
+                if not applied:
+                    conn.execute('COMMIT')
+                    return 0
+            for row in sorted(rows, key=lambda r: (r['company_id'], _day(r.get('date')))):
+                company_id, day = row['company_id'], _day(row.get('date'))
+                count = row.get('response_time_count', 0)
+                total = row.get('response_time_sum_ms', 0)
+                conn.execute(self.UPSERT, (
+                    company_id, day, row.get('messages', 0), row.get('sessions', 0),
+                    row.get('tokens', 0), total, count,
+                    count, total, count or 1, now
+                ))
+                if row.get('response_time_histogram'):
+                    current = conn.execute(
+                        'SELECT response_time_histogram FROM chat_statistics WHERE company_id = ? AND date = ?',
+                        (company_id, day)
+                    ).fetchone()[0]
+                    merged = merge_histograms(json.loads(current or '{}'), row['response_time_histogram'])
+                    conn.execute(
+                        'UPDATE chat_statistics SET response_time_histogram = ? WHERE company_id = ? AND date = ?',
+                        (json.dumps(merged), company_id, day)
+                    )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    def get(self, company_id: str, day: DateLike = None) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            'SELECT * FROM chat_statistics WHERE company_id = ? AND date = ?',
+            (company_id, _day(day))
+        ).fetchone()
+        if not row:
+            return None
+        stats = dict(row)
+        stats['response_time_histogram'] = json.loads(stats['response_time_histogram'] or '{}')
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Configured store: CHAT_STATS_STORE=supabase (default) or sqlite"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if os.getenv('CHAT_STATS_STORE', 'supabase').lower() == 'sqlite':
+                    _store = SQLiteStatsStore()
+                else:
+                    _store = SupabaseStatsStore()
+    return _store
@@ -2,10 +2,12 @@
 import os
 import hashlib
 import secrets
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any, Tuple
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from tenant_cache import TTLCache, tenant_cache, invalidate_company
+from bot import retrieval, seminar_matcher
 
 load_dotenv()
 
@@ -21,6 +23,9 @@ ROLES = {
 }
 VALID_ROLES = [ROLES['OWNER'], ROLES['ADMIN'], ROLES['MEMBER']]
 
+# Number of knowledge passages injected into the bot prompt per turn
+KNOWLEDGE_TOP_K = int(os.getenv('KNOWLEDGE_TOP_K', '5'))
+
 def is_db_configured() -> bool:
     """Check if database environment variables are set"""
     url = os.getenv('SUPABASE_URL')
@@ -459,6 +464,12 @@ def get_company_by_id(company_id: str) -> Optional[Dict]:
     except:
         return None
 
+def get_company_cached(company_id: str) -> Optional[Dict]:
+    """Get company by ID through the tenant cache (chat hot path)"""
+    if not company_id:
+        return None
+    return tenant_cache.get_or_load(('company', str(company_id)), lambda: get_company_by_id(company_id))
+
 def get_company_by_slug(slug: str) -> Optional[Dict]:
     """Get company by slug"""
     try:
@@ -520,6 +531,7 @@ def update_company(company_id: str, updates: Dict) -> bool:
     try:
         updates['updated_at'] = datetime.utcnow().isoformat()
         get_db().table('companies').update(updates).eq('id', company_id).execute()
+        invalidate_company(company_id)
         return True
     except:
         return False
@@ -528,6 +540,7 @@ def delete_company(company_id: str) -> bool:
     """Delete company"""
     try:
         get_db().table('companies').delete().eq('id', company_id).execute()
+        invalidate_company(company_id)
         return True
     except:
         return False
@@ -604,21 +617,54 @@ def invite_member_to_company(company_id: str, email: str, role: str = 'member')
     # create_user already tries to assign, so we are good.
     return {'status': 'invited', 'user': new_user}
 
-def get_company_knowledge(company_id: str) -> str:
-    """Get formatted knowledge base content for a company"""
+def get_company_knowledge_entries(company_id: str) -> Optional[List[Dict]]:
+    """Get all active knowledge base entries for a company (None on error)"""
     try:
         db_client = get_db()
         if not db_client:
-            return ""
+            return None
         
-        # Fetch active knowledge base entries
-        result = db_client.table('company_knowledge_base').select('title, content').eq('company_id', company_id).eq('is_active', True).execute()
+        result = db_client.table('company_knowledge_base')\
+            .select('id, company_id, title, content, category, is_active')\
+            .eq('company_id', company_id)\
+            .eq('is_active', True)\
+            .execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching knowledge entries: {e}")
+        return None
+
+def get_company_knowledge_passages(company_id: str, query: str, top_k: int = KNOWLEDGE_TOP_K) -> List[Tuple[float, Dict]]:
+    """Top-k ranked (score, passage) pairs from the company's knowledge index"""
+    try:
+        return retrieval.search(company_id, query, get_company_knowledge_entries, k=top_k)
+    except Exception as e:
+        print(f"Error searching knowledge base: {e}")
+        return []
+
+def get_company_knowledge(company_id: str, query: str = None, top_k: int = KNOWLEDGE_TOP_K) -> str:
+    """
+    Get formatted knowledge base content for a company.
+    With a query only the top_k BM25-ranked passages are returned (see bot/retrieval.py),
+    without one every active entry is dumped (truncated at 2000 chars each).
+    """
+    try:
+        if query is not None:
+            hits = get_company_knowledge_passages(company_id, query, top_k)
+            if not hits:
+                return ""
+            
+            knowledge_text = "\n\n### Company Knowledge Base (most relevant passages):\n"
+            for _, passage in hits:
+                knowledge_text += f"---\nTitle: {passage['title']}\nContent:\n{passage['text']}\n"
+            return knowledge_text
         
-        if not result.data:
+        entries = get_company_knowledge_entries(company_id)
+        if not entries:
             return ""
             
         knowledge_text = "\n\n### Company Knowledge Base:\n"
-        for entry in result.data:
+        for entry in entries:
             title = entry.get('title', 'Unknown')
             content = entry.get('content', '')
             if len(content) > 2000:
@@ -743,95 +789,29 @@ def get_active_chat_session(user_identifier: str, company_id: str) -> Optional[D
     except:
         return None
 
+def _load_seminar_rows() -> Optional[List[Dict]]:
+    """All seminar_qa rows (None on error)"""
+    try:
+        db_client = get_db()
+        if not db_client:
+            return None
+        result = db_client.table('seminar_qa').select('*').execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error loading seminar catalog: {e}")
+        return None
+
+
 def get_seminar_context(query_text: str) -> str:
     """
-    Get seminar Q&A context based on difficult keyword matching.
+    Get seminar Q&A context based on keyword matching.
+    The catalog is compiled once (bot/seminar_matcher.py) and refreshed on a TTL
+    or when a tenant is invalidated (tenant_cache.invalidate_company).
     """
     try:
         if not query_text:
             return ""
-            
-        db_client = get_db()
-        if not db_client:
-            return ""
-        
-        clean_query = query_text.lower()
-        
-        # Detect Category Intent
-        category_intent = None
-        category_map = {
-            "führung": ["führung", "führen", "leiter", "chef", "leadership"],
-            "kommunikation": ["kommunikation", "kommunizieren", "reden", "gespräch", "konflikt", "verhandlung"],
-            "gesundheit": ["gesundheit", "resilienz", "stress", "ausgleich", "mental"],
-            "management": ["management", "organisation", "zeit", "projekt", "planung"],
-            "change": ["change", "wandel", "veränderung", "transformation"]
-        }
-        
-        for cat, keywords in category_map.items():
-            if any(k in clean_query for k in keywords):
-                category_intent = cat
-                break
-        
-        # Fetch all for in-memory filtering (efficient for <100 rows)
-        result = db_client.table('seminar_qa').select('*').execute()
-        
-        if not result.data:
-            return ""
-            
-        matched_items = []
-        for item in result.data:
-            score = 0
-            
-            # 1. Category Boost
-            item_cat = (item.get('category') or '').lower()
-            if category_intent and category_intent in item_cat:
-                score += 20
-            
-            # 2. Name Match (Strongest)
-            sem_name = (item.get('seminar_name') or '').lower()
-            if sem_name in clean_query:
-                score += 50
-            
-            # 3. Partial Name Match (Robust)
-            name_parts = sem_name.split()
-            # Check if significant parts of the name appear anywhere in the query string
-            matches = sum(1 for p in name_parts if len(p) > 3 and p in clean_query)
-            if matches > 0:
-                score += 10 * matches
-
-            # 4. Keyword Match
-            keywords = item.get('keywords', []) or []
-            for kw in keywords:
-                if kw.lower() in clean_query:
-                    score += 5
-                    
-            if score > 0:
-                matched_items.append((score, item))
-                
-        # Sort by score desc
-        matched_items.sort(key=lambda x: x[0], reverse=True)
-        
-        if not matched_items:
-            return ""
-            
-        # formatting
-        # If we detected a category intent, we want ALL items in that category to ensure completeness
-        # Otherwise we limit to top 8 to save context space
-        if category_intent:
-             top_matches = matched_items  # Return all
-        else:
-             top_matches = matched_items[:8] 
-        
-        context_str = "### STRICT SEMINAR SOURCE (ONLY use these entries, DO NOT invent others):\n\n"
-        for _, item in top_matches:
-            context_str += f"Title: {item.get('seminar_name')}\n"
-            context_str += f"Category: {item.get('category')}\n"
-            # Simplify info to save tokens if listing many
-            context_str += f"Info: {item.get('answer')[:300]}...\n" 
-            context_str += "---\n"
-            
-        return context_str
-        
+        return seminar_matcher.get_catalog(_load_seminar_rows).context(query_text)
     except Exception as e:
         print(f"Error getting seminar context: {e}")
         return ""
@@ -879,3 +859,203 @@ def close_chat_session(session_id: str) -> bool:
         return True
     except:
         return False
+
+
+# ============================================================================
+# WORKFLOW EXECUTION ANALYTICS
+# ============================================================================
+# Aggregates computed in the database (database_migration_workflow_analytics.sql).
+# company_id scopes to the activations of the company's users and takes
+# precedence over user_id. All return None on error.
+
+def _execution_scope(start: datetime, end: datetime, company_id: Optional[str] = None,
+                     user_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        'p_start': start.isoformat(),
+        'p_end': end.isoformat(),
+        'p_company_id': company_id,
+        'p_user_id': None if company_id else user_id
+    }
+
+def get_workflow_execution_stats(start: datetime, end: datetime, company_id: Optional[str] = None,
+                                 user_id: Optional[str] = None,
+                                 workflow_id: Optional[str] = None) -> Optional[Dict]:
+    """Execution totals, success/failure counts and duration stats for a scope"""
+    try:
+        params = _execution_scope(start, end, company_id, user_id)
+        params['p_workflow_id'] = workflow_id
+        result = get_db().rpc('get_workflow_execution_stats', params).execute()
+        rows = result.data if isinstance(result.data, list) else [result.data]
+        return rows[0] if rows and rows[0] else None
+    except Exception as e:
+        print(f"Error fetching execution stats: {e}")
+        return None
+
+def get_workflow_execution_timeline(start: datetime, end: datetime, company_id: Optional[str] = None,
+                                    user_id: Optional[str] = None) -> Optional[List[Dict]]:
+    """Per-day (UTC) execution counts: [{'day', 'total', 'success', 'failed'}, ...]"""
+    try:
+        result = get_db().rpc('get_workflow_execution_timeline',
+                              _execution_scope(start, end, company_id, user_id)).execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching execution timeline: {e}")
+        return None
+
+def get_top_workflow_counts(start: datetime, end: datetime, company_id: Optional[str] = None,
+                            user_id: Optional[str] = None, limit: int = 10) -> Optional[List[Dict]]:
+    """Most executed workflows: [{'workflow_id', 'total', 'success', 'failed'}, ...]"""
+    try:
+        params = _execution_scope(start, end, company_id, user_id)
+        params['p_limit'] = limit
+        result = get_db().rpc('get_top_workflow_counts', params).execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching top workflows: {e}")
+        return None
+
+
+# ============================================================================
+# WORKFLOWS
+# ============================================================================
+
+# Workflow metadata changes rarely (synced from n8n by admins)
+workflow_cache = TTLCache(
+    'workflow',
+    ttl_seconds=float(os.getenv('WORKFLOW_CACHE_TTL', '300')),
+    max_size=int(os.getenv('WORKFLOW_CACHE_MAX_SIZE', '1024'))
+)
+
+def get_workflows_by_ids(workflow_ids: List[str]) -> Dict[str, Dict]:
+    """Workflows keyed by id; cache misses are fetched in a single in_() query"""
+    found: Dict[str, Dict] = {}
+    missing = []
+    for workflow_id in dict.fromkeys(str(w) for w in workflow_ids if w):
+        cached = workflow_cache.get(workflow_id)
+        if cached is not None:
+            found[workflow_id] = cached
+        else:
+            missing.append(workflow_id)
+    
+    if missing:
+        try:
+            result = get_db().table('workflows')\
+                .select('id, n8n_workflow_id, name, description, category, is_active, is_public')\
+                .in_('id', missing)\
+                .execute()
+            for workflow in result.data or []:
+                workflow_cache.set(workflow['id'], workflow)
+                found[workflow['id']] = workflow
+        except Exception as e:
+            print(f"Error fetching workflows: {e}")
+    return found
+
+def get_workflow_by_id(workflow_id: str) -> Optional[Dict]:
+    """Get workflow by ID (cached)"""
+    return get_workflows_by_ids([workflow_id]).get(str(workflow_id))
+
+def get_all_workflows() -> List[Dict]:
+    """Get all workflows (admin only)"""
+    try:
+        result = get_db().table('workflows').select('*').order('name').execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching workflows: {e}")
+        return []
+
+def get_user_workflow_activations(user_id: str) -> List[Dict]:
+    """Get a user's workflow activations with their workflow"""
+    try:
+        result = get_db().table('workflow_activations')\
+            .select('*, workflows(id, name, description, category, is_active)')\
+            .eq('user_id', user_id)\
+            .order('created_at', desc=True)\
+            .execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching workflow activations: {e}")
+        return []
+
+def get_company_activations(company_id: str) -> List[Dict]:
+    """Get the workflow activations of every user in a company"""
+    try:
+        result = get_db().table('workflow_activations')\
+            .select('*, users!inner(company_id)')\
+            .eq('users.company_id', company_id)\
+            .execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error fetching company activations: {e}")
+        return []
+
+
+# ============================================================================
+# WORKFLOW EXECUTION EVENTS
+# ============================================================================
+# Monthly-partitioned event store (database_migration_workflow_execution_events.sql).
+# Queries always carry a started_at range so Postgres prunes partitions.
+
+# Rows per ingest_workflow_execution_events call
+EXECUTION_INGEST_CHUNK = int(os.getenv('EXECUTION_INGEST_CHUNK', '500'))
+
+# Default look-back when a caller gives no start date
+EXECUTION_DEFAULT_DAYS = int(os.getenv('EXECUTION_DEFAULT_DAYS', '30'))
+
+def get_all_workflow_executions(workflow_id: Optional[str] = None, limit: int = 100,
+                                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                company_id: Optional[str] = None, user_id: Optional[str] = None,
+                                status: Optional[str] = None) -> List[Dict]:
+    """
+    Most recent executions in [start, end] (default: the last EXECUTION_DEFAULT_DAYS days),
+    filtered by workflow / company / user / status. Each row carries
+    workflow_activations.workflows {id, name} like the old embedded select.
+    """
+    try:
+        end = end or datetime.now(timezone.utc)
+        start = start or end - timedelta(days=EXECUTION_DEFAULT_DAYS)
+        query = get_db().table('workflow_execution_events')\
+            .select('execution_id, workflow_activation_id, workflow_id, user_id, company_id, '
+                    'status, error_message, started_at, finished_at, duration_ms')\
+            .gte('started_at', start.isoformat())\
+            .lte('started_at', end.isoformat())
+        if workflow_id:
+            query = query.eq('workflow_id', workflow_id)
+        if company_id:
+            query = query.eq('company_id', company_id)
+        elif user_id:
+            query = query.eq('user_id', user_id)
+        if status:
+            query = query.eq('status', status)
+        result = query.order('started_at', desc=True).limit(limit).execute()
+        executions = result.data or []
+        
+        workflows = get_workflows_by_ids([e['workflow_id'] for e in executions])
+        for execution in executions:
+            workflow = workflows.get(str(execution.get('workflow_id')), {})
+            execution['workflow_activations'] = {
+                'workflow_id': execution.get('workflow_id'),
+                'user_id': execution.get('user_id'),
+                'workflows': {'id': workflow.get('id'), 'name': workflow.get('name')}
+            }
+        return executions
+    except Exception as e:
+        print(f"Error fetching workflow executions: {e}")
+        return []
+
+def ingest_workflow_executions(rows: List[Dict], chunk_size: int = EXECUTION_INGEST_CHUNK) -> List[Dict]:
+    """
+    Upsert execution events in chunks, keyed by (execution_id, started_at).
+    Returns [{'execution_id', 'started_at', 'result'}] with result 'inserted',
+    'updated', 'rejected' (unknown activation) or 'error' (chunk failed).
+    """
+    results = []
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        try:
+            response = get_db().rpc('ingest_workflow_execution_events', {'p_rows': chunk}).execute()
+            results.extend(response.data or [])
+        except Exception as e:
+            print(f"Error ingesting workflow executions: {e}")
+            results.extend({'execution_id': row.get('execution_id'), 'started_at': row.get('started_at'),
+                            'result': 'error'} for row in chunk)
+    return results
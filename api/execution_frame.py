@@ -0,0 +1,247 @@
+"""
+Execution Frame - columnar workflow execution analytics with NumPy
+
+Used when raw execution rows have to be aggregated in Python (the SQL
+aggregates in database_migration_workflow_analytics.sql are unavailable,
+or rows were already fetched). Rows are converted once into arrays:
+
+- started_at:  datetime64[ms] (UTC), decoded as a byte matrix (no per-row datetime calls)
+- status:      int8 codes (STATUS_SUCCESS / STATUS_FAILED / STATUS_OTHER)
+- workflow:    int32 codes into `workflow_ids`
+- activation:  int32 codes into `activation_ids`
+- duration_ms: float64, NaN when missing
+
+Filtering, daily bucketing, success rates, duration percentiles and top-N
+are then array operations.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+STATUS_OTHER = 0
+STATUS_SUCCESS = 1
+STATUS_FAILED = 2
+
+# n8n writes 'error'; older rows use 'failed'
+_STATUS_CODES = {'success': STATUS_SUCCESS, 'failed': STATUS_FAILED, 'error': STATUS_FAILED}
+
+_NAT = np.datetime64('NaT', 'ms')
+
+
+def parse_timestamps(values: Iterable[Optional[str]]) -> np.ndarray:
+    """
+    ISO-8601 strings (as returned by PostgREST) -> datetime64[ms] in UTC.
+
+    The strings are packed into a byte matrix and the fixed-position fields
+    (YYYY-MM-DDTHH:MM:SS[.fff][Z|+HH:MM]) are decoded with integer array
+    arithmetic. Missing or malformed values become NaT.
+    """
+    # None becomes b'None', which fails the format check below
+    raw = np.array(values if isinstance(values, list) else list(values), dtype='S')
+    n = len(raw)
+    width = raw.dtype.itemsize
+    if n == 0 or width < 19:
+        return np.full(n, _NAT)
+
+    m = raw.view(np.uint8).reshape(n, width)
+    length = np.count_nonzero(m, axis=1)
+    digits = m[:, :min(width, 23)].astype(np.int64) - 48
+
+    def col(k):
+        return digits[:, k]
+
+    year = col(0) * 1000 + col(1) * 100 + col(2) * 10 + col(3)
+    month = col(5) * 10 + col(6)
+    day = col(8) * 10 + col(9)
+    seconds = (col(11) * 10 + col(12)) * 3600 + (col(14) * 10 + col(15)) * 60 + col(17) * 10 + col(18)
+
+    # Days since 1970-01-01 from the civil date (proleptic Gregorian)
+    y = year - (month <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+    # Fractional seconds: first three digits after '.'
+    millis = np.zeros(n, dtype=np.int64)
+    if width > 20:
+        running = m[:, 19] == ord('.')
+        for k, scale in ((20, 100), (21, 10), (22, 1)):
+            if k >= width:
+                break
+            is_digit = running & (m[:, k] >= 48) & (m[:, k] <= 57)
+            millis += np.where(is_digit, col(k) * scale, 0)
+            running = is_digit
+
+    # Trailing +HH:MM / -HH:MM ('Z' needs no adjustment)
+    offset_minutes = np.zeros(n, dtype=np.int64)
+    has_offset = length >= 25
+    if has_offset.any():
+        rows = np.nonzero(has_offset)[0]
+        pos = length[rows] - 6
+        sign = m[rows, pos]
+        signed = (sign == ord('+')) | (sign == ord('-'))
+        rows, pos, sign = rows[signed], pos[signed], sign[signed]
+
+        def digit(k):
+            return m[rows, pos + k].astype(np.int64) - 48
+
+        minutes = (digit(1) * 10 + digit(2)) * 60 + digit(4) * 10 + digit(5)
+        offset_minutes[rows] = np.where(sign == ord('-'), -minutes, minutes)
+
+    epoch_ms = (days * 86400 + seconds - offset_minutes * 60) * 1000 + millis
+    valid = (
+        (length >= 19) & (m[:, 4] == ord('-')) & (m[:, 7] == ord('-'))
+        & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    )
+    epoch_ms[~valid] = np.iinfo(np.int64).min  # NaT
+    return epoch_ms.view('datetime64[ms]')
+
+
+def _to_datetime64(value: datetime) -> np.datetime64:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, 'ms')
+
+
+def _workflow_id(row: Dict[str, Any]) -> Optional[str]:
+    if row.get('workflow_id'):
+        return row['workflow_id']
+    # Rows fetched with workflow_activations(workflows(...)) embedded
+    activation = row.get('workflow_activations') or {}
+    return activation.get('workflow_id') or (activation.get('workflows') or {}).get('id')
+
+
+class ExecutionFrame:
+    """Column arrays for a set of workflow executions"""
+
+    def __init__(self, started_at: np.ndarray, status: np.ndarray, workflow: np.ndarray,
+                 activation: np.ndarray, duration_ms: np.ndarray,
+                 workflow_ids: np.ndarray, activation_ids: np.ndarray):
+        self.started_at = started_at
+        self.status = status
+        self.workflow = workflow
+        self.activation = activation
+        self.duration_ms = duration_ms
+        self.workflow_ids = workflow_ids
+        self.activation_ids = activation_ids
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> 'ExecutionFrame':
+        """Build the columns; ids are factorized with dicts (no string sort)"""
+        workflow_index: Dict[str, int] = {}
+        activation_index: Dict[str, int] = {}
+        status_codes = _STATUS_CODES
+
+        started_at = parse_timestamps([r.get('started_at') for r in rows])
+        status = np.array([status_codes.get(r.get('status'), STATUS_OTHER) for r in rows], dtype=np.int8)
+        workflow = np.array([
+            workflow_index.setdefault(r.get('workflow_id') or _workflow_id(r) or '', len(workflow_index))
+            for r in rows
+        ], dtype=np.int32)
+        activation = np.array([
+            activation_index.setdefault(r.get('workflow_activation_id') or '', len(activation_index))
+            for r in rows
+        ], dtype=np.int32)
+        duration_ms = np.array([r.get('duration_ms') or np.nan for r in rows], dtype=np.float64)
+
+        return cls(started_at, status, workflow, activation, duration_ms,
+                   np.array(list(workflow_index), dtype=str), np.array(list(activation_index), dtype=str))
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    # ------------------------------------------------------------------
+
+    def _take(self, mask: np.ndarray) -> 'ExecutionFrame':
+        return ExecutionFrame(self.started_at[mask], self.status[mask], self.workflow[mask],
+                              self.activation[mask], self.duration_ms[mask],
+                              self.workflow_ids, self.activation_ids)
+
+    def filter(self, start: datetime = None, end: datetime = None,
+               activation_ids: Optional[Iterable[str]] = None,
+               workflow_id: Optional[str] = None) -> 'ExecutionFrame':
+        """Executions started in [start, end], optionally limited to activations / one workflow"""
+        mask = ~np.isnat(self.started_at)
+        if start is not None:
+            mask &= self.started_at >= _to_datetime64(start)
+        if end is not None:
+            mask &= self.started_at <= _to_datetime64(end)
+        if activation_ids is not None:
+            wanted = np.isin(self.activation_ids, np.array(list(activation_ids), dtype=str))
+            mask &= wanted[self.activation]
+        if workflow_id is not None:
+            mask &= self.workflow_ids[self.workflow] == str(workflow_id)
+        return self._take(mask)
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals, success/failure counts and duration statistics"""
+        total = len(self)
+        durations = self.duration_ms[self.duration_ms > 0]
+        has_durations = durations.size > 0
+        p50, p90, p99 = np.percentile(durations, [50, 90, 99]) if has_durations else (0, 0, 0)
+        last = self.started_at.max() if total else _NAT
+        return {
+            'total_executions': total,
+            'successful': int(np.count_nonzero(self.status == STATUS_SUCCESS)),
+            'failed': int(np.count_nonzero(self.status == STATUS_FAILED)),
+            'avg_duration_ms': float(durations.mean()) if has_durations else 0.0,
+            'min_duration_ms': int(durations.min()) if has_durations else 0,
+            'max_duration_ms': int(durations.max()) if has_durations else 0,
+            'p50_duration_ms': float(p50),
+            'p90_duration_ms': float(p90),
+            'p99_duration_ms': float(p99),
+            'last_started_at': None if np.isnat(last) else str(last) + 'Z'
+        }
+
+    def timeline(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Per-UTC-day counts for every day in [start, end], including empty days"""
+        first = _to_datetime64(start).astype('datetime64[D]')
+        last = _to_datetime64(end).astype('datetime64[D]')
+        n_days = int((last - first).astype(np.int64)) + 1
+        if n_days <= 0:
+            return []
+
+        day_index = (self.started_at.astype('datetime64[D]') - first).astype(np.int64)
+        in_range = (day_index >= 0) & (day_index < n_days) & ~np.isnat(self.started_at)
+        day_index = day_index[in_range]
+        status = self.status[in_range]
+
+        total = np.bincount(day_index, minlength=n_days)
+        success = np.bincount(day_index, weights=status == STATUS_SUCCESS, minlength=n_days)
+        failed = np.bincount(day_index, weights=status == STATUS_FAILED, minlength=n_days)
+        days = first + np.arange(n_days)
+        return [
+            {'date': str(day), 'success': int(s), 'failed': int(f), 'total': int(t)}
+            for day, s, f, t in zip(days, success, failed, total)
+        ]
+
+    def top_workflows(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most executed workflows: [{'workflow_id', 'total', 'success', 'failed', 'avg_duration_ms'}, ...]"""
+        known = self.workflow_ids[self.workflow] != ''
+        workflow = self.workflow[known]
+        if workflow.size == 0:
+            return []
+        status = self.status[known]
+        durations = self.duration_ms[known]
+        size = len(self.workflow_ids)
+
+        total = np.bincount(workflow, minlength=size)
+        success = np.bincount(workflow, weights=status == STATUS_SUCCESS, minlength=size)
+        failed = np.bincount(workflow, weights=status == STATUS_FAILED, minlength=size)
+        timed = durations > 0
+        duration_sum = np.bincount(workflow[timed], weights=durations[timed], minlength=size)
+        duration_count = np.bincount(workflow[timed], minlength=size)
+
+        # Highest counts first; stable so ties keep id order
+        order = np.argsort(-total, kind='stable')
+        order = order[total[order] > 0][:limit]
+        return [{
+            'workflow_id': str(self.workflow_ids[i]),
+            'total': int(total[i]),
+            'success': int(success[i]),
+            'failed': int(failed[i]),
+            'avg_duration_ms': float(duration_sum[i] / duration_count[i]) if duration_count[i] else 0.0
+        } for i in order]
@@ -0,0 +1,192 @@
+"""
+Execution Ingest - bulk NDJSON ingestion of workflow executions
+
+POST /api/executions/bulk streams a (optionally gzip-compressed) NDJSON
+body: one execution per line. Lines are validated as they are read and
+valid rows are written in chunks through db.ingest_workflow_executions, so
+memory stays bounded by the chunk size rather than the batch size.
+
+Rows are keyed by (execution_id, started_at): resending a batch updates the
+same events instead of counting them twice.
+
+Line format:
+    {"execution_id": "8812", "workflow_activation_id": "<uuid>",
+     "status": "success", "started_at": "2026-01-31T12:00:00Z",
+     "finished_at": "2026-01-31T12:00:04Z", "duration_ms": 4000,
+     "error_message": null}
+"""
+
+import gzip
+import io
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+import db
+
+# Upper bounds per request (lines / decompressed bytes) - guards against gzip bombs
+EXECUTION_BULK_MAX_ROWS = int(os.getenv('EXECUTION_BULK_MAX_ROWS', '50000'))
+EXECUTION_BULK_MAX_BYTES = int(os.getenv('EXECUTION_BULK_MAX_BYTES', str(64 * 1024 * 1024)))
+
+VALID_STATUSES = {'success', 'error', 'failed', 'running', 'waiting', 'canceled', 'crashed'}
+MAX_ERROR_MESSAGE = 2000
+
+# duration_ms is an INTEGER column
+MAX_DURATION_MS = 2 ** 31 - 1
+
+
+class BatchTooLarge(Exception):
+    pass
+
+
+def open_body(stream: IO[bytes], content_encoding: Optional[str]) -> IO[bytes]:
+    """Request body as a byte stream, transparently gunzipped"""
+    buffered = io.BufferedReader(stream) if not hasattr(stream, 'peek') else stream
+    magic = buffered.peek(2)[:2]
+    if (content_encoding or '').lower() == 'gzip' or magic == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=buffered, mode='rb')
+    return buffered
+
+
+def iter_lines(body: IO[bytes], max_rows: int = EXECUTION_BULK_MAX_ROWS,
+               max_bytes: int = EXECUTION_BULK_MAX_BYTES) -> Iterator[Tuple[int, bytes]]:
+    """(line_number, raw_line) for non-empty lines; raises BatchTooLarge past the limits"""
+    read = 0
+    line_no = 0
+    for raw in body:
+        read += len(raw)
+        if read > max_bytes:
+            raise BatchTooLarge(f'body exceeds {max_bytes} bytes')
+        line_no += 1
+        if not raw.strip():
+            continue
+        if line_no > max_rows:
+            raise BatchTooLarge(f'batch exceeds {max_rows} lines')
+        yield line_no, raw
+
+
+def _timestamp(value: Any, field: str) -> datetime:
+    if not isinstance(value, str) or not value:
+        raise ValueError(f'{field} must be an ISO-8601 string')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def row_key(execution_id: Any, started_at: Any) -> Tuple[Any, Optional[datetime]]:
+    """(execution_id, started_at) as compared by the unique key, whatever the offset/format"""
+    try:
+        return execution_id, _timestamp(started_at, 'started_at')
+    except (ValueError, TypeError):
+        return execution_id, None
+
+
+def validate_row(data: Any) -> Dict[str, Any]:
+    """Normalized row for ingest_workflow_execution_events; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('line must be a JSON object')
+
+    execution_id = data.get('execution_id')
+    if isinstance(execution_id, int) and not isinstance(execution_id, bool):
+        execution_id = str(execution_id)
+    if not isinstance(execution_id, str) or not execution_id.strip():
+        raise ValueError('execution_id is required')
+
+    try:
+        activation_id = str(uuid.UUID(str(data.get('workflow_activation_id'))))
+    except ValueError:
+        raise ValueError('workflow_activation_id must be a UUID')
+
+    status = str(data.get('status') or '').lower()
+    if status not in VALID_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(sorted(VALID_STATUSES))}")
+
+    started_at = _timestamp(data.get('started_at'), 'started_at')
+    finished_at = _timestamp(data['finished_at'], 'finished_at') if data.get('finished_at') else None
+    if finished_at and finished_at < started_at:
+        raise ValueError('finished_at is before started_at')
+
+    duration_ms = data.get('duration_ms')
+    if duration_ms is None and finished_at:
+        duration_ms = int((finished_at - started_at).total_seconds() * 1000)
+    if duration_ms is not None:
+        if isinstance(duration_ms, bool) or not isinstance(duration_ms, (int, float)):
+            raise ValueError('duration_ms must be a number')
+        # Also rejects NaN / Infinity, which json.loads accepts
+        if not 0 <= duration_ms <= MAX_DURATION_MS:
+            raise ValueError(f'duration_ms must be between 0 and {MAX_DURATION_MS}')
+        duration_ms = int(duration_ms)
+
+    error_message = data.get('error_message')
+    if error_message is not None:
+        error_message = str(error_message)[:MAX_ERROR_MESSAGE]
+
+    return {
+        'execution_id': execution_id.strip(),
+        'workflow_activation_id': activation_id,
+        'status': status,
+        'started_at': started_at.isoformat(),
+        'finished_at': finished_at.isoformat() if finished_at else None,
+        'duration_ms': duration_ms,
+        'error_message': error_message
+    }
+
+
+def ingest(body: IO[bytes], allowed_activation_ids: Optional[Set[str]] = None,
+           chunk_size: int = db.EXECUTION_INGEST_CHUNK) -> Dict[str, Any]:
+    """
+    Validate and write an NDJSON body. allowed_activation_ids limits which
+    activations the caller may report for (None = any, for admins).
+    Returns counts plus per-line results:
+        {'line', 'execution_id', 'status': inserted|updated|rejected|invalid|forbidden|error, 'error'?}
+    """
+    results: List[Dict[str, Any]] = []
+    pending: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+
+    def flush():
+        if not pending:
+            return
+        # Same key as the table's unique constraint: one execution_id may be
+        # reported for several runs (different started_at) in one chunk
+        outcome = {}
+        for item in db.ingest_workflow_executions([row for row, _ in pending], chunk_size=len(pending)):
+            outcome[row_key(item.get('execution_id'), item.get('started_at'))] = item.get('result')
+        for row, result in pending:
+            result['status'] = outcome.get(row_key(row['execution_id'], row['started_at']), 'error')
+            if result['status'] == 'rejected':
+                result['error'] = 'unknown workflow_activation_id'
+        pending.clear()
+
+    for line_no, raw in iter_lines(body):
+        result: Dict[str, Any] = {'line': line_no, 'execution_id': None}
+        results.append(result)
+        data = None
+        try:
+            data = json.loads(raw)
+            row = validate_row(data)
+        except (ValueError, TypeError, OverflowError) as e:  # includes JSONDecodeError / UnicodeDecodeError
+            result.update({'status': 'invalid', 'error': str(e)})
+            if isinstance(data, dict):
+                result['execution_id'] = data.get('execution_id')
+            continue
+
+        result['execution_id'] = row['execution_id']
+        if allowed_activation_ids is not None and row['workflow_activation_id'] not in allowed_activation_ids:
+            result.update({'status': 'forbidden', 'error': 'activation does not belong to this account'})
+            continue
+
+        pending.append((row, result))
+        if len(pending) >= chunk_size:
+            flush()
+    flush()
+
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return {
+        'received': len(results),
+        'accepted': counts.get('inserted', 0) + counts.get('updated', 0),
+        'counts': counts,
+        'results': results
+    }
@@ -0,0 +1,207 @@
+"""LLM Provider Client - shared keep-alive connection pool with retries
+
+Every provider call of a chat turn (tool call, follow-up, retries) shares one
+Deadline, so a turn fails cleanly before the function's maxDuration instead
+of being killed by the platform. A call gets the remaining budget as its
+timeout, and a retry is only attempted when its backoff still leaves
+LLM_RETRY_MIN_SECONDS of budget for the request itself.
+"""
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+
+# Connections kept alive to the provider (per process)
+POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '10'))
+
+# Seconds to establish a connection
+CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+
+# Seconds for all provider calls of one turn. Leaves room below maxDuration
+# (15s in vercel.json) for context building and saving the reply.
+TURN_BUDGET = float(os.getenv('LLM_TURN_BUDGET', '12'))
+
+# Retries on 429/5xx and connection failures, with exponential backoff + jitter
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+BACKOFF_FACTOR = float(os.getenv('LLM_BACKOFF_FACTOR', '0.5'))
+BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+RETRY_MIN_SECONDS = float(os.getenv('LLM_RETRY_MIN_SECONDS', '3'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Connections opened in the background at cold start
+PREWARM_CONNECTIONS = int(os.getenv('LLM_PREWARM_CONNECTIONS', '2'))
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The turn's time budget ran out before the provider answered"""
+
+
+class Deadline:
+    """Wall-clock budget shared by the provider calls of one turn"""
+
+    def __init__(self, seconds: float = TURN_BUDGET):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self) -> float:
+        """Remaining seconds; raises DeadlineExceeded when none are left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"LLM turn budget of {self.seconds:.0f}s exhausted")
+        return remaining
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'retries': 0, 'deadline_exceeded': 0, 'prewarmed': 0}
+
+
+def get_session() -> requests.Session:
+    """Process-wide session; connections to the provider are reused across turns"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Retries are done in _request, where the turn deadline is known
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE,
+                                      max_retries=0, pool_block=False)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _headers(api_key: str, json_body: bool = False) -> Dict[str, str]:
+    headers = {'Authorization': f'Bearer {api_key}'}
+    if json_body:
+        headers['Content-Type'] = 'application/json'
+    return headers
+
+
+def _never_sent(error: requests.RequestException) -> bool:
+    """True when the request never reached the provider (safe to resend)"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _backoff(attempt: int, response: Optional[requests.Response]) -> float:
+    """Retry-After when the provider sends one, else jittered exponential backoff"""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass  # HTTP-date form; the provider sends seconds
+    backoff = min(BACKOFF_MAX, BACKOFF_FACTOR * (2 ** attempt))
+    # "Full jitter" so concurrent workers do not retry in lockstep
+    return random.uniform(backoff / 2, backoff)
+
+
+def _request(method: str, path: str, deadline: Deadline, **kwargs) -> requests.Response:
+    """
+    Send with retries on 429/5xx and connection failures, within the deadline.
+    Read timeouts and dropped connections are not retried: the completion may
+    already have run. The last 429/5xx response is returned when retries stop.
+    """
+    url = f"{OPENAI_BASE_URL}{path}"
+    attempt = 0
+    last_error: Optional[requests.RequestException] = None
+    while True:
+        _stats['requests'] += 1
+        response = None
+        try:
+            remaining = deadline.check()
+            response = get_session().request(
+                method, url, timeout=(min(CONNECT_TIMEOUT, remaining), remaining), **kwargs
+            )
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except DeadlineExceeded:
+            _stats['deadline_exceeded'] += 1
+            raise
+        except requests.RequestException as e:
+            _stats['errors'] += 1
+            if isinstance(e, requests.Timeout) and deadline.expired():
+                _stats['deadline_exceeded'] += 1
+                raise DeadlineExceeded(str(e)) from e
+            if attempt >= MAX_RETRIES or not _never_sent(e):
+                raise
+            last_error = e
+        else:
+            _stats['errors'] += 1
+            if attempt >= MAX_RETRIES:
+                return response
+
+        delay = _backoff(attempt, response)
+        if deadline.remaining() < delay + RETRY_MIN_SECONDS:
+            # A retry could not finish in time - report what we have now
+            if response is not None:
+                return response
+            raise last_error
+        if response is not None:
+            response.close()
+        attempt += 1
+        _stats['retries'] += 1
+        time.sleep(delay)
+
+
+def post(path: str, payload: Dict, api_key: str, stream: bool = False,
+         deadline: Optional[Deadline] = None, timeout: Optional[float] = None) -> requests.Response:
+    """
+    POST JSON to the provider, e.g. post('/chat/completions', payload, key).
+    Pass the turn's deadline; without one the call gets its own (timeout or TURN_BUDGET seconds).
+    """
+    return _request('POST', path, deadline or Deadline(timeout or TURN_BUDGET),
+                    headers=_headers(api_key, json_body=True), json=payload, stream=stream)
+
+
+def get(path: str, api_key: str, deadline: Optional[Deadline] = None,
+        timeout: Optional[float] = None) -> requests.Response:
+    return _request('GET', path, deadline or Deadline(timeout or TURN_BUDGET),
+                    headers=_headers(api_key))
+
+
+def prewarm(connections: int = PREWARM_CONNECTIONS) -> None:
+    """
+    Open TCP+TLS connections to the provider in background threads so the first
+    chat turn after a cold start does not pay for the handshake.
+    """
+    def _warm():
+        try:
+            # Any response (even 401/404) leaves a live connection in the pool
+            get_session().head(OPENAI_BASE_URL, timeout=(CONNECT_TIMEOUT, CONNECT_TIMEOUT)).close()
+            _stats['prewarmed'] += 1
+        except Exception as e:
+            print(f"LLM client prewarm failed: {e}")
+
+    for _ in range(max(0, min(connections, POOL_SIZE))):
+        threading.Thread(target=_warm, daemon=True).start()
+
+
+def stats() -> Dict:
+    return {
+        'pool_size': POOL_SIZE,
+        'connect_timeout': CONNECT_TIMEOUT,
+        'turn_budget': TURN_BUDGET,
+        'max_retries': MAX_RETRIES,
+        **_stats
+    }
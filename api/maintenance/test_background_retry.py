@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Test that a failing chat statistics increment is retried by the background queue
+
+Runs offline against the SQLite stats store:
+    python maintenance/test_background_retry.py
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import background
+import chat_analytics
+import chat_stats_store
+
+
+class FlakyStore(chat_stats_store.SQLiteStatsStore):
+    """Fails the first `failures` writes; commit_first applies the write before failing (lost response)"""
+
+    def __init__(self, path: str, failures: int = 1, commit_first: bool = False):
+        super().__init__(path)
+        self.failures = failures
+        self.commit_first = commit_first
+        self.calls = 0
+
+    def increment_many(self, rows, batch_id=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.commit_first:
+                super().increment_many(rows, batch_id=batch_id)
+            raise ConnectionError("simulated database error")
+        return super().increment_many(rows, batch_id=batch_id)
+
+
+def _run(store: FlakyStore) -> background.BackgroundQueue:
+    chat_stats_store._store = store
+    chat_analytics.CHAT_STATS_BUFFERED = False
+    queue = background.BackgroundQueue(name='test', workers=1, retry_backoff=0.01, sync=False)
+    queue.submit(chat_analytics.track_message, 'company-1', tokens_used=42, response_time_ms=300,
+                 event_id=str(uuid.uuid4()), raise_errors=True, label='track_message')
+    assert queue.flush(timeout=5), "queue did not drain"
+    return queue
+
+
+def test_failing_increment_is_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FlakyStore(os.path.join(tmp, 'stats.sqlite3'), failures=1)
+        queue = _run(store)
+
+        assert store.calls == 2, store.calls
+        assert queue.counters['retried'] == 1, queue.counters
+        assert queue.counters['completed'] == 1, queue.counters
+        row = store.get('company-1')
+        assert row['total_messages'] == 1 and row['total_tokens'] == 42, row
+        assert row['response_time_count'] == 1, row
+
+
+def test_retry_after_lost_response_counts_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FlakyStore(os.path.join(tmp, 'stats.sqlite3'), failures=1, commit_first=True)
+        queue = _run(store)
+
+        assert queue.counters['retried'] == 1, queue.counters
+        assert store.get('company-1')['total_messages'] == 1
+
+
+if __name__ == '__main__':
+    test_failing_increment_is_retried()
+    print("✅ failing increment is retried")
+    test_retry_after_lost_response_counts_once()
+    print("✅ retried event is counted once")
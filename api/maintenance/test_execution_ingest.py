@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Test per-line outcomes of the bulk execution ingest
+
+Runs offline (the ingest RPC is simulated):
+    python maintenance/test_execution_ingest.py
+"""
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import execution_ingest
+
+ACTIVATION_ID = '6f1c1a52-3a47-4a4c-9f0e-3c8f8f1f2b10'
+
+
+def _body(*lines):
+    return io.BytesIO(b''.join(json.dumps(line).encode() + b'\n' for line in lines))
+
+
+def _utc(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def _fake_rpc(existing):
+    """Stand-in for ingest_workflow_execution_events: keys already in `existing` are updates"""
+    def ingest(rows, chunk_size=None):
+        results = []
+        for row in rows:
+            key = (row['execution_id'], _utc(row['started_at']))
+            # Postgres returns started_at in UTC, not in the offset the client sent
+            results.append({
+                'execution_id': row['execution_id'],
+                'started_at': key[1].isoformat(),
+                'result': 'updated' if key in existing else 'inserted'
+            })
+            existing.add(key)
+        return results
+    return ingest
+
+
+def test_same_execution_id_with_different_started_at():
+    original = db.ingest_workflow_executions
+    db.ingest_workflow_executions = _fake_rpc({('8812', _utc('2026-01-31T12:00:00Z'))})
+    try:
+        report = execution_ingest.ingest(_body(
+            {'execution_id': '8812', 'workflow_activation_id': ACTIVATION_ID,
+             'status': 'success', 'started_at': '2026-01-31T12:00:00Z', 'duration_ms': 4000},
+            {'execution_id': '8812', 'workflow_activation_id': ACTIVATION_ID,
+             'status': 'error', 'started_at': '2026-01-31T14:30:00+02:00', 'duration_ms': 900}
+        ))
+    finally:
+        db.ingest_workflow_executions = original
+
+    statuses = [result['status'] for result in report['results']]
+    assert statuses == ['updated', 'inserted'], statuses
+    assert report['accepted'] == 2, report
+
+
+if __name__ == '__main__':
+    test_same_execution_id_with_different_started_at()
+    print("✅ outcomes are keyed by (execution_id, started_at)")
@@ -0,0 +1,147 @@
+-- ============================================================================
+-- Append-only Chat Messages Migration
+-- ============================================================================
+-- Moves conversation history out of chat_sessions.metadata->'messages' into
+-- the normalized chat_messages table. Every message gets a per-session
+-- sequence number so appends are a single INSERT instead of rewriting the
+-- whole JSONB array on every turn.
+--
+-- Run this in Supabase SQL Editor AFTER database_migration_chat.sql
+-- ============================================================================
+
+BEGIN;
+
+-- ============================================================================
+-- 1. Schema changes
+-- ============================================================================
+
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS seq BIGINT;
+
+-- Highest seq handed out per session (the row lock on this column serializes appends)
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_message_seq BIGINT NOT NULL DEFAULT 0;
+
+-- Idempotency key of an append (set by the API; retries reuse it)
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS client_id UUID;
+
+-- ============================================================================
+-- 2. Number messages that already live in chat_messages
+-- ============================================================================
+
+UPDATE chat_messages cm
+SET seq = numbered.rn
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY created_at, id) AS rn
+    FROM chat_messages
+) numbered
+WHERE cm.id = numbered.id
+  AND cm.seq IS NULL;
+
+-- ============================================================================
+-- 3. One-shot backfill of JSONB histories
+-- ============================================================================
+-- Only sessions without rows in chat_messages are copied, so re-running the
+-- migration does not duplicate messages.
+
+INSERT INTO chat_messages (session_id, seq, role, content, tokens_used, model, metadata, created_at)
+SELECT
+    s.id,
+    m.ordinality,
+    m.value->>'role',
+    COALESCE(m.value->>'content', ''),
+    NULLIF(m.value->>'tokens_used', '')::INTEGER,
+    m.value->>'model',
+    COALESCE(m.value->'metadata', '{}'::jsonb),
+    COALESCE(NULLIF(m.value->>'timestamp', '')::TIMESTAMPTZ, s.created_at)
+FROM chat_sessions s
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(s.metadata->'messages') = 'array'
+         THEN s.metadata->'messages'
+         ELSE '[]'::jsonb END
+) WITH ORDINALITY AS m(value, ordinality)
+WHERE m.value->>'role' IN ('user', 'assistant', 'system')
+  AND NOT EXISTS (SELECT 1 FROM chat_messages cm WHERE cm.session_id = s.id);
+
+-- Sync the per-session counter with the copied rows
+UPDATE chat_sessions s
+SET last_message_seq = agg.max_seq
+FROM (
+    SELECT session_id, MAX(seq) AS max_seq
+    FROM chat_messages
+    GROUP BY session_id
+) agg
+WHERE s.id = agg.session_id
+  AND s.last_message_seq < agg.max_seq;
+
+-- Drop the copied arrays so session rows stay small
+UPDATE chat_sessions
+SET metadata = metadata - 'messages'
+WHERE metadata ? 'messages';
+
+-- ============================================================================
+-- 4. Constraints & indexes
+-- ============================================================================
+
+ALTER TABLE chat_messages ALTER COLUMN seq SET NOT NULL;
+
+-- History reads are "last N messages of a session ordered by seq"
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_session_seq ON chat_messages(session_id, seq);
+
+-- One row per idempotency key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_session_client_id
+    ON chat_messages(session_id, client_id) WHERE client_id IS NOT NULL;
+
+-- ============================================================================
+-- 5. Append function
+-- ============================================================================
+-- Atomically reserves the next seq for the session and inserts the message.
+-- Concurrent turns on the same session queue on the session row lock instead
+-- of overwriting each other. A call repeating an earlier p_client_id returns
+-- the stored row without taking a new seq, so callers can retry safely.
+
+-- Replaced by the version with p_client_id (an overload would be ambiguous)
+DROP FUNCTION IF EXISTS append_chat_message(UUID, TEXT, TEXT, INTEGER, TEXT, JSONB);
+
+CREATE OR REPLACE FUNCTION append_chat_message(
+    p_session_id UUID,
+    p_role TEXT,
+    p_content TEXT,
+    p_tokens_used INTEGER DEFAULT NULL,
+    p_model TEXT DEFAULT NULL,
+    p_metadata JSONB DEFAULT '{}'::jsonb,
+    p_client_id UUID DEFAULT NULL
+)
+RETURNS chat_messages AS $$
+DECLARE
+    v_seq BIGINT;
+    v_row chat_messages;
+BEGIN
+    -- Lock the session first so a retry sees the row a concurrent attempt committed
+    PERFORM 1 FROM chat_sessions WHERE id = p_session_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'chat session % not found', p_session_id;
+    END IF;
+
+    IF p_client_id IS NOT NULL THEN
+        SELECT * INTO v_row FROM chat_messages
+        WHERE session_id = p_session_id AND client_id = p_client_id;
+        IF FOUND THEN
+            RETURN v_row;
+        END IF;
+    END IF;
+
+    UPDATE chat_sessions
+    SET last_message_seq = last_message_seq + 1,
+        updated_at = NOW()
+    WHERE id = p_session_id
+    RETURNING last_message_seq INTO v_seq;
+
+    INSERT INTO chat_messages (session_id, seq, role, content, tokens_used, model, metadata, client_id)
+    VALUES (p_session_id, v_seq, p_role, p_content, p_tokens_used, p_model, COALESCE(p_metadata, '{}'::jsonb), p_client_id)
+    ON CONFLICT (session_id, client_id) WHERE client_id IS NOT NULL DO NOTHING
+    RETURNING * INTO v_row;
+
+    RETURN v_row;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
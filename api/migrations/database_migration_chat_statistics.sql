@@ -0,0 +1,136 @@
+-- ============================================================================
+-- Chat Statistics Migration
+-- ============================================================================
+-- Daily per-company chat counters plus an atomic increment function.
+-- chat_analytics calls increment_chat_statistics via RPC, so concurrent
+-- messages never lose updates and each event costs one round trip.
+--
+-- Run this in Supabase SQL Editor
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS chat_statistics (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    company_id UUID NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    total_messages INTEGER NOT NULL DEFAULT 0,
+    total_sessions INTEGER NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    avg_response_time_ms INTEGER,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Latency aggregates: the average is derived from sum / count so increments stay additive
+ALTER TABLE chat_statistics ADD COLUMN IF NOT EXISTS response_time_sum_ms BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE chat_statistics ADD COLUMN IF NOT EXISTS response_time_count INTEGER NOT NULL DEFAULT 0;
+
+-- Seed the aggregates for rows written by the old read-modify-write code
+UPDATE chat_statistics
+SET response_time_sum_ms = avg_response_time_ms::BIGINT * total_messages,
+    response_time_count = total_messages
+WHERE avg_response_time_ms IS NOT NULL
+  AND response_time_count = 0;
+
+-- The old read-modify-write code could insert the same (company, day) twice
+-- under concurrency. Fold duplicates into the oldest row before the unique
+-- index is built; the lock keeps writers out until COMMIT.
+LOCK TABLE chat_statistics IN SHARE ROW EXCLUSIVE MODE;
+
+WITH totals AS (
+    SELECT company_id, date,
+           SUM(total_messages) AS total_messages,
+           SUM(total_sessions) AS total_sessions,
+           SUM(total_tokens) AS total_tokens,
+           SUM(response_time_sum_ms) AS response_time_sum_ms,
+           SUM(response_time_count) AS response_time_count
+    FROM chat_statistics
+    GROUP BY company_id, date
+    HAVING COUNT(*) > 1
+),
+keepers AS (
+    SELECT DISTINCT ON (company_id, date) id, company_id, date
+    FROM chat_statistics
+    ORDER BY company_id, date, created_at, id
+)
+UPDATE chat_statistics s
+SET total_messages = t.total_messages,
+    total_sessions = t.total_sessions,
+    total_tokens = t.total_tokens,
+    response_time_sum_ms = t.response_time_sum_ms,
+    response_time_count = t.response_time_count,
+    avg_response_time_ms = CASE
+        WHEN t.response_time_count > 0
+        THEN (t.response_time_sum_ms / t.response_time_count)::INTEGER
+        ELSE s.avg_response_time_ms END,
+    updated_at = NOW()
+FROM totals t
+JOIN keepers k ON k.company_id = t.company_id AND k.date = t.date
+WHERE s.id = k.id;
+
+DELETE FROM chat_statistics s
+WHERE EXISTS (
+    SELECT 1 FROM chat_statistics older
+    WHERE older.company_id = s.company_id
+      AND older.date = s.date
+      AND (older.created_at, older.id) < (s.created_at, s.id)
+);
+
+-- One row per company and day (target of the upsert)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_statistics_company_date ON chat_statistics(company_id, date);
+CREATE INDEX IF NOT EXISTS idx_chat_statistics_date ON chat_statistics(date DESC);
+
+-- ============================================================================
+-- Atomic increment
+-- ============================================================================
+-- Adds the given deltas to the (company, day) row, creating it if needed,
+-- in a single statement. Returns the updated row.
+
+CREATE OR REPLACE FUNCTION increment_chat_statistics(
+    p_company_id UUID,
+    p_date DATE DEFAULT CURRENT_DATE,
+    p_messages INTEGER DEFAULT 0,
+    p_sessions INTEGER DEFAULT 0,
+    p_tokens BIGINT DEFAULT 0,
+    p_response_time_sum_ms BIGINT DEFAULT 0,
+    p_response_time_count INTEGER DEFAULT 0
+)
+RETURNS chat_statistics AS $$
+    INSERT INTO chat_statistics AS s (
+        company_id, date, total_messages, total_sessions, total_tokens,
+        response_time_sum_ms, response_time_count, avg_response_time_ms
+    )
+    VALUES (
+        p_company_id, p_date, p_messages, p_sessions, p_tokens,
+        p_response_time_sum_ms, p_response_time_count,
+        CASE WHEN p_response_time_count > 0
+             THEN (p_response_time_sum_ms / p_response_time_count)::INTEGER END
+    )
+    ON CONFLICT (company_id, date) DO UPDATE SET
+        total_messages = s.total_messages + EXCLUDED.total_messages,
+        total_sessions = s.total_sessions + EXCLUDED.total_sessions,
+        total_tokens = s.total_tokens + EXCLUDED.total_tokens,
+        response_time_sum_ms = s.response_time_sum_ms + EXCLUDED.response_time_sum_ms,
+        response_time_count = s.response_time_count + EXCLUDED.response_time_count,
+        avg_response_time_ms = CASE
+            WHEN s.response_time_count + EXCLUDED.response_time_count > 0
+            THEN ((s.response_time_sum_ms + EXCLUDED.response_time_sum_ms)
+                  / (s.response_time_count + EXCLUDED.response_time_count))::INTEGER
+            ELSE s.avg_response_time_ms END,
+        updated_at = NOW()
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- ============================================================================
+-- Row Level Security
+-- ============================================================================
+
+ALTER TABLE chat_statistics ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role has full access to chat_statistics" ON chat_statistics;
+CREATE POLICY "Service role has full access to chat_statistics"
+    ON chat_statistics FOR ALL
+    USING (auth.role() = 'service_role');
+
+COMMIT;
@@ -0,0 +1,133 @@
+-- ============================================================================
+-- Chat Statistics: latency histogram + batched increments
+-- ============================================================================
+-- Requires database_migration_chat_statistics.sql.
+--
+-- chat_analytics buffers counters per (company, day) in each worker and
+-- flushes the deltas periodically. Every field is merged additively, so
+-- flushes from several workers (in any order) add up to the same totals.
+-- Each batch carries an id; a resent batch (after a timeout or a lost
+-- response) is skipped instead of being counted twice.
+--
+-- Run this in Supabase SQL Editor
+-- ============================================================================
+
+-- Response time histogram: {"<upper bound ms>": count, ..., "inf": count}
+ALTER TABLE chat_statistics ADD COLUMN IF NOT EXISTS response_time_histogram JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+-- Key-wise sum of two histograms
+CREATE OR REPLACE FUNCTION merge_histograms(a JSONB, b JSONB)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(key, total), '{}'::jsonb)
+    FROM (
+        SELECT key, SUM(value::BIGINT) AS total
+        FROM (
+            SELECT * FROM jsonb_each_text(COALESCE(a, '{}'::jsonb))
+            UNION ALL
+            SELECT * FROM jsonb_each_text(COALESCE(b, '{}'::jsonb))
+        ) kv
+        GROUP BY key
+    ) sums;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ============================================================================
+-- Atomic increment (replaces the version without a histogram)
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS increment_chat_statistics(UUID, DATE, INTEGER, INTEGER, BIGINT, BIGINT, INTEGER);
+
+CREATE OR REPLACE FUNCTION increment_chat_statistics(
+    p_company_id UUID,
+    p_date DATE DEFAULT CURRENT_DATE,
+    p_messages INTEGER DEFAULT 0,
+    p_sessions INTEGER DEFAULT 0,
+    p_tokens BIGINT DEFAULT 0,
+    p_response_time_sum_ms BIGINT DEFAULT 0,
+    p_response_time_count INTEGER DEFAULT 0,
+    p_response_time_histogram JSONB DEFAULT '{}'::jsonb
+)
+RETURNS chat_statistics AS $$
+    INSERT INTO chat_statistics AS s (
+        company_id, date, total_messages, total_sessions, total_tokens,
+        response_time_sum_ms, response_time_count, avg_response_time_ms,
+        response_time_histogram
+    )
+    VALUES (
+        p_company_id, p_date, p_messages, p_sessions, p_tokens,
+        p_response_time_sum_ms, p_response_time_count,
+        CASE WHEN p_response_time_count > 0
+             THEN (p_response_time_sum_ms / p_response_time_count)::INTEGER END,
+        COALESCE(p_response_time_histogram, '{}'::jsonb)
+    )
+    ON CONFLICT (company_id, date) DO UPDATE SET
+        total_messages = s.total_messages + EXCLUDED.total_messages,
+        total_sessions = s.total_sessions + EXCLUDED.total_sessions,
+        total_tokens = s.total_tokens + EXCLUDED.total_tokens,
+        response_time_sum_ms = s.response_time_sum_ms + EXCLUDED.response_time_sum_ms,
+        response_time_count = s.response_time_count + EXCLUDED.response_time_count,
+        avg_response_time_ms = CASE
+            WHEN s.response_time_count + EXCLUDED.response_time_count > 0
+            THEN ((s.response_time_sum_ms + EXCLUDED.response_time_sum_ms)
+                  / (s.response_time_count + EXCLUDED.response_time_count))::INTEGER
+            ELSE s.avg_response_time_ms END,
+        response_time_histogram = merge_histograms(s.response_time_histogram, EXCLUDED.response_time_histogram),
+        updated_at = NOW()
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- ============================================================================
+-- Batched increment
+-- ============================================================================
+-- p_rows: [{"company_id", "date", "messages", "sessions", "tokens",
+--           "response_time_sum_ms", "response_time_count", "response_time_histogram"}, ...]
+-- p_batch_id: optional; a batch id that was already applied returns 0
+-- Applies every delta in one transaction. Rows are sorted by (company, date)
+-- so concurrent batches lock rows in the same order and cannot deadlock.
+
+-- Ids of applied batches, kept for a day (long enough for any retry)
+CREATE TABLE IF NOT EXISTS chat_statistics_batches (
+    batch_id UUID PRIMARY KEY,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_statistics_batches_applied_at ON chat_statistics_batches(applied_at);
+
+ALTER TABLE chat_statistics_batches ENABLE ROW LEVEL SECURITY;
+
+DROP FUNCTION IF EXISTS increment_chat_statistics_batch(JSONB);
+
+CREATE OR REPLACE FUNCTION increment_chat_statistics_batch(p_rows JSONB, p_batch_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    r JSONB;
+    applied INTEGER := 0;
+BEGIN
+    IF p_batch_id IS NOT NULL THEN
+        -- A concurrent resend of the same batch waits here and then conflicts
+        INSERT INTO chat_statistics_batches (batch_id) VALUES (p_batch_id)
+        ON CONFLICT (batch_id) DO NOTHING;
+        IF NOT FOUND THEN
+            RETURN 0;
+        END IF;
+        DELETE FROM chat_statistics_batches WHERE applied_at < NOW() - INTERVAL '1 day';
+    END IF;
+
+    FOR r IN
+        SELECT value FROM jsonb_array_elements(p_rows)
+        ORDER BY value->>'company_id', value->>'date'
+    LOOP
+        PERFORM increment_chat_statistics(
+            (r->>'company_id')::UUID,
+            COALESCE((r->>'date')::DATE, CURRENT_DATE),
+            COALESCE((r->>'messages')::INTEGER, 0),
+            COALESCE((r->>'sessions')::INTEGER, 0),
+            COALESCE((r->>'tokens')::BIGINT, 0),
+            COALESCE((r->>'response_time_sum_ms')::BIGINT, 0),
+            COALESCE((r->>'response_time_count')::INTEGER, 0),
+            COALESCE(r->'response_time_histogram', '{}'::jsonb)
+        );
+        applied := applied + 1;
+    END LOOP;
+    RETURN applied;
+END;
+$$ LANGUAGE plpgsql;
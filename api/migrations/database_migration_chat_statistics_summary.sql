@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Chat Statistics: cross-company summary
+-- ============================================================================
+-- Requires database_migration_chat_statistics.sql.
+--
+-- Totals for every company over a date range in one grouped query, used by
+-- chat_analytics.get_all_companies_summary (admin analytics view).
+--
+-- Run this in Supabase SQL Editor
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_chat_statistics_summary(p_start_date DATE)
+RETURNS TABLE (
+    company_id UUID,
+    company_name TEXT,
+    total_messages BIGINT,
+    total_sessions BIGINT,
+    total_tokens BIGINT
+) AS $$
+    SELECT
+        c.id,
+        c.name::TEXT,
+        COALESCE(SUM(s.total_messages), 0)::BIGINT,
+        COALESCE(SUM(s.total_sessions), 0)::BIGINT,
+        COALESCE(SUM(s.total_tokens), 0)::BIGINT
+    FROM companies c
+    LEFT JOIN chat_statistics s
+        ON s.company_id = c.id
+       AND s.date >= p_start_date
+    GROUP BY c.id, c.name
+    ORDER BY 3 DESC;
+$$ LANGUAGE sql STABLE;
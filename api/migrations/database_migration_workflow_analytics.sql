@@ -0,0 +1,116 @@
+-- ============================================================================
+-- Workflow Execution Analytics Migration
+-- ============================================================================
+-- Requires database_migration_workflows.sql.
+--
+-- Aggregates for the analytics dashboards (analytics_helper). Date range,
+-- company/user/workflow scope and status grouping run in the database and
+-- only totals come back, so dashboard latency does not grow with history.
+--
+-- Scope: a company covers every activation of its users (users.company_id).
+-- "failed" counts both 'failed' and 'error' (n8n reports 'error').
+--
+-- Run this in Supabase SQL Editor
+-- ============================================================================
+
+-- Range scans by start time, overall and per activation
+CREATE INDEX IF NOT EXISTS idx_workflow_executions_started ON workflow_executions(started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_workflow_executions_activation_started ON workflow_executions(workflow_activation_id, started_at DESC);
+
+-- ============================================================================
+-- Totals
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_workflow_execution_stats(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL,
+    p_workflow_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    total_executions BIGINT,
+    successful BIGINT,
+    failed BIGINT,
+    avg_duration_ms NUMERIC,
+    min_duration_ms INTEGER,
+    max_duration_ms INTEGER,
+    last_started_at TIMESTAMPTZ
+) AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE e.status = 'success'),
+        COUNT(*) FILTER (WHERE e.status IN ('failed', 'error')),
+        ROUND(AVG(e.duration_ms) FILTER (WHERE e.duration_ms > 0)),
+        MIN(e.duration_ms) FILTER (WHERE e.duration_ms > 0),
+        MAX(e.duration_ms) FILTER (WHERE e.duration_ms > 0),
+        MAX(e.started_at)
+    FROM workflow_executions e
+    JOIN workflow_activations a ON a.id = e.workflow_activation_id
+    WHERE e.started_at BETWEEN p_start AND p_end
+      AND (p_workflow_id IS NULL OR a.workflow_id = p_workflow_id)
+      AND (p_user_id IS NULL OR a.user_id = p_user_id)
+      AND (p_company_id IS NULL OR a.user_id IN (SELECT u.id FROM users u WHERE u.company_id = p_company_id));
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- Daily timeline (UTC days)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_workflow_execution_timeline(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    day DATE,
+    total BIGINT,
+    success BIGINT,
+    failed BIGINT
+) AS $$
+    SELECT
+        (e.started_at AT TIME ZONE 'UTC')::DATE,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE e.status = 'success'),
+        COUNT(*) FILTER (WHERE e.status IN ('failed', 'error'))
+    FROM workflow_executions e
+    JOIN workflow_activations a ON a.id = e.workflow_activation_id
+    WHERE e.started_at BETWEEN p_start AND p_end
+      AND (p_user_id IS NULL OR a.user_id = p_user_id)
+      AND (p_company_id IS NULL OR a.user_id IN (SELECT u.id FROM users u WHERE u.company_id = p_company_id))
+    GROUP BY 1
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- Top workflows by execution count
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_top_workflow_counts(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    workflow_id UUID,
+    total BIGINT,
+    success BIGINT,
+    failed BIGINT
+) AS $$
+    SELECT
+        a.workflow_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE e.status = 'success'),
+        COUNT(*) FILTER (WHERE e.status IN ('failed', 'error'))
+    FROM workflow_executions e
+    JOIN workflow_activations a ON a.id = e.workflow_activation_id
+    WHERE e.started_at BETWEEN p_start AND p_end
+      AND (p_user_id IS NULL OR a.user_id = p_user_id)
+      AND (p_company_id IS NULL OR a.user_id IN (SELECT u.id FROM users u WHERE u.company_id = p_company_id))
+    GROUP BY a.workflow_id
+    ORDER BY 2 DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,325 @@
+-- ============================================================================
+-- Workflow Execution Event Store Migration
+-- ============================================================================
+-- Requires database_migration_workflows.sql and
+-- database_migration_workflow_analytics.sql.
+--
+-- workflow_execution_events is the analytics copy of every execution:
+-- - range-partitioned by month on started_at, so a 30-day dashboard only
+--   touches one or two partitions and old months can be detached/dropped
+-- - tenant columns (workflow_id, user_id, company_id) are denormalized at
+--   ingest time, so dashboard queries need no joins
+-- - (execution_id, started_at) is unique, so re-ingesting a batch updates
+--   rows instead of double-counting
+--
+-- Executions written to workflow_executions are mirrored by a trigger; bulk
+-- ingestion goes through ingest_workflow_execution_events (POST /api/executions/bulk).
+--
+-- Run this in Supabase SQL Editor. Monthly partitions are created ahead of
+-- time: this migration creates the current month plus two, and schedules
+-- ensure_workflow_execution_partitions() with pg_cron when the extension is
+-- enabled (otherwise schedule it yourself). Rows that still land in the
+-- default partition are moved into their month's partition when it is created.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS workflow_execution_events (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    execution_id TEXT NOT NULL,                 -- n8n execution id (or workflow_executions.id)
+    workflow_activation_id UUID,
+    workflow_id UUID,
+    user_id UUID,
+    company_id UUID,
+    status TEXT NOT NULL,                       -- 'success', 'error', 'running', 'waiting'
+    error_message TEXT,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    duration_ms INTEGER,
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, started_at),
+    UNIQUE (execution_id, started_at)
+) PARTITION BY RANGE (started_at);
+
+-- Catch-all for rows outside the created monthly partitions
+CREATE TABLE IF NOT EXISTS workflow_execution_events_default
+    PARTITION OF workflow_execution_events DEFAULT;
+
+-- Indexes are created on every partition
+CREATE INDEX IF NOT EXISTS idx_wf_events_started ON workflow_execution_events(started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wf_events_company_started ON workflow_execution_events(company_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wf_events_user_started ON workflow_execution_events(user_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wf_events_workflow_started ON workflow_execution_events(workflow_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wf_events_activation_started ON workflow_execution_events(workflow_activation_id, started_at DESC);
+
+-- ============================================================================
+-- Partition management
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION create_workflow_execution_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::DATE;
+    month_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'workflow_execution_events_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        -- Rows of this month in the default partition would violate the new
+        -- partition's range: take them out first and re-route them afterwards.
+        -- The lock keeps writers from adding more in between (until COMMIT).
+        LOCK TABLE workflow_execution_events_default IN EXCLUSIVE MODE;
+        CREATE TEMP TABLE workflow_execution_events_moved AS
+            SELECT * FROM workflow_execution_events_default
+            WHERE started_at >= month_start AND started_at < month_end;
+        DELETE FROM workflow_execution_events_default
+            WHERE started_at >= month_start AND started_at < month_end;
+
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF workflow_execution_events FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_end
+        );
+
+        INSERT INTO workflow_execution_events SELECT * FROM workflow_execution_events_moved;
+        DROP TABLE workflow_execution_events_moved;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Current month plus p_months_ahead future months (scheduled below)
+CREATE OR REPLACE FUNCTION ensure_workflow_execution_partitions(p_months_ahead INTEGER DEFAULT 2)
+RETURNS VOID AS $$
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM create_workflow_execution_partition((CURRENT_DATE + make_interval(months => i))::DATE);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for existing history (up to 24 months back) and the months ahead
+DO $$
+DECLARE
+    first_month DATE;
+BEGIN
+    SELECT GREATEST(
+        date_trunc('month', COALESCE(MIN(started_at), NOW()))::DATE,
+        (date_trunc('month', NOW()) - INTERVAL '24 months')::DATE
+    ) INTO first_month FROM workflow_executions;
+
+    WHILE first_month < date_trunc('month', NOW())::DATE LOOP
+        PERFORM create_workflow_execution_partition(first_month);
+        first_month := (first_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+    PERFORM ensure_workflow_execution_partitions(2);
+END $$;
+
+-- Keep two months of partitions ahead (1st and 15th of each month, 03:00 UTC)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'ensure-workflow-execution-partitions',
+            '0 3 1,15 * *',
+            'SELECT ensure_workflow_execution_partitions(2)'
+        );
+    ELSE
+        RAISE NOTICE 'pg_cron is not enabled: schedule ensure_workflow_execution_partitions() monthly';
+    END IF;
+END $$;
+
+-- ============================================================================
+-- Ingestion
+-- ============================================================================
+-- p_rows: [{"execution_id", "workflow_activation_id", "status", "started_at",
+--           "finished_at", "duration_ms", "error_message"}, ...]
+-- Tenant columns are resolved from the activation. A row whose
+-- (execution_id, started_at) already exists is updated in place (e.g. a
+-- 'running' execution that later finished), never duplicated. When a batch
+-- repeats a key, its last occurrence wins.
+-- Returns one row per input with its key: 'inserted', 'updated' or 'rejected'.
+
+-- Earlier versions returned only (execution_id, result)
+DROP FUNCTION IF EXISTS ingest_workflow_execution_events(JSONB);
+
+CREATE OR REPLACE FUNCTION ingest_workflow_execution_events(p_rows JSONB)
+RETURNS TABLE (execution_id TEXT, started_at TIMESTAMPTZ, result TEXT) AS $$
+    WITH input AS (
+        SELECT
+            r->>'execution_id' AS execution_id,
+            (r->>'workflow_activation_id')::UUID AS workflow_activation_id,
+            r->>'status' AS status,
+            r->>'error_message' AS error_message,
+            (r->>'started_at')::TIMESTAMPTZ AS started_at,
+            (r->>'finished_at')::TIMESTAMPTZ AS finished_at,
+            (r->>'duration_ms')::INTEGER AS duration_ms,
+            r_ord AS ord
+        FROM jsonb_array_elements(p_rows) WITH ORDINALITY AS t(r, r_ord)
+    ),
+    resolved AS (
+        SELECT DISTINCT ON (i.execution_id, i.started_at)
+            i.*, a.workflow_id, a.user_id, u.company_id
+        FROM input i
+        JOIN workflow_activations a ON a.id = i.workflow_activation_id
+        LEFT JOIN users u ON u.id = a.user_id
+        ORDER BY i.execution_id, i.started_at, i.ord DESC
+    ),
+    written AS (
+        INSERT INTO workflow_execution_events AS e (
+            execution_id, workflow_activation_id, workflow_id, user_id, company_id,
+            status, error_message, started_at, finished_at, duration_ms
+        )
+        SELECT execution_id, workflow_activation_id, workflow_id, user_id, company_id,
+               status, error_message, started_at, finished_at, duration_ms
+        FROM resolved
+        ON CONFLICT (execution_id, started_at) DO UPDATE SET
+            status = EXCLUDED.status,
+            error_message = EXCLUDED.error_message,
+            finished_at = EXCLUDED.finished_at,
+            duration_ms = EXCLUDED.duration_ms,
+            ingested_at = NOW()
+        RETURNING e.execution_id, e.started_at, (xmax = 0) AS inserted
+    )
+    SELECT i.execution_id,
+           i.started_at,
+           CASE WHEN w.execution_id IS NULL THEN 'rejected'
+                WHEN w.inserted THEN 'inserted'
+                ELSE 'updated' END
+    FROM input i
+    LEFT JOIN written w ON w.execution_id = i.execution_id AND w.started_at = i.started_at
+    ORDER BY i.ord;
+$$ LANGUAGE sql;
+
+-- Mirror executions written to workflow_executions (n8n / legacy writers)
+CREATE OR REPLACE FUNCTION mirror_workflow_execution()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM ingest_workflow_execution_events(jsonb_build_array(jsonb_build_object(
+        'execution_id', COALESCE(NEW.n8n_execution_id, NEW.id::TEXT),
+        'workflow_activation_id', NEW.workflow_activation_id,
+        'status', NEW.status,
+        'error_message', NEW.error_message,
+        'started_at', COALESCE(NEW.started_at, NOW()),
+        'finished_at', NEW.finished_at,
+        'duration_ms', NEW.duration_ms
+    )));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mirror_workflow_execution_events ON workflow_executions;
+CREATE TRIGGER mirror_workflow_execution_events
+    AFTER INSERT OR UPDATE ON workflow_executions
+    FOR EACH ROW
+    EXECUTE FUNCTION mirror_workflow_execution();
+
+-- Backfill existing history
+INSERT INTO workflow_execution_events (
+    execution_id, workflow_activation_id, workflow_id, user_id, company_id,
+    status, error_message, started_at, finished_at, duration_ms
+)
+SELECT COALESCE(e.n8n_execution_id, e.id::TEXT), e.workflow_activation_id, a.workflow_id,
+       a.user_id, u.company_id, e.status, e.error_message, COALESCE(e.started_at, NOW()),
+       e.finished_at, e.duration_ms
+FROM workflow_executions e
+JOIN workflow_activations a ON a.id = e.workflow_activation_id
+LEFT JOIN users u ON u.id = a.user_id
+ON CONFLICT (execution_id, started_at) DO NOTHING;
+
+-- ============================================================================
+-- Dashboard aggregates now read the event store (same signatures)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_workflow_execution_stats(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL,
+    p_workflow_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    total_executions BIGINT,
+    successful BIGINT,
+    failed BIGINT,
+    avg_duration_ms NUMERIC,
+    min_duration_ms INTEGER,
+    max_duration_ms INTEGER,
+    last_started_at TIMESTAMPTZ
+) AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'success'),
+        COUNT(*) FILTER (WHERE status IN ('failed', 'error')),
+        ROUND(AVG(duration_ms) FILTER (WHERE duration_ms > 0)),
+        MIN(duration_ms) FILTER (WHERE duration_ms > 0),
+        MAX(duration_ms) FILTER (WHERE duration_ms > 0),
+        MAX(started_at)
+    FROM workflow_execution_events
+    WHERE started_at BETWEEN p_start AND p_end
+      AND (p_workflow_id IS NULL OR workflow_id = p_workflow_id)
+      AND (p_user_id IS NULL OR user_id = p_user_id)
+      AND (p_company_id IS NULL OR company_id = p_company_id);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_workflow_execution_timeline(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    day DATE,
+    total BIGINT,
+    success BIGINT,
+    failed BIGINT
+) AS $$
+    SELECT
+        (started_at AT TIME ZONE 'UTC')::DATE,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'success'),
+        COUNT(*) FILTER (WHERE status IN ('failed', 'error'))
+    FROM workflow_execution_events
+    WHERE started_at BETWEEN p_start AND p_end
+      AND (p_user_id IS NULL OR user_id = p_user_id)
+      AND (p_company_id IS NULL OR company_id = p_company_id)
+    GROUP BY 1
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_top_workflow_counts(
+    p_start TIMESTAMPTZ,
+    p_end TIMESTAMPTZ,
+    p_company_id UUID DEFAULT NULL,
+    p_user_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    workflow_id UUID,
+    total BIGINT,
+    success BIGINT,
+    failed BIGINT
+) AS $$
+    SELECT
+        workflow_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'success'),
+        COUNT(*) FILTER (WHERE status IN ('failed', 'error'))
+    FROM workflow_execution_events
+    WHERE started_at BETWEEN p_start AND p_end
+      AND workflow_id IS NOT NULL
+      AND (p_user_id IS NULL OR user_id = p_user_id)
+      AND (p_company_id IS NULL OR company_id = p_company_id)
+    GROUP BY workflow_id
+    ORDER BY 2 DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- Row Level Security
+-- ============================================================================
+
+ALTER TABLE workflow_execution_events ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own execution events" ON workflow_execution_events;
+CREATE POLICY "Users can view own execution events"
+    ON workflow_execution_events FOR SELECT
+    USING (user_id = auth.uid());
+
+COMMENT ON TABLE workflow_execution_events IS 'Monthly-partitioned analytics copy of workflow executions';
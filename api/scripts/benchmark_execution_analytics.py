@@ -0,0 +1,197 @@
+"""
+Benchmark local workflow execution aggregation: per-row dict loops vs ExecutionFrame.
+
+Generates synthetic executions shaped like PostgREST rows, then times the
+previous analytics_helper loops against the NumPy columnar engine for a
+dashboard render (stats, daily timeline, top workflows) over several scopes,
+and checks that both produce the same numbers.
+
+The previous helpers each filtered the full row list themselves (one
+datetime.fromisoformat per row per helper call); the frame is built once
+and every scope/aggregate is an array operation on it.
+
+Usage:
+    python scripts/benchmark_execution_analytics.py
+    python scripts/benchmark_execution_analytics.py --rows 100000 --scopes 10 --repeat 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path to import execution_frame
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_frame import ExecutionFrame
+
+STATUSES = ['success'] * 8 + ['error', 'failed', 'running']
+
+
+def synthetic_rows(n: int, days: int, workflows: int, activations: int, seed: int = 7):
+    rng = random.Random(seed)
+    workflow_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(workflows)]
+    activation_map = [(str(uuid.UUID(int=rng.getrandbits(128))), rng.choice(workflow_ids))
+                      for _ in range(activations)]
+    now = datetime.now(timezone.utc)
+    rows = []
+    for _ in range(n):
+        activation_id, workflow_id = rng.choice(activation_map)
+        started = now - timedelta(seconds=rng.randint(0, days * 86400))
+        rows.append({
+            'workflow_activation_id': activation_id,
+            'workflow_id': workflow_id,
+            'status': rng.choice(STATUSES),
+            'started_at': started.isoformat(),
+            'duration_ms': rng.randint(50, 30000) if rng.random() > 0.05 else None
+        })
+    return rows, [a for a, _ in activation_map]
+
+
+# ---------------------------------------------------------------------------
+# Previous implementation (per-row loops), with 'error' counted as failed
+# ---------------------------------------------------------------------------
+
+def _parse(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def legacy_filter(rows, start, end, activation_ids):
+    rows = [e for e in rows if e.get('started_at') and start <= _parse(e['started_at']) <= end]
+    return [e for e in rows if e.get('workflow_activation_id') in activation_ids]
+
+
+def legacy_stats(rows):
+    successful = len([e for e in rows if e.get('status') == 'success'])
+    failed = len([e for e in rows if e.get('status') in ('failed', 'error')])
+    durations = [e.get('duration_ms', 0) for e in rows if e.get('duration_ms')]
+    return {
+        'total_executions': len(rows),
+        'successful': successful,
+        'failed': failed,
+        'avg_duration_ms': sum(durations) / len(durations) if durations else 0
+    }
+
+
+def legacy_timeline(rows, start, end):
+    daily = {}
+    current, last = start.date(), end.date()
+    while current <= last:
+        daily[current.isoformat()] = {'success': 0, 'failed': 0, 'total': 0}
+        current += timedelta(days=1)
+    for e in rows:
+        key = _parse(e['started_at']).date().isoformat()
+        if key in daily:
+            daily[key]['total'] += 1
+            if e.get('status') == 'success':
+                daily[key]['success'] += 1
+            elif e.get('status') in ('failed', 'error'):
+                daily[key]['failed'] += 1
+    return [{'date': d, **c} for d, c in sorted(daily.items())]
+
+
+def legacy_top(rows, limit):
+    counts = {}
+    for e in rows:
+        c = counts.setdefault(e['workflow_id'], {'total': 0, 'success': 0, 'failed': 0})
+        c['total'] += 1
+        if e.get('status') == 'success':
+            c['success'] += 1
+        elif e.get('status') in ('failed', 'error'):
+            c['failed'] += 1
+    ranked = sorted(counts.items(), key=lambda kv: kv[1]['total'], reverse=True)[:limit]
+    return [(wid, c['total']) for wid, c in ranked]
+
+
+def legacy(rows, start, end, scopes, limit):
+    results = []
+    for activation_ids in scopes:
+        # get_execution_stats / get_timeline_data / get_top_workflows each filtered on their own
+        results.append((
+            legacy_stats(legacy_filter(rows, start, end, activation_ids)),
+            legacy_timeline(legacy_filter(rows, start, end, activation_ids), start, end),
+            legacy_top(legacy_filter(rows, start, end, activation_ids), limit)
+        ))
+    return results
+
+
+def vectorized(rows, start, end, scopes, limit):
+    frame = ExecutionFrame.from_rows(rows)
+    results = []
+    for activation_ids in scopes:
+        scoped = frame.filter(start, end, activation_ids)
+        top = [(w['workflow_id'], w['total']) for w in scoped.top_workflows(limit)]
+        results.append((scoped.stats(), scoped.timeline(start, end), top))
+    return results
+
+
+def same(legacy_result, vector_result):
+    (l_stats, l_timeline, l_top), (v_stats, v_timeline, v_top) = legacy_result, vector_result
+    return (
+        l_stats['total_executions'] == v_stats['total_executions']
+        and l_stats['successful'] == v_stats['successful']
+        and l_stats['failed'] == v_stats['failed']
+        and abs(l_stats['avg_duration_ms'] - v_stats['avg_duration_ms']) < 1e-6
+        and l_timeline == v_timeline
+        and [t for _, t in l_top] == [t for _, t in v_top]
+    )
+
+
+def best_of(fn, repeat, *args):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=90, help='history spread of the synthetic rows')
+    parser.add_argument('--window', type=int, default=30, help='dashboard date range in days')
+    parser.add_argument('--workflows', type=int, default=200)
+    parser.add_argument('--activations', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--scopes', type=int, default=5, help='companies rendered from the same rows')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows, activation_ids = synthetic_rows(args.rows, args.days, args.workflows, args.activations)
+    # Each scope is one company's share of the activations
+    share = max(1, len(activation_ids) // args.scopes)
+    scopes = [set(activation_ids[i * share:(i + 1) * share]) for i in range(args.scopes)]
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=args.window)
+
+    print(f"{args.rows} executions, {args.window}-day window, best of {args.repeat}\n")
+    print(f"{'scopes':>6} {'dict loops (ms)':>16} {'numpy (ms)':>11} {'speedup':>8}")
+    matches = True
+    for n_scopes in sorted({1, args.scopes}):
+        legacy_time, l_results = best_of(legacy, args.repeat, rows, start, end, scopes[:n_scopes], args.limit)
+        vector_time, v_results = best_of(vectorized, args.repeat, rows, start, end, scopes[:n_scopes], args.limit)
+        matches = matches and all(same(l, v) for l, v in zip(l_results, v_results))
+        print(f"{n_scopes:>6} {legacy_time * 1000:>16.1f} {vector_time * 1000:>11.1f} "
+              f"{legacy_time / vector_time:>7.1f}x")
+
+    frame = ExecutionFrame.from_rows(rows)
+    started = time.perf_counter()
+    scoped = frame.filter(start, end, scopes[0])
+    stats = scoped.stats()
+    scoped.timeline(start, end)
+    scoped.top_workflows(args.limit)
+    query_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\nper-scope query on a built frame: {query_ms:.1f} ms")
+    print(f"p50/p90/p99 duration (numpy only): {stats['p50_duration_ms']:.0f} / "
+          f"{stats['p90_duration_ms']:.0f} / {stats['p99_duration_ms']:.0f} ms")
+    print("results match" if matches else "RESULTS DIFFER")
+    if not matches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
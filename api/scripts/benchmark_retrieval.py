@@ -0,0 +1,125 @@
+"""
+Benchmark knowledge retrieval (BM25 vs dense vs hybrid) on the WTM seminar corpus.
+
+Each seminar becomes a knowledge entry (title = seminar name, content = answer).
+Its question is the query and the seminar itself is the expected hit.
+
+Usage:
+    python scripts/benchmark_retrieval.py            # seed data from migrations/
+    python scripts/benchmark_retrieval.py --db       # live seminar_qa table
+    python scripts/benchmark_retrieval.py --k 3 --repeat 20
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+# Add parent directory to path to import db / bot
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import retrieval, vectors
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'migrations', 'database_migration_seminar_qa.sql')
+
+# ('name', 'question', 'answer', ARRAY[...], 'category')
+_ROW_RE = re.compile(r"\(\s*'((?:[^']|'')*)'\s*,\s*'((?:[^']|'')*)'\s*,\s*'((?:[^']|'')*)'\s*,\s*ARRAY\[[^\]]*\]\s*,\s*'((?:[^']|'')*)'\s*\)")
+
+
+def load_seed_corpus():
+    with open(SEED_FILE, encoding='utf-8') as f:
+        sql = f.read()
+    rows = []
+    for name, question, answer, category in _ROW_RE.findall(sql):
+        rows.append({
+            'seminar_name': name.replace("''", "'"),
+            'question': question.replace("''", "'"),
+            'answer': answer.replace("''", "'"),
+            'category': category.replace("''", "'")
+        })
+    return rows
+
+
+def load_db_corpus():
+    from db import get_db
+    result = get_db().table('seminar_qa').select('seminar_name, question, answer, category').execute()
+    return result.data or []
+
+
+def evaluate(name, search, queries, k, repeat):
+    """Return recall@1, recall@k, MRR and mean latency for one retriever"""
+    hits_1 = hits_k = 0
+    reciprocal = 0.0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query, expected in queries:
+            results = search(query)
+            ids = [p['entry_id'] for _, p in results]
+            if ids[:1] == [expected]:
+                hits_1 += 1
+            if expected in ids:
+                hits_k += 1
+                reciprocal += 1.0 / (ids.index(expected) + 1)
+    elapsed = time.perf_counter() - start
+    total = len(queries) * repeat
+    print(f"{name:<8} recall@1={hits_1 / total:.3f}  recall@{k}={hits_k / total:.3f}  "
+          f"MRR={reciprocal / total:.3f}  {elapsed / total * 1000:.3f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', action='store_true', help='Read seminar_qa from Supabase instead of the seed SQL')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=10, help='Passes over the query set for timing')
+    args = parser.parse_args()
+
+    rows = load_db_corpus() if args.db else load_seed_corpus()
+    if not rows:
+        print("No seminars found")
+        return
+
+    entries = [{
+        'id': str(i),
+        'company_id': 'benchmark',
+        'title': row['seminar_name'],
+        'content': row['answer'],
+        'category': row.get('category'),
+        'is_active': True
+    } for i, row in enumerate(rows)]
+    queries = [(row['question'], str(i)) for i, row in enumerate(rows)]
+
+    print(f"Corpus: {len(entries)} seminars, {len(queries)} queries, k={args.k}")
+
+    start = time.perf_counter()
+    bm25_index = retrieval.BM25Index()
+    for entry in entries:
+        bm25_index.add_entry(entry)
+    print(f"Build    bm25 {(time.perf_counter() - start) * 1000:.1f} ms", end='')
+    start = time.perf_counter()
+    dense_index = vectors.build_index(entries)
+    print(f", dense {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    evaluate('bm25', lambda q: bm25_index.search(q, args.k), queries, args.k, args.repeat)
+    evaluate('dense', lambda q: dense_index.search(q, args.k), queries, args.k, args.repeat)
+    evaluate('hybrid', lambda q: retrieval.fuse_rrf(
+        [bm25_index.search(q, args.k * 3), dense_index.search(q, args.k * 3)], args.k
+    ), queries, args.k, args.repeat)
+
+    # Batched dense scoring: one matrix product for the whole query set
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        dense_index.search_batch([q for q, _ in queries], args.k)
+    elapsed = time.perf_counter() - start
+    print(f"dense batched {elapsed / (len(queries) * args.repeat) * 1000:.3f} ms/query")
+
+    # Warm-worker path: persisted vectors are memory-mapped instead of re-embedded
+    fp = vectors.fingerprint(entries)
+    vectors.save_index('benchmark', dense_index, fp)
+    start = time.perf_counter()
+    loaded = vectors.load_index('benchmark', fp)
+    print(f"mmap load {(time.perf_counter() - start) * 1000:.2f} ms ({len(loaded)} passages)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Benchmark seminar context scoring: nested substring loops vs the compiled matcher.
+
+Builds catalogs of 10 and 1,000 seminars (the seed rows from migrations/,
+padded with synthetic variants), then times scoring a set of chat messages
+with the previous get_seminar_context loops and with bot/seminar_matcher,
+and checks that both produce the same context (spelling correction off).
+
+The typo section misspells every title in scripts/sanitize_db.py's
+VALID_SEMINARS (the catalog seminar_qa is sanitized to) and reports how
+often the intended seminar ranks first, plus the spelling lookup latency.
+
+The database fetch the old path also did per message is not included, so
+the numbers are pure scoring cost.
+
+Usage:
+    python scripts/benchmark_seminar_matcher.py
+    python scripts/benchmark_seminar_matcher.py --sizes 10 100 1000 5000 --repeat 5
+    python scripts/benchmark_seminar_matcher.py --typos 5
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Add parent directory to path to import bot
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.seminar_matcher import CATEGORY_MAP, SeminarCatalog
+from bot.spelling import words
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'migrations', 'database_migration_seminar_qa.sql')
+
+# ('name', 'question', 'answer', ARRAY['kw', ...], 'category')
+_ROW_RE = re.compile(r"\(\s*'((?:[^']|'')*)'\s*,\s*'((?:[^']|'')*)'\s*,\s*'((?:[^']|'')*)'\s*,"
+                     r"\s*ARRAY\[([^\]]*)\]\s*,\s*'((?:[^']|'')*)'\s*\)")
+_KEYWORD_RE = re.compile(r"'((?:[^']|'')*)'")
+
+SUFFIXES = ['Kompakt', 'Intensiv', 'für Einsteiger', 'für Fortgeschrittene', 'Praxis', 'Online', 'Workshop']
+
+MESSAGES = [
+    "Hallo, welche Seminare habt ihr?",
+    "Ich suche ein Seminar zum Thema Führung für neue Teamleiter",
+    "Gibt es etwas gegen Stress und für mehr Resilienz im Alltag?",
+    "Wie kann ich Konflikte im Team besser lösen und Gespräche führen?",
+    "Was kostet das Seminar Kreativitätstechniken und wann findet es statt?",
+    "Wir stecken mitten in einer Transformation, habt ihr etwas zu Change Management?",
+    "Zeitmanagement und Projektplanung für Assistenzen",
+    "Ich bin über 50 und möchte mich beruflich weiterentwickeln",
+]
+
+
+def load_seed_rows():
+    with open(SEED_FILE, encoding='utf-8') as f:
+        sql = f.read()
+    rows = []
+    for name, question, answer, keywords, category in _ROW_RE.findall(sql):
+        rows.append({
+            'seminar_name': name.replace("''", "'"),
+            'question': question.replace("''", "'"),
+            'answer': answer.replace("''", "'"),
+            'keywords': [k.replace("''", "'") for k in _KEYWORD_RE.findall(keywords)],
+            'category': category.replace("''", "'")
+        })
+    return rows
+
+
+def synthetic_catalog(seed_rows, size, seed=7):
+    rng = random.Random(seed)
+    rows = list(seed_rows[:size])
+    while len(rows) < size:
+        base = rng.choice(seed_rows)
+        rows.append({**base, 'seminar_name': f"{base['seminar_name']} {rng.choice(SUFFIXES)} {len(rows)}"})
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Previous implementation (minus the per-message database fetch)
+# ---------------------------------------------------------------------------
+
+def legacy_context(rows, query_text):
+    clean_query = query_text.lower()
+    category_intent = None
+    for cat, keywords in CATEGORY_MAP.items():
+        if any(k in clean_query for k in keywords):
+            category_intent = cat
+            break
+
+    matched_items = []
+    for item in rows:
+        score = 0
+        item_cat = (item.get('category') or '').lower()
+        if category_intent and category_intent in item_cat:
+            score += 20
+        sem_name = (item.get('seminar_name') or '').lower()
+        if sem_name in clean_query:
+            score += 50
+        name_parts = sem_name.split()
+        matches = sum(1 for p in name_parts if len(p) > 3 and p in clean_query)
+        if matches > 0:
+            score += 10 * matches
+        for kw in item.get('keywords', []) or []:
+            if kw.lower() in clean_query:
+                score += 5
+        if score > 0:
+            matched_items.append((score, item))
+    matched_items.sort(key=lambda x: x[0], reverse=True)
+    if not matched_items:
+        return ""
+
+    top_matches = matched_items if category_intent else matched_items[:8]
+    context_str = "### STRICT SEMINAR SOURCE (ONLY use these entries, DO NOT invent others):\n\n"
+    for _, item in top_matches:
+        context_str += f"Title: {item.get('seminar_name')}\n"
+        context_str += f"Category: {item.get('category')}\n"
+        context_str += f"Info: {item.get('answer')[:300]}...\n"
+        context_str += "---\n"
+    return context_str
+
+
+def misspell(title, rng):
+    """Title with one or two typos (drop, double, swap or replace a letter) in its longer words"""
+    out = title
+    for _, _, word in words(title):
+        if len(word) < 6:
+            continue
+        i = rng.randrange(1, len(word) - 2)
+        kind = rng.choice(['drop', 'double', 'swap', 'replace'])
+        if kind == 'drop':
+            typo = word[:i] + word[i + 1:]
+        elif kind == 'double':
+            typo = word[:i] + word[i] + word[i:]
+        elif kind == 'swap':
+            typo = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        else:
+            typo = word[:i] + rng.choice('aeilnrstz') + word[i + 1:]
+        out = out.lower().replace(word, typo, 1)
+    return out
+
+
+def typo_benchmark(per_title, seed=7):
+    # scripts/ is on sys.path when this file is run directly
+    from sanitize_db import VALID_SEMINARS
+    rng = random.Random(seed)
+    rows = [{'seminar_name': info['title'], 'category': info['category'], 'answer': '', 'keywords': []}
+            for info in VALID_SEMINARS.values()]
+    exact = SeminarCatalog(rows, fuzzy=False)
+    fuzzy = SeminarCatalog(rows, fuzzy=True)
+
+    queries = [(misspell(row['seminar_name'], rng), row['seminar_name'])
+               for row in rows for _ in range(per_title)]
+    queries = [(q, title) for q, title in queries if q != title.lower()]
+
+    def top1(catalog, query):
+        ranked = catalog.score(f"Was kostet {query}?")[1]
+        return ranked[0][1]['seminar_name'] if ranked else None
+
+    exact_hits = sum(top1(exact, q) == title for q, title in queries)
+    fuzzy_hits = sum(top1(fuzzy, q) == title for q, title in queries)
+    lookup_us = per_call_us(fuzzy.spelling.correct, [q for q, _ in queries], 5)
+
+    print(f"\n{len(queries)} misspelled titles from VALID_SEMINARS ({len(rows)} seminars)")
+    print(f"top-1 without correction: {exact_hits / len(queries):.1%}")
+    print(f"top-1 with correction:    {fuzzy_hits / len(queries):.1%}")
+    print(f"spelling correction: {lookup_us:.1f} us/message ({len(fuzzy.spelling)} terms)")
+    for query, title in queries[:3]:
+        print(f"  {query!r} -> {fuzzy.spelling.correct(query)!r}")
+
+
+def per_call_us(fn, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            fn(message)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--typos', type=int, default=3, help='misspellings per VALID_SEMINARS title')
+    args = parser.parse_args()
+
+    seed_rows = load_seed_rows()
+    if not seed_rows:
+        print(f"No seed rows found in {SEED_FILE}")
+        sys.exit(1)
+    messages = MESSAGES + [row['question'] for row in seed_rows]
+
+    print(f"{len(messages)} messages, best of {args.repeat}\n")
+    print(f"{'seminars':>8} {'loops (us/msg)':>15} {'matcher (us/msg)':>17} {'speedup':>8} {'compile (ms)':>13}")
+    matches = True
+    for size in args.sizes:
+        rows = synthetic_catalog(seed_rows, size)
+        started = time.perf_counter()
+        catalog = SeminarCatalog(rows, fuzzy=False)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        matches = matches and all(legacy_context(rows, m) == catalog.context(m) for m in messages)
+        legacy_us = per_call_us(lambda m: legacy_context(rows, m), messages, args.repeat)
+        matcher_us = per_call_us(catalog.context, messages, args.repeat)
+        print(f"{size:>8} {legacy_us:>15.1f} {matcher_us:>17.1f} {legacy_us / matcher_us:>7.1f}x {compile_ms:>13.1f}")
+
+    print("\nresults match" if matches else "\nRESULTS DIFFER")
+    if args.typos:
+        typo_benchmark(args.typos)
+    if not matches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
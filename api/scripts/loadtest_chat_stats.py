@@ -0,0 +1,107 @@
+"""
+Load-test chat_statistics counters with concurrent writers.
+
+Runs the atomic upsert-increment (chat_stats_store) and, for comparison, the
+old select-then-update pattern against a local SQLite file, then checks the
+final totals against the number of events sent.
+
+Usage:
+    python scripts/loadtest_chat_stats.py
+    python scripts/loadtest_chat_stats.py --threads 32 --events 500 --companies 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+# Add parent directory to path to import chat_stats_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_stats_store import SQLiteStatsStore
+
+
+def legacy_increment(store: SQLiteStatsStore, company_id: str, day: str, tokens: int) -> None:
+    """Old chat_analytics behaviour: read the row, add in Python, write it back"""
+    conn = store._connect()
+    row = store.get(company_id, day)
+    if row:
+        conn.execute(
+            'UPDATE chat_statistics SET total_messages = ?, total_tokens = ? WHERE company_id = ? AND date = ?',
+            (row['total_messages'] + 1, row['total_tokens'] + tokens, company_id, day)
+        )
+    else:
+        try:
+            conn.execute(
+                'INSERT INTO chat_statistics (company_id, date, total_messages, total_tokens) VALUES (?, ?, 1, ?)',
+                (company_id, day, tokens)
+            )
+        except Exception:
+            pass  # another writer created the row first - the event is lost
+
+
+def run(mode: str, threads: int, events: int, companies: int, tokens: int):
+    path = os.path.join(tempfile.mkdtemp(prefix='chat_stats_'), f'{mode}.sqlite3')
+    store = SQLiteStatsStore(path)
+    day = str(date.today())
+    company_ids = [f'company-{i}' for i in range(companies)]
+    barrier = threading.Barrier(threads)
+
+    def writer(n):
+        barrier.wait()
+        for i in range(events):
+            company_id = company_ids[(n + i) % companies]
+            if mode == 'atomic':
+                store.increment(company_id, day, messages=1, tokens=tokens,
+                                response_time_sum_ms=100, response_time_count=1)
+            else:
+                legacy_increment(store, company_id, day, tokens)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+
+    rows = [store.get(c, day) or {} for c in company_ids]
+    messages = sum(r.get('total_messages', 0) for r in rows)
+    token_total = sum(r.get('total_tokens', 0) for r in rows)
+    return {
+        'expected': threads * events,
+        'messages': messages,
+        'tokens_ok': token_total == messages * tokens,
+        'elapsed': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--events', type=int, default=200, help='events per thread')
+    parser.add_argument('--companies', type=int, default=1)
+    parser.add_argument('--tokens', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.events} events over {args.companies} company row(s)\n")
+    print(f"{'mode':<8} {'expected':>9} {'counted':>9} {'lost':>7} {'events/s':>10}")
+    failed = False
+    for mode in ('legacy', 'atomic'):
+        result = run(mode, args.threads, args.events, args.companies, args.tokens)
+        lost = result['expected'] - result['messages']
+        rate = result['expected'] / result['elapsed'] if result['elapsed'] else 0
+        print(f"{mode:<8} {result['expected']:>9} {result['messages']:>9} {lost:>7} {rate:>10.0f}")
+        if mode == 'atomic' and (lost or not result['tokens_ok']):
+            failed = True
+
+    if failed:
+        print("\nFAIL: atomic increments lost updates")
+        sys.exit(1)
+    print("\nOK: atomic increments counted every event")
+
+
+if __name__ == '__main__':
+    main()
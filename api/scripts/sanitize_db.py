@@ -7,6 +7,8 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db import get_db
+# Shared with the seminar spelling index, so titles fold the same way in both
+from bot.spelling import normalize_string
 
 # 1. Define Strict Seminar List & Categories
 # Mapping: Filename (slug) -> {title, category}
@@ -60,9 +62,6 @@ VALID_SEMINARS = {
     "lebensphasen": {"title": "Lebensphasen", "category": "Change"}, # Assumed
 }
 
-def normalize_string(s):
-    return s.lower().strip().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss").replace("-", " ")
-
 def sanitize():
     print(f"Starting sanitization...")
     db = get_db()
@@ -0,0 +1,149 @@
+"""In-process caches - per-tenant configuration and generic TTL/LRU storage"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Every TTLCache registers itself here so runtime stats can list them
+_registry: List['TTLCache'] = []
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and a bounded size.
+
+    Values are deep-copied on the way in and out so callers can mutate what
+    they get back without corrupting the cached copy. None is never cached.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float = 60, max_size: int = 512):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._data: 'OrderedDict[Any, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _registry.append(self)
+
+    def get(self, key, default=None):
+        """Return a copy of the cached value or default when missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value) -> None:
+        if value is None:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader: Callable[[], Any]):
+        """Return the cached value, calling loader() and caching its result on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        value = loader()
+        self.set(key, value)
+        return copy.deepcopy(value)
+
+    def invalidate(self, key) -> bool:
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+            if removed:
+                self.invalidations += 1
+            return removed
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose key matches predicate. Returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every cache created in this process"""
+    return {cache.name: cache.stats() for cache in _registry}
+
+
+# =========================================================================
+# Tenant configuration cache
+# =========================================================================
+# Keys are tuples whose second element is the company id, e.g.
+#   ('company', company_id)                  - raw companies row
+#   ('company_context', company_id)          - ChatService.get_company_context
+#   ('widget_config', company_id, widget_id) - ChatService.get_widget_config
+#   ('bot_config', company_id)               - CompanyBot._load_config
+# Each serverless instance has its own copy; the TTL bounds how long an
+# instance that did not see the write can serve stale settings.
+
+tenant_cache = TTLCache(
+    'tenant',
+    ttl_seconds=float(os.getenv('TENANT_CACHE_TTL', '60')),
+    max_size=int(os.getenv('TENANT_CACHE_MAX_SIZE', '512'))
+)
+
+_invalidation_listeners: List[Callable[[str], None]] = []
+
+
+def on_invalidate(listener: Callable[[str], None]) -> None:
+    """Register a callback run with the company id whenever a tenant is invalidated"""
+    _invalidation_listeners.append(listener)
+
+
+def invalidate_company(company_id: Optional[str]) -> int:
+    """Drop every cached entry for a company (call after writing its settings)"""
+    if not company_id:
+        return 0
+    company_id = str(company_id)
+    removed = tenant_cache.invalidate_where(
+        lambda key: isinstance(key, tuple) and len(key) > 1 and key[1] == company_id
+    )
+    for listener in list(_invalidation_listeners):
+        try:
+            listener(company_id)
+        except Exception as e:
+            print(f"Tenant cache listener error: {e}")
+    return removed
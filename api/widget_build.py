@@ -0,0 +1,333 @@
+"""
+Widget Build - minified, fingerprinted, precompressed widget assets
+
+The widget sources (widget_source.WIDGET_JS, static/css/chat-widget.css)
+are built once per process into immutable assets:
+
+- minified (comments and indentation removed - semantics-preserving only)
+- content hash (sha256 prefix) used as ETag and in the fingerprinted URL
+- identity, gzip and (when the brotli package is installed) br bodies
+
+URLs:
+    /widget/embed.js              loader stub (launcher button only), short cache + ETag;
+                                  loads the current bundle + CSS on interaction or when idle
+    /widget/embed.<hash>.js       full widget, cached for a year (immutable)
+    /widget/styles.<hash>.css     widget CSS, cached for a year (immutable)
+    /widget/styles.css            widget CSS, short cache + ETag (legacy URL)
+
+Run `python widget_build.py` to print asset sizes, or
+`python widget_build.py --out dist/widget` to write the files for a CDN.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # br variants are skipped, gzip still served
+    brotli = None
+
+HASH_LENGTH = 12
+
+# embed.js runs on every page of every customer site - keep it small
+LOADER_BUDGET_BYTES = 3 * 1024
+
+# Cache lifetimes (seconds) for the unversioned URLs
+WIDGET_LOADER_MAX_AGE = int(os.getenv('WIDGET_LOADER_MAX_AGE', '300'))
+WIDGET_LOADER_STALE = int(os.getenv('WIDGET_LOADER_STALE', '86400'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+LOADER_CACHE_CONTROL = f'public, max-age={WIDGET_LOADER_MAX_AGE}, stale-while-revalidate={WIDGET_LOADER_STALE}'
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'css', 'chat-widget.css')
+
+# Preference order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip', 'identity')
+
+
+# =========================================================================
+# Minification
+# =========================================================================
+
+_WS = ' \t\r\n\f\v\u00a0\ufeff'
+
+# A newline may be dropped after / before these without triggering or losing ASI
+_JOIN_AFTER = set('{([,;:=&|?!*%<>~^')
+_JOIN_BEFORE = set(')]},;.:?')
+
+# After these keywords a '/' starts a regular expression, not a division
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof', 'new',
+                   'void', 'delete', 'throw', 'yield', 'await'}
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch in '_$\\' or ord(ch) > 127
+
+
+def _needs_space(prev: str, nxt: str) -> bool:
+    return ((_is_word(prev) and _is_word(nxt))
+            or (prev == nxt and prev in '+-')
+            or (prev == '/' and nxt in '/*')
+            or (prev == '<' and nxt == '!')
+            or (prev.isdigit() and nxt == '.'))
+
+
+def _scan_template(source: str, i: int) -> int:
+    """End of a template chunk starting at i: just past the closing '`' or the next '${'"""
+    n = len(source)
+    while i < n:
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+        elif ch == '`':
+            return i + 1
+        elif ch == '$' and source.startswith('{', i + 1):
+            return i + 2
+        else:
+            i += 1
+    raise ValueError('unterminated template literal')
+
+
+def minify_js(source: str) -> str:
+    """
+    Strip comments and insignificant whitespace from JavaScript.
+
+    Strings, template literals (including ${...} nesting) and regular
+    expressions are copied verbatim. Newlines are kept wherever dropping
+    them could change automatic semicolon insertion.
+    """
+    out: List[str] = []
+    templates: List[int] = []  # open '{' count inside each active ${...}
+    gap = ''   # whitespace since the last token: '', ' ' or '\n'
+    last = ''  # last character emitted
+    word = ''  # last identifier emitted (regex detection)
+    i, n = 0, len(source)
+
+    def emit(token: str, is_word: bool = False):
+        nonlocal gap, last, word
+        if gap and out:
+            if gap == '\n' and not (last in _JOIN_AFTER or token[0] in _JOIN_BEFORE):
+                out.append('\n')
+            elif _needs_space(last, token[0]):
+                out.append(' ')
+        out.append(token)
+        gap = ''
+        last = token[-1]
+        word = token if is_word else ''
+
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+
+        if ch in _WS:
+            j = i
+            while j < n and source[j] in _WS:
+                j += 1
+            gap = '\n' if gap == '\n' or '\n' in source[i:j] else ' '
+            i = j
+        elif ch == '/' and nxt == '/':
+            j = source.find('\n', i)
+            i = n if j < 0 else j
+            gap = gap or ' '
+        elif ch == '/' and nxt == '*':
+            j = source.find('*/', i + 2)
+            if j < 0:
+                raise ValueError('unterminated comment')
+            gap = '\n' if gap == '\n' or '\n' in source[i:j] else (gap or ' ')
+            i = j + 2
+        elif ch in '\'"':
+            j = i + 1
+            while j < n and source[j] != ch:
+                if source[j] == '\n':
+                    raise ValueError('unterminated string literal')
+                j += 2 if source[j] == '\\' else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif ch == '`':
+            j = _scan_template(source, i + 1)
+            emit(source[i:j])
+            if source[j - 1] == '{':
+                templates.append(0)
+            i = j
+        elif ch == '}' and templates and templates[-1] == 0:
+            templates.pop()
+            j = _scan_template(source, i + 1)
+            emit(source[i:j])
+            if source[j - 1] == '{':
+                templates.append(0)
+            i = j
+        elif ch == '/' and (not last or last in '(,=:[!&|?{};+-*%<>~^' or word in _REGEX_KEYWORDS):
+            j, in_class = i + 1, False
+            while j < n:
+                c = source[j]
+                if c == '\\':
+                    j += 2
+                    continue
+                if c == '\n':
+                    raise ValueError('unterminated regular expression')
+                if c == '[':
+                    in_class = True
+                elif c == ']':
+                    in_class = False
+                elif c == '/' and not in_class:
+                    break
+                j += 1
+            j += 1
+            while j < n and _is_word(source[j]):
+                j += 1  # flags
+            emit(source[i:j])
+            i = j
+        elif _is_word(ch):
+            j = i + 1
+            while j < n and _is_word(source[j]):
+                j += 1
+            emit(source[i:j], is_word=True)
+            i = j
+        else:
+            if templates and ch == '{':
+                templates[-1] += 1
+            elif templates and ch == '}':
+                templates[-1] -= 1
+            emit(ch)
+            i += 1
+
+    return ''.join(out) + '\n'
+
+
+def minify_css(source: str) -> str:
+    """Strip comments and whitespace around CSS punctuation"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+# =========================================================================
+# Assets
+# =========================================================================
+
+class WidgetAsset:
+    """One built file: content hash plus every encoded body"""
+
+    def __init__(self, name: str, extension: str, content_type: str, body: bytes):
+        self.name = name
+        self.extension = extension
+        self.content_type = content_type
+        self.hash = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        self.bodies: Dict[str, bytes] = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=11)
+
+    @property
+    def filename(self) -> str:
+        return f'{self.name}.{self.hash}.{self.extension}'
+
+    def etag(self, encoding: str) -> str:
+        # Strong validators must differ per representation
+        return self.hash if encoding == 'identity' else f'{self.hash}-{encoding}'
+
+    @property
+    def etags(self) -> List[str]:
+        return [self.etag(encoding) for encoding in self.bodies]
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[str, bytes]:
+        """(encoding, body) for an Accept-Encoding header"""
+        encoding = negotiate(accept_encoding, self.bodies)
+        return encoding, self.bodies[encoding]
+
+    def sizes(self) -> Dict[str, int]:
+        return {encoding: len(body) for encoding, body in self.bodies.items()}
+
+
+def negotiate(accept_encoding: Optional[str], available) -> str:
+    """Best available content-coding for an Accept-Encoding header (q-values honoured)"""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+
+    wildcard = accepted.get('*')
+    best, best_q = 'identity', 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available or encoding == 'identity':
+            continue
+        q = accepted.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def build() -> Dict[str, WidgetAsset]:
+    """Build styles, the full widget bundle and the loader that points at it"""
+    from widget_source import LOADER_JS, WIDGET_JS
+
+    with open(CSS_PATH, encoding='utf-8') as f:
+        styles = WidgetAsset('styles', 'css', 'text/css', minify_css(f.read()).encode('utf-8'))
+
+    bundle_js = WIDGET_JS.replace('/widget/styles.css', f'/widget/{styles.filename}')
+    bundle = WidgetAsset('embed', 'js', 'application/javascript', minify_js(bundle_js).encode('utf-8'))
+
+    loader_js = LOADER_JS.replace('__WIDGET_BUNDLE__', bundle.filename).replace('__WIDGET_STYLES__', styles.filename)
+    loader = WidgetAsset('loader', 'js', 'application/javascript', minify_js(loader_js).encode('utf-8'))
+
+    return {'styles': styles, 'bundle': bundle, 'loader': loader}
+
+
+_assets: Optional[Dict[str, WidgetAsset]] = None
+_lock = threading.Lock()
+
+
+def get_assets() -> Dict[str, WidgetAsset]:
+    """Built assets for this process (built on first use)"""
+    global _assets
+    if _assets is None:
+        with _lock:
+            if _assets is None:
+                _assets = build()
+    return _assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the widget assets')
+    parser.add_argument('--out', help='write the fingerprinted files (and .gz/.br) to this directory')
+    args = parser.parse_args()
+
+    from widget_source import WIDGET_JS
+    assets = get_assets()
+    print(f"source widget: {len(WIDGET_JS.encode('utf-8'))} bytes")
+    for key, asset in assets.items():
+        sizes = ', '.join(f'{encoding} {size}' for encoding, size in asset.sizes().items())
+        print(f"{key:<7} {asset.filename:<28} {sizes}")
+    if brotli is None:
+        print("brotli not installed - br variants skipped")
+    loader_size = assets['loader'].sizes()['identity']
+    if loader_size > LOADER_BUDGET_BYTES:
+        print(f"WARNING: loader is {loader_size} bytes, budget is {LOADER_BUDGET_BYTES}")
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        suffixes = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+        for asset in assets.values():
+            for encoding, body in asset.bodies.items():
+                with open(os.path.join(args.out, asset.filename + suffixes[encoding]), 'wb') as f:
+                    f.write(body)
+        print(f"written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,9 @@ WIDGET_JS = r"""/**
 
     const WIDGET_VERSION = '1.0.0';
 
+    // Older messages are fetched in pages of this size when scrolling up
+    const HISTORY_PAGE_SIZE = 20;
+
     // Smart default: use the origin of this script (embed.js), not the host page
     // This ensures the widget connects to the Vallit backend even when embedded on other domains
     const getScriptOrigin = () => {
@@ -62,13 +65,24 @@ WIDGET_JS = r"""/**
         primaryColor: '#3D7A77',
         headerTitle: 'Kian',
         showBranding: true,
-        privacyPolicyUrl: 'https://vallit.net/datenschutz'  // Privacy policy link
+        privacyPolicyUrl: 'https://vallit.net/datenschutz',  // Privacy policy link
+        streaming: true,  // Stream replies token-by-token (falls back to /api/chat/message)
+        virtualize: true  // Mount only the messages near the viewport
     };
 
     // =========================================================================
     // Utilities
     // =========================================================================
 
+    // Idempotency key of a sent message: the server stores it once however often it is posted
+    function generateMessageId() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
     function generateSessionId() {
         return 'vallit_' + Date.now().toString(36) + Math.random().toString(36).substr(2, 9);
     }
@@ -89,6 +103,25 @@ WIDGET_JS = r"""/**
         }
     }
 
+    // Server config is cached per company/widget together with its version, so
+    // repeat visits render with it immediately and bootstrap only revalidates
+    function getCachedConfig(key) {
+        try {
+            const stored = JSON.parse(localStorage.getItem(key) || 'null');
+            return stored && stored.version && stored.config ? stored : null;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    function storeCachedConfig(key, version, config) {
+        try {
+            localStorage.setItem(key, JSON.stringify({ version: version, config: config }));
+        } catch (e) {
+            // Storage not available
+        }
+    }
+
     function escapeHtml(text) {
         const div = document.createElement('div');
         div.textContent = text;
@@ -111,6 +144,248 @@ WIDGET_JS = r"""/**
             .replace(/\n/g, '<br>');
     }
 
+    // =========================================================================
+    // Message List
+    // =========================================================================
+
+    // Only the bubbles in and around the viewport are mounted; the rest are
+    // replaced by two spacers sized from measured (or estimated) row heights.
+    // All DOM writes are batched into one animation frame, and unmounted
+    // bubble nodes are recycled for the next rows that scroll into view.
+    const ROW_ESTIMATE = 80;    // px assumed for a row that has not been measured yet
+    const OVERSCAN_PX = 600;    // px of rows kept mounted above and below the viewport
+    const NODE_POOL_SIZE = 40;
+
+    class MessageList {
+        constructor(container, options) {
+            this.container = container;
+            this.render = options.render;  // (message, recycledEl|null, animate) -> element
+            this.update = options.update;  // (message, element) - refresh changed content
+            this.keep = options.keep;      // message -> true if its node holds state (never recycled)
+            this.virtualize = options.virtualize !== false;
+
+            this.items = [];
+            this.heights = new WeakMap();  // message -> measured px
+            this.mounted = new Map();      // message -> element in the DOM
+            this.owners = new WeakMap();   // element -> message
+            this.kept = new WeakMap();     // message -> element that is never recycled
+            this.fresh = new WeakSet();    // messages that animate when first shown
+            this.dirty = new Set();        // messages whose content changed
+            this.pool = [];
+            this.frame = null;
+            this.stick = false;
+
+            this.top = this.createSpacer();
+            this.bottom = this.createSpacer();
+            container.appendChild(this.top);
+            container.appendChild(this.bottom);
+
+            container.addEventListener('scroll', () => this.schedule(), { passive: true });
+            if (window.ResizeObserver) {
+                new ResizeObserver(() => this.schedule()).observe(container);
+            }
+        }
+
+        createSpacer() {
+            const spacer = document.createElement('div');
+            spacer.className = 'syntra-message-spacer';
+            spacer.setAttribute('aria-hidden', 'true');
+            spacer.style.flexShrink = '0';
+            spacer.style.display = 'none';
+            return spacer;
+        }
+
+        append(message, animate = false) {
+            this.items.push(message);
+            if (animate) this.fresh.add(message);
+            this.schedule();
+        }
+
+        prepend(messages) {
+            // The visible rows stay where they are (see flush)
+            this.items = messages.concat(this.items);
+            this.schedule();
+        }
+
+        truncate(from) {
+            const removed = this.items.splice(from);
+            this.schedule();
+            return removed;
+        }
+
+        reset() {
+            this.mounted.forEach((el, message) => this.release(message, el));
+            this.mounted.clear();
+            this.dirty.clear();
+            this.items = [];
+            this.container.innerHTML = '';
+            this.container.appendChild(this.top);
+            this.container.appendChild(this.bottom);
+            this.schedule();
+        }
+
+        refresh(message) {
+            this.dirty.add(message);
+            this.schedule();
+        }
+
+        // Build the message's node from scratch (e.g. an action arrived after it was rendered)
+        rebuild(message) {
+            const el = this.mounted.get(message);
+            if (el) {
+                this.mounted.delete(message);
+                this.release(message, el);
+            }
+            this.kept.delete(message);
+            this.dirty.delete(message);
+            this.schedule();
+        }
+
+        scrollToBottom() {
+            this.stick = true;
+            this.schedule();
+        }
+
+        schedule() {
+            if (this.frame === null) {
+                this.frame = requestAnimationFrame(() => this.flush());
+            }
+        }
+
+        acquire(message) {
+            let el = this.kept.get(message);
+            if (el) {
+                this.update(message, el);
+            } else {
+                const animate = this.fresh.has(message);
+                this.fresh.delete(message);
+                el = this.render(message, this.pool.pop() || null, animate);
+                if (this.keep(message)) this.kept.set(message, el);
+            }
+            this.owners.set(el, message);
+            return el;
+        }
+
+        release(message, el) {
+            if (el.parentNode) el.parentNode.removeChild(el);
+            if (this.kept.get(message) !== el && this.pool.length < NODE_POOL_SIZE) {
+                this.pool.push(el);
+            }
+        }
+
+        setSpacer(spacer, rows, height) {
+            const display = rows ? '' : 'none';
+            const px = `${Math.max(0, Math.round(height))}px`;
+            if (spacer.style.display !== display) spacer.style.display = display;
+            if (spacer.style.height !== px) spacer.style.height = px;
+        }
+
+        flush() {
+            this.frame = null;
+            const container = this.container;
+            const visible = container.clientHeight > 0;
+
+            // Read: everything is measured before anything is written
+            let gap = 0;
+            let containerTop = 0;
+            let anchor = null;
+            let anchorTop = 0;
+            if (visible) {
+                gap = parseFloat(getComputedStyle(container).rowGap) || 0;
+                containerTop = container.getBoundingClientRect().top;
+                this.mounted.forEach((el, message) => {
+                    const height = el.offsetHeight;
+                    if (height) this.heights.set(message, height);
+                });
+                // First row at least partly in view - it must not move
+                for (let el = this.top.nextSibling; el && el !== this.bottom; el = el.nextSibling) {
+                    const rect = el.getBoundingClientRect();
+                    if (rect.bottom > containerTop) {
+                        if (rect.top < containerTop + container.clientHeight) {
+                            anchor = el;
+                            anchorTop = rect.top - containerTop;
+                        }
+                        break;
+                    }
+                }
+            }
+            const scrollTop = container.scrollTop;
+            const viewHeight = container.clientHeight;
+
+            const sizes = this.items.map(m => (this.heights.get(m) || ROW_ESTIMATE) + gap);
+            const total = sizes.reduce((sum, size) => sum + size, 0);
+            let viewTop = scrollTop;
+            if (this.stick) {
+                viewTop = Math.max(0, total - viewHeight);
+            } else if (anchor) {
+                const index = this.items.indexOf(this.owners.get(anchor));
+                if (index >= 0) {
+                    viewTop = sizes.slice(0, index).reduce((sum, size) => sum + size, 0) - anchorTop;
+                } else {
+                    anchor = null;
+                }
+            }
+
+            let start = 0;
+            let end = sizes.length;
+            let before = 0;
+            let after = 0;
+            if (this.virtualize) {
+                const from = viewTop - OVERSCAN_PX;
+                const to = viewTop + viewHeight + OVERSCAN_PX;
+                while (start < sizes.length - 1 && before + sizes[start] < from) before += sizes[start++];
+                let offset = before;
+                end = start;
+                while (end < sizes.length && offset < to) offset += sizes[end++];
+                after = total - offset;
+            }
+
+            // Write: unmount rows that left the window, mount the ones that entered
+            const wanted = new Set(this.items.slice(start, end));
+            this.mounted.forEach((el, message) => {
+                if (!wanted.has(message)) {
+                    this.mounted.delete(message);
+                    this.release(message, el);
+                }
+            });
+
+            let unmeasured = false;
+            let cursor = this.top.nextSibling;
+            for (let i = start; i < end; i++) {
+                const message = this.items[i];
+                let el = this.mounted.get(message);
+                if (!el) {
+                    el = this.acquire(message);
+                    this.mounted.set(message, el);
+                    unmeasured = true;
+                } else if (this.dirty.has(message)) {
+                    this.update(message, el);
+                }
+                if (el === cursor) {
+                    cursor = cursor.nextSibling;
+                } else {
+                    container.insertBefore(el, cursor);
+                }
+            }
+            this.dirty.clear();
+
+            // A spacer is a flex item too, so it brings one gap of its own
+            this.setSpacer(this.top, start, before - gap);
+            this.setSpacer(this.bottom, sizes.length - end, after - gap);
+
+            if (!visible) return;
+            if (this.stick) {
+                container.scrollTop = container.scrollHeight;
+                this.stick = false;
+            } else if (anchor && anchor.parentNode === container) {
+                const shift = anchor.getBoundingClientRect().top - containerTop - anchorTop;
+                if (Math.abs(shift) >= 1) container.scrollTop += shift;
+            }
+            // Rows mounted this frame are measured in the next one
+            if (unmeasured && this.virtualize) this.schedule();
+        }
+    }
+
     // =========================================================================
     // Widget Class
     // =========================================================================
@@ -124,10 +399,16 @@ WIDGET_JS = r"""/**
                 this.config.apiUrl = this.config.apiUrl.trim().replace(/\/+$/, '');
             }
 
+            this.configCacheKey = `vallit_widget_config:${this.config.companyId || ''}:${this.config.widgetId || 'default'}`;
+            const cachedConfig = getCachedConfig(this.configCacheKey);
+            this.configVersion = cachedConfig ? cachedConfig.version : null;
+            this.cachedRemoteConfig = cachedConfig ? cachedConfig.config : null;
+
             this.sessionId = getStoredSessionId() || generateSessionId();
             this.isOpen = false;
             this.isLoading = false;
             this.messages = [];
+            this.resetSyncState();
 
             storeSessionId(this.sessionId);
             this.init();
@@ -135,16 +416,65 @@ WIDGET_JS = r"""/**
 
         init() {
             try {
+                // Render with the last known server config right away
+                if (this.cachedRemoteConfig) this.applyRemoteConfig(this.cachedRemoteConfig);
                 this.injectStyles();
                 this.createWidget();
                 this.attachEventListeners();
-                this.loadHistory();
-                this.loadRemoteConfig(); // Fetch server-side settings
+                this.replaceLauncher();
+                this.bootstrap(); // Server-side settings + history in one request
             } catch (e) {
                 console.error('Vallit Widget Init Error:', e);
             }
         }
 
+        // embed.js draws a placeholder button until the bundle is loaded
+        replaceLauncher() {
+            const launcher = document.getElementById('vallit-widget-launcher');
+            if (!launcher) return;
+            launcher.parentNode.removeChild(launcher);
+            if (window.__vallitOpenOnLoad) {
+                window.__vallitOpenOnLoad = false;
+                this.open();
+            }
+        }
+
+        async bootstrap() {
+            // One round trip for config, session and recent messages;
+            // older servers without /api/chat/bootstrap get the two separate calls
+            try {
+                if (!this.config.apiUrl) return;
+
+                const params = new URLSearchParams({
+                    widget_id: this.config.widgetId || 'default',
+                    company_id: this.config.companyId || '',
+                    session_id: this.sessionId || '',
+                    config_version: this.configVersion || ''
+                });
+                const url = `${this.config.apiUrl}/api/chat/bootstrap?${params}`;
+                // embed.js may already have sent this exact request while the bundle loaded
+                const prefetched = window.__vallitBootstrap;
+                window.__vallitBootstrap = null;
+                const response = await (prefetched && prefetched.url === url ? prefetched.response : fetch(url));
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+                const data = await response.json();
+                if (data.session_id && data.session_id !== this.sessionId) {
+                    this.sessionId = data.session_id;
+                    storeSessionId(this.sessionId);
+                }
+                this.applyHistory(data.history, data.has_more);
+                // config is null when our cached version is still current
+                if (data.config) {
+                    this.applyRemoteConfig(data.config);
+                    this.rememberConfig(data.config_version, data.config);
+                }
+            } catch (e) {
+                this.loadHistory();
+                this.loadRemoteConfig();
+            }
+        }
+
         async loadRemoteConfig() {
             try {
                 // Only fetch if we have an API URL
@@ -154,7 +484,21 @@ WIDGET_JS = r"""/**
                 if (!response.ok) return;
 
                 const remoteConfig = await response.json();
+                this.applyRemoteConfig(remoteConfig);
+                if (remoteConfig && remoteConfig.version) this.rememberConfig(remoteConfig.version, remoteConfig);
+            } catch (e) {
+                console.warn('Failed to load remote config:', e);
+            }
+        }
+
+        rememberConfig(version, remoteConfig) {
+            if (!version) return;
+            this.configVersion = version;
+            storeCachedConfig(this.configCacheKey, version, remoteConfig);
+        }
 
+        applyRemoteConfig(remoteConfig) {
+            try {
                 if (!remoteConfig) return;
 
                 // Merge config, preferring remote for editable fields
@@ -175,14 +519,8 @@ WIDGET_JS = r"""/**
                                 this.messages[0].content = this.config.welcomeMessage;
 
                                 // Re-render DOM regardless of open state
-                                if (this.messagesContainer) {
-                                    this.messagesContainer.innerHTML = '';
-                                    this.renderMessage(this.messages[0], false);
-
-                                    // Resume rest of messages if any (unlikely here but safe)
-                                    for (let i = 1; i < this.messages.length; i++) {
-                                        this.renderMessage(this.messages[i], false);
-                                    }
+                                if (this.list) {
+                                    this.list.refresh(this.messages[0]);
                                 }
                             }
                         } catch (err) {
@@ -368,6 +706,12 @@ WIDGET_JS = r"""/**
             this.toggleBtn = this.container.querySelector('.syntra-toggle-btn');
             this.chatWindow = this.container.querySelector('.syntra-chat-window');
             this.messagesContainer = this.container.querySelector('.syntra-messages-container');
+            this.list = new MessageList(this.messagesContainer, {
+                virtualize: this.config.virtualize,
+                render: (message, el, animate) => this.createMessageElement(message, animate, el),
+                update: (message, el) => this.updateMessageElement(message, el),
+                keep: (message) => !!message.action  // date picker state lives in the node
+            });
             this.inputForm = this.container.querySelector('.syntra-input-form');
             this.inputField = this.container.querySelector('.syntra-input');
             this.sendBtn = this.container.querySelector('.syntra-send-btn');
@@ -480,6 +824,13 @@ WIDGET_JS = r"""/**
                     }
                 }
             });
+
+            // Lazy-load older messages when scrolled near the top
+            this.messagesContainer.addEventListener('scroll', () => {
+                if (this.messagesContainer.scrollTop < 80) {
+                    this.loadOlderMessages();
+                }
+            }, { passive: true });
         }
 
         autoResizeInput() {
@@ -537,6 +888,9 @@ WIDGET_JS = r"""/**
             // Show welcome message if no messages
             if (this.messages.length === 0 && this.config.welcomeMessage) {
                 this.addMessage('assistant', this.config.welcomeMessage, false);
+            } else {
+                // Pick up replies that arrived while the chat was closed
+                this.syncNewMessages();
             }
 
             // Focus input
@@ -563,7 +917,7 @@ WIDGET_JS = r"""/**
 
         async resetChat() {
             try {
-                this.messagesContainer.innerHTML = '';
+                this.list.reset();
                 this.messages = [];
                 // Add loading indicator? No, just clear.
 
@@ -580,8 +934,9 @@ WIDGET_JS = r"""/**
                 const data = await response.json();
 
                 // Clear current messages
-                this.messagesContainer.innerHTML = '';
+                this.list.reset();
                 this.messages = [];
+                this.resetSyncState();
 
                 if (data.status === 'success' && data.new_session_id) {
                     this.sessionId = data.new_session_id;
@@ -630,10 +985,28 @@ WIDGET_JS = r"""/**
                 this.inputField.style.height = 'auto';
             }
 
+            // Messages from here on have no seq until the next delta sync replaces them
+            if (this.unsyncedFrom === null) {
+                if (this.latestSeq === null && !this.messages.some(m => m.role === 'user')) {
+                    this.latestSeq = 0; // new conversation - sync from the start
+                }
+                this.unsyncedFrom = this.messages.length;
+            }
+
             // Add user message
             this.addMessage('user', displayText || message);
             this.isLoading = true;
             this.showTypingIndicator();
+            const messageId = generateMessageId();
+
+            if (this.config.streaming && window.ReadableStream && window.TextDecoder) {
+                try {
+                    if (await this.streamMessage(message, messageId)) return;
+                } catch (error) {
+                    // The stream request never got a response - fall back to the blocking endpoint
+                    console.warn('Streaming failed, falling back:', error);
+                }
+            }
 
             try {
                 const response = await fetch(`${this.config.apiUrl}/api/chat/message`, {
@@ -644,6 +1017,7 @@ WIDGET_JS = r"""/**
                         company_id: this.config.companyId,
                         session_id: this.sessionId,
                         message: message,
+                        client_message_id: messageId,
                         company_id: this.config.companyId
                     })
                 });
@@ -670,6 +1044,122 @@ WIDGET_JS = r"""/**
             }
         }
 
+        /**
+         * Send a message via the SSE endpoint and render bubbles as tokens arrive.
+         * Returns false when the stream request was rejected (and throws when it got
+         * no response) so the caller can fall back to /api/chat/message. Once the
+         * server accepted the stream it has saved the message, so failures after
+         * that point are reported in the chat instead of sending it again.
+         */
+        async streamMessage(message, messageId) {
+            const response = await fetch(`${this.config.apiUrl}/api/chat/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+                body: JSON.stringify({
+                    widget_id: this.config.widgetId,
+                    company_id: this.config.companyId,
+                    session_id: this.sessionId,
+                    message: message,
+                    client_message_id: messageId
+                })
+            });
+
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.ok || !response.body || !contentType.includes('text/event-stream')) {
+                return false;
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const bubbles = [];  // index -> { message, text }
+            let action = null;
+            let buffer = '';
+            let finished = false;
+
+            const startBubble = (index) => {
+                this.removeTypingIndicator();
+                const msg = {
+                    id: Date.now() + Math.random(),
+                    role: 'assistant',
+                    content: '',
+                    timestamp: new Date().toISOString(),
+                    action: null
+                };
+                this.messages.push(msg);
+                this.renderMessage(msg, true);
+                bubbles[index] = { message: msg, text: '' };
+                return bubbles[index];
+            };
+
+            const handleEvent = (event, data) => {
+                if (event === 'session' && data.session_id) {
+                    this.sessionId = data.session_id;
+                    storeSessionId(this.sessionId);
+                } else if (event === 'token') {
+                    const bubble = bubbles[data.bubble] || startBubble(data.bubble);
+                    bubble.text += data.text;
+                    // Tokens arriving within one frame cost a single DOM write
+                    bubble.message.content = bubble.text;
+                    this.list.refresh(bubble.message);
+                    this.scrollToBottom();
+                } else if (event === 'bubble') {
+                    const bubble = bubbles[data.bubble] || startBubble(data.bubble);
+                    bubble.text = data.text;
+                    bubble.message.content = data.text;
+                    this.list.refresh(bubble.message);
+                    this.saveHistory();
+                } else if (event === 'action') {
+                    action = data.action;
+                } else if (event === 'done') {
+                    action = data.action || action;
+                    finished = true;
+                } else if (event === 'error') {
+                    console.warn('Stream error:', data.error);
+                    finished = true;
+                }
+            };
+
+            try {
+                while (!finished) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+
+                    // SSE frames are separated by a blank line
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const frame = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+
+                        let event = 'message';
+                        let payload = '';
+                        frame.split('\n').forEach(line => {
+                            if (line.startsWith('event:')) event = line.slice(6).trim();
+                            else if (line.startsWith('data:')) payload += line.slice(5).trim();
+                        });
+                        if (payload) handleEvent(event, JSON.parse(payload));
+                    }
+                }
+            } catch (error) {
+                // Connection dropped mid-stream - keep whatever arrived
+                console.warn('Stream interrupted:', error);
+            }
+
+            if (!bubbles.length) {
+                this.removeTypingIndicator();
+                this.addMessage('assistant', 'Sorry, I encountered an error. Please try again.', false);
+            } else if (action) {
+                // Actions belong to the first bubble, same as the blocking path
+                bubbles[0].message.action = action;
+                this.list.rebuild(bubbles[0].message);
+            }
+
+            bubbles.forEach(bubble => { bubble.message.content = bubble.text.trim(); });
+            this.saveHistory();
+            this.isLoading = false;
+            return true;
+        }
+
         async pollForResponse() {
             let attempts = 0;
             const maxAttempts = 30; // 30 seconds
@@ -683,7 +1173,8 @@ WIDGET_JS = r"""/**
                 }
 
                 try {
-                    const response = await fetch(`${this.config.apiUrl}/api/chat/history/${this.sessionId}`);
+                    // Only the newest message matters here
+                    const response = await fetch(this.historyUrl('limit=1'));
                     const data = await response.json();
                     const history = data.history || data.messages || [];
 
@@ -767,7 +1258,13 @@ WIDGET_JS = r"""/**
         }
 
         renderMessage(message, animate = true) {
-            const messageEl = document.createElement('div');
+            this.list.append(message, animate);
+            this.scrollToBottom();
+        }
+
+        // el is a recycled bubble node (or null); it is rebuilt completely
+        createMessageElement(message, animate = true, el = null) {
+            const messageEl = el || document.createElement('div');
             messageEl.className = `syntra-message syntra-message-${message.role} ${animate ? '' : 'no-animate'}`;
 
             // Format time
@@ -813,8 +1310,14 @@ WIDGET_JS = r"""/**
                 `;
             }
 
-            this.messagesContainer.appendChild(messageEl);
-            this.scrollToBottom();
+            return messageEl;
+        }
+
+        updateMessageElement(message, el) {
+            const contentEl = el.querySelector('.syntra-message-content');
+            if (contentEl) {
+                contentEl.innerHTML = message.role === 'assistant' ? parseMarkdown(message.content) : escapeHtml(message.content);
+            }
         }
 
         showTypingIndicator() {
@@ -839,7 +1342,8 @@ WIDGET_JS = r"""/**
         }
 
         scrollToBottom() {
-            this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+            // Applied with the next batched render
+            if (this.list) this.list.scrollToBottom();
         }
 
         // ... loadHistory ...
@@ -848,29 +1352,119 @@ WIDGET_JS = r"""/**
                 if (!this.sessionId) return;
                 const response = await fetch(`${this.config.apiUrl}/api/chat/history/${this.sessionId}`);
                 const data = await response.json();
-                const msgs = data.history || data.messages;
+                this.applyHistory(data.history || data.messages, data.has_more);
+            } catch (error) {
+                console.log('No previous chat history or failed to load');
+            }
+        }
 
+        applyHistory(msgs, hasMore = false) {
+            try {
+                this.hasMoreHistory = !!hasMore;
                 if (msgs && msgs.length > 0) {
                     msgs.forEach(msg => {
-                        const role = msg.role || msg.sender;
-                        const content = msg.content || msg.text;
-                        const timestamp = msg.timestamp || new Date().toISOString();
-                        const action = msg.action || (msg.metadata ? msg.metadata.action : null);
-
-                        const msgObj = {
-                            id: Date.now() + Math.random(),
-                            role: role,
-                            content: content,
-                            timestamp: timestamp,
-                            action: action
-                        };
+                        const msgObj = this.toMessage(msg);
                         this.messages.push(msgObj);
                         this.renderMessage(msgObj, false);
+                        this.trackSeq(msgObj);
                     });
                     this.scrollToBottom();
                 }
             } catch (error) {
-                console.log('No previous chat history or failed to load');
+                console.warn('Failed to render chat history:', error);
+            }
+        }
+
+        // Server message (history API) -> widget message
+        toMessage(msg) {
+            return {
+                id: Date.now() + Math.random(),
+                seq: msg.seq,
+                role: msg.role || msg.sender,
+                content: msg.content || msg.text,
+                timestamp: msg.timestamp || new Date().toISOString(),
+                action: msg.action || (msg.metadata ? msg.metadata.action : null)
+            };
+        }
+
+        // =====================================================================
+        // History Sync (cursor pagination by message seq)
+        // =====================================================================
+
+        resetSyncState() {
+            this.oldestSeq = null;     // cursor for older pages
+            this.latestSeq = null;     // cursor for delta sync
+            this.hasMoreHistory = false;
+            this.unsyncedFrom = null;  // index of the first message sent from this page
+            this.loadingOlder = false;
+            this.syncing = false;
+        }
+
+        trackSeq(message) {
+            if (typeof message.seq !== 'number') return;
+            if (this.oldestSeq === null || message.seq < this.oldestSeq) this.oldestSeq = message.seq;
+            if (this.latestSeq === null || message.seq > this.latestSeq) this.latestSeq = message.seq;
+        }
+
+        historyUrl(query) {
+            return `${this.config.apiUrl}/api/chat/history/${encodeURIComponent(this.sessionId)}?${query}`;
+        }
+
+        async loadOlderMessages() {
+            if (!this.hasMoreHistory || this.loadingOlder || this.oldestSeq === null) return;
+            this.loadingOlder = true;
+            try {
+                const response = await fetch(this.historyUrl(`before=${this.oldestSeq}&limit=${HISTORY_PAGE_SIZE}`));
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                const older = (data.history || []).map(msg => this.toMessage(msg));
+                this.hasMoreHistory = !!data.has_more;
+                if (!older.length) return;
+
+                // The list keeps the message the visitor is looking at in place
+                older.forEach(msg => this.trackSeq(msg));
+                this.list.prepend(older);
+                this.messages = older.concat(this.messages);
+                if (this.unsyncedFrom !== null) this.unsyncedFrom += older.length;
+            } catch (e) {
+                console.warn('Failed to load older messages:', e);
+            } finally {
+                this.loadingOlder = false;
+            }
+        }
+
+        async syncNewMessages() {
+            // Delta sync: only messages after the newest one we know (304 when nothing changed)
+            if (this.latestSeq === null || this.syncing || this.isLoading) return;
+            this.syncing = true;
+            try {
+                // One page per request; keep going while the server has more
+                let hasMore = true;
+                while (hasMore) {
+                    const response = await fetch(this.historyUrl(`since=${this.latestSeq}&limit=${HISTORY_PAGE_SIZE}`));
+                    if (response.status === 304 || !response.ok) return;
+                    const data = await response.json();
+                    const newer = (data.history || []).map(msg => this.toMessage(msg));
+                    if (!newer.length) return;
+
+                    // Messages sent from this page have no seq yet - the stored copies replace them
+                    if (this.unsyncedFrom !== null) {
+                        this.messages.splice(this.unsyncedFrom);
+                        this.list.truncate(this.unsyncedFrom);
+                        this.unsyncedFrom = null;
+                    }
+                    newer.forEach(msg => {
+                        this.messages.push(msg);
+                        this.renderMessage(msg, false);
+                        this.trackSeq(msg);
+                    });
+                    this.saveHistory();
+                    hasMore = !!data.has_more;
+                }
+            } catch (e) {
+                console.warn('Failed to sync new messages:', e);
+            } finally {
+                this.syncing = false;
             }
         }
 
@@ -977,14 +1571,16 @@ WIDGET_JS = r"""/**
             storeSessionId(this.sessionId);
 
             // Clear current view
-            this.messagesContainer.innerHTML = '';
+            this.list.reset();
             this.messages = []; // Will refill from session.messages
+            this.resetSyncState();
 
             // Restore messages
             if (session.messages && session.messages.length > 0) {
                 session.messages.forEach(msg => {
                     this.messages.push(msg);
                     this.renderMessage(msg, false);
+                    this.trackSeq(msg);
                 });
                 this.scrollToBottom();
             }
@@ -1272,7 +1868,9 @@ WIDGET_JS = r"""/**
                 headerTitle: script.getAttribute('data-title'),
                 primaryColor: script.getAttribute('data-color'),
                 showBranding: script.getAttribute('data-branding') !== 'false',
-                privacyPolicyUrl: script.getAttribute('data-privacy-url')
+                privacyPolicyUrl: script.getAttribute('data-privacy-url'),
+                streaming: script.getAttribute('data-streaming') !== 'false',
+                virtualize: script.getAttribute('data-virtualize') !== 'false'
             };
 
             // Remove undefined values
@@ -1303,3 +1901,136 @@ WIDGET_JS = r"""/**
 
 })();
 """
+
+# Served at /widget/embed.js. widget_build replaces __WIDGET_BUNDLE__ and
+# __WIDGET_STYLES__ with the fingerprinted file names, so the long-cached
+# assets are picked up as soon as this (short-cached) loader is revalidated.
+# The loader only draws the launcher button; the bundle and CSS are fetched
+# on first hover/focus/click, or once the page is idle, and the bundle then
+# reads the data-* attributes from this script tag itself.
+LOADER_JS = r"""/**
+ * Vallit AI Chat Widget - loader
+ * Draws the launcher button and loads the current widget bundle on demand.
+ */
+(function () {
+    'use strict';
+
+    if (window.VallitChatWidget || window.__vallitWidgetLoading) return;
+    window.__vallitWidgetLoading = true;
+
+    var script = document.currentScript;
+    var attr = function (name) {
+        return (script && script.getAttribute(name)) || '';
+    };
+    // script.src is always absolute
+    var origin = script && script.src ? new URL(script.src).origin : location.origin;
+    var apiUrl = attr('data-api-url').trim().replace(/\/+$/, '') || origin;
+    var loading = false;
+
+    function storage(key, value) {
+        try {
+            if (value === undefined) return localStorage.getItem(key);
+            localStorage.setItem(key, value);
+        } catch (e) {
+            // Storage not available
+        }
+        return null;
+    }
+
+    // Same request the widget makes on init - it picks this response up
+    // instead of fetching again (see VallitChatWidget.bootstrap)
+    function prefetch() {
+        if (!window.fetch) return;
+        var widgetId = attr('data-widget-id') || 'default';
+        var companyId = attr('data-company-id');
+        // A new visitor's session id is created here so the widget reuses it
+        if (!storage('vallit_chat_session')) {
+            storage('vallit_chat_session', 'vallit_' + Date.now().toString(36) + Math.random().toString(36).substr(2, 9));
+        }
+        var cached = null;
+        try {
+            cached = JSON.parse(storage('vallit_widget_config:' + companyId + ':' + widgetId) || 'null');
+        } catch (e) {
+            // Ignore a corrupt cache entry
+        }
+        var params = new URLSearchParams({
+            widget_id: widgetId,
+            company_id: companyId,
+            session_id: storage('vallit_chat_session') || '',
+            config_version: (cached && cached.version) || ''
+        });
+        var url = apiUrl + '/api/chat/bootstrap?' + params;
+        var request = { url: url, response: fetch(url) };
+        request.response.catch(function () {});
+        window.__vallitBootstrap = request;
+    }
+
+    function load() {
+        if (loading) return;
+        loading = true;
+        prefetch();
+
+        var head = document.head;
+        var bundleUrl = origin + '/widget/__WIDGET_BUNDLE__';
+        var preload = document.createElement('link');
+        preload.rel = 'preload';
+        preload.as = 'script';
+        preload.href = bundleUrl;
+        head.appendChild(preload);
+
+        // Run the bundle once its CSS is in, so the widget never renders unstyled
+        var styles = document.createElement('link');
+        styles.id = 'syntra-widget-styles';
+        styles.rel = 'stylesheet';
+        styles.href = origin + '/widget/__WIDGET_STYLES__';
+        styles.onload = styles.onerror = function () {
+            var bundle = document.createElement('script');
+            bundle.src = bundleUrl;
+            bundle.async = true;
+            head.appendChild(bundle);
+        };
+        head.appendChild(styles);
+    }
+
+    function render() {
+        var button = document.createElement('button');
+        button.id = 'vallit-widget-launcher';
+        button.setAttribute('aria-label', 'Open chat');
+        button.style.cssText = 'position:fixed;bottom:24px;' + (attr('data-position').indexOf('left') >= 0 ? 'left' : 'right') +
+            ':24px;z-index:2147483647;width:56px;height:56px;border:none;border-radius:50%;' +
+            'background:#3D7A77;color:#fff;cursor:pointer;box-shadow:0 4px 12px rgba(0,0,0,.15)';
+        button.innerHTML = '<svg viewBox="0 0 100 100" width="24" height="24" fill="currentColor">' +
+            '<path d="M20 20H70L60 40H10L20 20Z"/><path d="M25 45H85L75 65H15L25 45Z" fill-opacity=".8"/>' +
+            '<path d="M30 70H60L50 90H20L30 70Z" fill-opacity=".6"/></svg>';
+        button.addEventListener('pointerenter', load); // mouse and touch
+        button.addEventListener('focus', load);
+        button.addEventListener('click', function () {
+            // The widget opens itself as soon as it has taken over the button
+            window.__vallitOpenOnLoad = true;
+            button.style.cursor = 'progress';
+            load();
+        });
+        document.body.appendChild(button);
+
+        // Nobody interacted - load in the background once the page has settled
+        var idle = function () {
+            if (window.requestIdleCallback) {
+                window.requestIdleCallback(load, { timeout: 5000 });
+            } else {
+                setTimeout(load, 2000);
+            }
+        };
+        if (document.readyState === 'complete') {
+            idle();
+        } else {
+            window.addEventListener('load', idle);
+        }
+    }
+
+    if (document.body) {
+        render();
+    } else {
+        document.addEventListener('DOMContentLoaded', render);
+    }
+})();
+"""